@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Fitness estético local
+Rasteriza los genes de cada individuo y puntúa densidad, simetría, balance y
+novedad con las métricas vectorizadas de batch_engine, en lugar de fiarse
+del fitness_score que escribe el LLM o de consultarle por cada individuo
+"""
+
+import math
+import time
+import random
+import argparse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_engine import batch_patterns
+from config import Config
+
+# Peso de cada componente en el fitness (suman 1)
+DEFAULT_WEIGHTS = {
+    'density': 0.25,     # Cercanía a la densidad objetivo
+    'symmetry': 0.25,    # Celdas llenas con su espejo horizontal lleno
+    'balance': 0.25,     # Reparto entre cuadrantes
+    'novelty': 0.25      # Diferencia con el resto de la población y con lo ya dibujado
+}
+
+
+def _int_gene(genes: Dict[str, Any], key: str, default: int) -> int:
+    try:
+        return int(float(genes.get(key, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def shape_cells(shape: str, x: int, y: int, size: int) -> List[Tuple[int, int]]:
+    """Celdas de una forma con la geometría de EvolutionaryCanvas.draw_* (sin recortar)"""
+    cells = []
+    if shape == 'square':
+        for i in range(size):
+            for j in range(size):
+                if i == 0 or i == size - 1 or j == 0 or j == size - 1:
+                    cells.append((x + i, y + j))
+    elif shape == 'triangle':
+        for row in range(size):
+            for col in range(2 * row + 1):
+                cells.append((x + size - row - 1 + col, y + row))
+    elif shape == 'star':
+        for i in range(10):
+            angle = 2 * math.pi * i / 10
+            r = size if i % 2 == 0 else size // 2
+            cells.append((int(x + r * math.cos(angle)), int(y + r * math.sin(angle))))
+    elif shape == 'spiral':
+        for i in range(size * 8):
+            cells.append((int(x + 0.1 * i * math.cos(0.2 * i)), int(y + 0.1 * i * math.sin(0.2 * i))))
+    elif shape == 'wave':
+        for i in range(-2 * size, 2 * size + 1):
+            cells.append((x + i, y + int(round(size / 2 * math.sin(i * math.pi / size)))))
+    elif shape == 'fractal':
+        def recursive_fractal(cx, cy, current_size, depth):
+            if depth <= 0 or current_size < 1:
+                return
+            for dx in range(-current_size, current_size + 1):
+                for dy in range(-current_size, current_size + 1):
+                    if abs(dx) + abs(dy) <= current_size:
+                        cells.append((cx + dx, cy + dy))
+            if depth > 1:
+                for angle in range(0, 360, 90):
+                    rad = math.radians(angle)
+                    recursive_fractal(cx + int(current_size * 0.7 * math.cos(rad)),
+                                      cy + int(current_size * 0.7 * math.sin(rad)), current_size // 2, depth - 1)
+        recursive_fractal(x, y, size, 3)
+    else:
+        # circle y formas desconocidas
+        for angle in range(0, 360, 2):
+            rad = math.radians(angle)
+            cells.append((int(x + size * math.cos(rad)), int(y + size * math.sin(rad))))
+    return cells
+
+
+def grid_mask(grid: Sequence[Sequence[str]]) -> np.ndarray:
+    """Celdas no vacías de un canvas de caracteres -> (H, W) bool"""
+    return np.array([[char != ' ' for char in row] for row in grid], dtype=bool)
+
+
+class AestheticFitness:
+    """Fitness 0-1 de una población entera en una sola pasada vectorizada
+
+    Acepta genes de RealGeneticLMStudio (shape, x, y, size) y de GeneticShape
+    (type, size, sin posición: se usa `positions` o el centro). Con `base`
+    (el canvas ya dibujado) se puntúa el canvas resultante de añadir cada
+    forma. La simetría es la fracción de celdas llenas cuyo espejo también lo
+    está: la de batch_patterns cuenta los huecos como coincidencias y apenas
+    distingue formas pequeñas. La novedad es 1 - IoU máximo con el resto de
+    la población, por la fracción de la forma que cae en celdas libres.
+    """
+
+    def __init__(self, width: int = 40, height: int = 25, weights: Optional[Dict[str, float]] = None,
+                 target_density: Optional[float] = None):
+        self.width = width
+        self.height = height
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.target_density = target_density if target_density is not None else Config.AESTHETIC_TARGET_DENSITY
+
+    def rasterize(self, genes_list: Sequence[Dict[str, Any]],
+                  positions: Optional[Sequence[Tuple[int, int]]] = None) -> np.ndarray:
+        """Máscara (B, H, W) de la forma de cada individuo"""
+        masks = np.zeros((len(genes_list), self.height, self.width), dtype=bool)
+        for index, genes in enumerate(genes_list):
+            if positions is not None:
+                x, y = positions[index]
+            else:
+                x = _int_gene(genes, 'x', self.width // 2)
+                y = _int_gene(genes, 'y', self.height // 2)
+            shape = genes.get('shape') or genes.get('type') or 'circle'
+            size = max(1, _int_gene(genes, 'size', 5))
+            for cx, cy in shape_cells(shape, x, y, size):
+                if 0 <= cx < self.width and 0 <= cy < self.height:
+                    masks[index, cy, cx] = True
+        return masks
+
+    def score_masks(self, masks: np.ndarray, base: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Componentes y fitness de cada máscara (B,) sobre `base` opcional (H, W)"""
+        batch = masks.shape[0]
+        canvas = masks | base[None] if base is not None else masks
+        patterns = batch_patterns(canvas)
+
+        density = np.clip(1 - np.abs(patterns['density'] - self.target_density) / self.target_density, 0, 1)
+
+        half = self.width // 2
+        mirrored = canvas[:, :, :half] & canvas[:, :, self.width - half:][:, :, ::-1]
+        filled = canvas.sum(axis=(1, 2))
+        symmetry = np.where(filled > 0, 2 * mirrored.sum(axis=(1, 2)) / np.maximum(filled, 1), 0.0)
+
+        flat = masks.reshape(batch, -1).astype(np.float32)
+        areas = flat.sum(axis=1)
+        if batch > 1:
+            overlap = flat @ flat.T
+            iou = overlap / np.maximum(areas[:, None] + areas[None, :] - overlap, 1)
+            np.fill_diagonal(iou, 0)
+            novelty = 1 - iou.max(axis=1)
+        else:
+            novelty = np.ones(batch)
+        if base is not None:
+            fresh = (flat * ~base.reshape(1, -1)).sum(axis=1)
+            novelty = novelty * np.where(areas > 0, fresh / np.maximum(areas, 1), 0.0)
+
+        components = {
+            'density': density,
+            'symmetry': np.clip(symmetry, 0, 1),
+            'balance': patterns['balance'],
+            'novelty': novelty
+        }
+        components['fitness'] = sum(self.weights[name] * values for name, values in components.items())
+        return components
+
+    def score(self, genes_list: Sequence[Dict[str, Any]], base: Optional[np.ndarray] = None,
+              positions: Optional[Sequence[Tuple[int, int]]] = None) -> List[Dict[str, float]]:
+        """Un dict de componentes y 'fitness' (0-1) por individuo"""
+        if not genes_list:
+            return []
+        components = self.score_masks(self.rasterize(genes_list, positions), base)
+        return [{name: round(float(values[index]), 4) for name, values in components.items()}
+                for index in range(len(genes_list))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir el fitness estético local de una población aleatoria")
+    parser.add_argument('--population', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    shapes = ['circle', 'square', 'triangle', 'fractal', 'wave', 'spiral']
+    population = [{'shape': rng.choice(shapes), 'x': rng.randint(0, 39), 'y': rng.randint(0, 24),
+                   'size': rng.randint(3, 10)} for _ in range(args.population)]
+
+    evaluator = AestheticFitness()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        scores = evaluator.score(population)
+    elapsed = (time.perf_counter() - start) / args.repeat
+    print(f"{args.population} individuos: {elapsed * 1000:.2f} ms por población")
+    best = max(range(len(population)), key=lambda i: scores[i]['fitness'])
+    print(f"Mejor: {population[best]} -> {scores[best]}")
+
+
+if __name__ == "__main__":
+    main()
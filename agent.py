@@ -1,19 +1,38 @@
-from typing import List, Tuple, Dict, Any
-import openai
-from openai import OpenAI
+from typing import List, Tuple, Dict, Any, Optional
 import random
-import json
 from canvas import Canvas
+from agent_memory import MemoryContext
 from config import Config
+from lm_client import LMStudioClient, as_lm_client
+from lm_json import as_json_list, parse_json_tolerant
+from lm_metrics import mark_fallback, track
+from lm_prompts import layout_messages, move_instructions
+from lm_schemas import move_schema, plan_schema
+from context_encoder import ContextEncoder, FORMAT_HELP, Viewport, estimate_tokens, symbol_summary, viewport_from_config
 
 class DrawingAgent:
-    def __init__(self, name: str, client: OpenAI, canvas: Canvas, symbols: List[str]):
+    def __init__(self, name: str, client: LMStudioClient, canvas: Canvas, symbols: List[str],
+                 plan_size: Optional[int] = None, viewport: Optional[Viewport] = None):
         self.name = name
-        self.client = client
+        self.client = as_lm_client(client)
+        if hasattr(self.client, 'for_session'):
+            # Con varios servidores, cada agente conserva el suyo (y su caché KV)
+            self.client = self.client.for_session(name)
         self.canvas = canvas
         self.symbols = symbols
         self.personal_style = self._develop_style()
         self.memory = []
+        # Historial de la memoria en el prompt, con presupuesto fijo de tokens
+        self.history = MemoryContext() if Config.AGENT_MEMORY_TOKENS > 0 else None
+        # Modo plan: pedir K movimientos por consulta (1 = un movimiento por turno)
+        self.plan_size = max(1, plan_size or Config.AGENT_PLAN_SIZE)
+        self.plan: List[Dict[str, Any]] = []
+        self.llm_requests = 0
+        # Contexto compacto: RLE / disperso / diff sobre la conversación en curso
+        self.encoder = ContextEncoder(Config.CONTEXT_TOKEN_BUDGET, Config.CONTEXT_ALLOW_DIFF) if Config.CONTEXT_ENCODING == "compact" else None
+        self.dialog: List[Dict[str, str]] = []
+        # Ventana de enfoque: prompt de tamaño constante en canvas grandes
+        self.viewport = viewport or viewport_from_config()
     
     def _develop_style(self) -> Dict[str, Any]:
         styles = [
@@ -27,43 +46,15 @@ class DrawingAgent:
     async def make_move(self, turn_number: int) -> Dict[str, Any]:
         """El agente decide su próximo movimiento usando LM Studio"""
         
-        # Preparar contexto para el modelo
-        context = self._prepare_context(turn_number)
+        if self.plan_size > 1:
+            return await self._make_planned_move(turn_number)
         
         try:
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"Eres {self.name}, un artista ASCII que dibuja en un canvas compartido. "
-                                  f"Tu estilo es {self.personal_style['approach']} y prefieres {self.personal_style['preference']}. "
-                                  f"Responde SOLO con JSON válido."
-                    },
-                    {
-                        "role": "user",
-                        "content": context
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=200
-            )
-            
-            decision_text = response.choices[0].message.content
-            decision = self._parse_decision(decision_text)
+            decision = await self.decide_move(turn_number)
             
             # Validar y ejecutar la decisión
-            if self._validate_move(decision):
-                success = self.canvas.draw_pixel(
-                    decision['x'], 
-                    decision['y'], 
-                    decision['symbol'], 
-                    self.name
-                )
-                
-                if success:
-                    self.memory.append(decision)
-                    return decision
+            if self.apply_move(decision):
+                return decision
             
             # Fallback si la decisión es inválida
             return self._make_random_move()
@@ -72,14 +63,108 @@ class DrawingAgent:
             print(f"Error en {self.name}: {e}")
             return self._make_random_move()
     
-    def _prepare_context(self, turn_number: int) -> str:
+    async def decide_move(self, turn_number: int) -> Optional[Dict[str, Any]]:
+        """Pedir la decisión al modelo sin tocar el canvas (en modo plan, el siguiente paso del plan)"""
+        if self.plan_size > 1:
+            if not self.plan:
+                self.plan = await self._request_plan(turn_number)
+            return self.plan.pop(0) if self.plan else None
+        
+        # Preparar contexto para el modelo
+        context = self._prepare_context(turn_number)
+        # Después del contexto: al renderizar, la ventana de enfoque fija el rango válido
+        schema = move_schema(self.symbols, self.canvas.width, self.canvas.height, self._coordinate_range())
+        with track('move', self.name):
+            decision_text = await self._ask(context, max_tokens=200, schema=schema)
+            return self._parse_decision(decision_text)
+    
+    def apply_move(self, decision: Optional[Dict[str, Any]]) -> bool:
+        """Validar una decisión contra el canvas actual y dibujarla"""
+        if decision and self._validate_move(decision) and self.canvas.draw_pixel(
+            decision['x'], decision['y'], decision['symbol'], self.name
+        ):
+            self.memory.append(decision)
+            return True
+        
+        # Un paso de plan inválido invalida el resto del plan
+        self.plan = []
+        return False
+    
+    async def _make_planned_move(self, turn_number: int) -> Dict[str, Any]:
+        """Aplicar el siguiente movimiento del plan; pedir otro si se agota o queda invalidado"""
+        try:
+            for _ in range(2):
+                if not self.plan:
+                    self.plan = await self._request_plan(turn_number)
+                
+                while self.plan:
+                    decision = self.plan.pop(0)
+                    if self.apply_move(decision):
+                        return decision
+                    # El canvas cambió bajo el plan: apply_move descartó el resto y se vuelve a preguntar
+            
+            return self._make_random_move()
+            
+        except Exception as e:
+            print(f"Error en {self.name}: {e}")
+            self.plan = []
+            return self._make_random_move()
+    
+    async def _request_plan(self, turn_number: int) -> List[Dict[str, Any]]:
+        """Pedir un plan de plan_size movimientos en una sola consulta"""
+        context = self._prepare_plan_context(turn_number)
+        schema = plan_schema(self.symbols, self.canvas.width, self.canvas.height, self.plan_size,
+                             self._coordinate_range())
+        with track('plan', self.name) as call:
+            plan_text = await self._ask(context, max_tokens=60 * self.plan_size + 100, schema=schema)
+            
+            moves = as_json_list(parse_json_tolerant(plan_text, 'plan', expect=(dict, list))) or []
+            call['fallback'] = not moves
+        for move in moves:
+            move.setdefault('reason', 'plan')
+        return moves[:self.plan_size]
+    
+    async def _ask(self, content: str, max_tokens: int, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Consultar al modelo; con contexto compacto la conversación se conserva para los diffs"""
+        if self.encoder and self.encoder.last_mode == 'diff' and self.dialog:
+            messages = self.dialog + [{"role": "user", "content": content}]
+        else:
+            messages = layout_messages(self._system_prompt(), content)
+        
+        try:
+            text = await self.client.acomplete(messages=messages, temperature=0.7, max_tokens=max_tokens, schema=schema)
+        except Exception:
+            # El modelo no vio este estado: el próximo turno vuelve a enviarlo completo
+            if self.encoder:
+                self.encoder.reset()
+                self.dialog = []
+            raise
+        
+        self.llm_requests += 1
+        if self.encoder:
+            self.dialog = messages + [{"role": "assistant", "content": text}]
+        return text
+    
+    def _system_prompt(self) -> str:
+        """Persona e instrucciones: iguales en todos los turnos, así el servidor reutiliza su prefijo"""
+        persona = (f"Eres {self.name}, un artista ASCII que dibuja en un canvas compartido. "
+                   f"Tu estilo es {self.personal_style['approach']} y prefieres {self.personal_style['preference']}. "
+                   f"Responde SOLO con JSON válido.")
+        return move_instructions(persona, self.symbols, self.canvas.width, self.canvas.height, self.plan_size)
+    
+    def _canvas_summary(self, turn_number: int) -> str:
+        if self.viewport:
+            return self._viewport_summary(turn_number)
+        if self.encoder:
+            return self._compact_summary(turn_number)
+        
         canvas_state = self.canvas.get_canvas_state()
         empty_positions = self.canvas.get_empty_positions()
         
         # Análisis simple del estado actual
         patterns = self.canvas.analyze_patterns()
         
-        context = f"""
+        return f"""
 Canvas actual:
 {canvas_state}
 
@@ -88,33 +173,75 @@ Posiciones vacías: {len(empty_positions)}
 Estado del canvas:
 - Llenado: {patterns['filled_percentage']:.1f}%
 - Símbolos usados: {patterns['symbol_distribution']}
+"""
+    
+    def _viewport_summary(self, turn_number: int) -> str:
+        patterns = self.canvas.analyze_patterns()
+        
+        return f"""
+{self.viewport.render(self.canvas, self.memory)}
 
-Como {self.name} con estilo {self.personal_style['approach']}, decide:
-1. Coordenadas (x, y) donde dibujar (0-{self.canvas.width-1}, 0-{self.canvas.height-1})
-2. Símbolo ASCII para usar
-3. Breve justificación
+Canvas {self.canvas.width}x{self.canvas.height}, turno {turn_number}
+Llenado: {patterns['filled_percentage']:.1f}% - Símbolos: {symbol_summary(self.canvas.grid)}
+"""
+    
+    def _coordinate_range(self) -> Tuple[int, int, int, int]:
+        """(x_min, x_max, y_min, y_max) que se ofrecen al modelo"""
+        if self.viewport:
+            x0, y0, width, height = self.viewport.bounds
+            return x0, x0 + width - 1, y0, y0 + height - 1
+        return 0, self.canvas.width - 1, 0, self.canvas.height - 1
+    
+    def _compact_summary(self, turn_number: int) -> str:
+        dialog_tokens = sum(estimate_tokens(m['content']) for m in self.dialog) if self.dialog else None
+        mode, encoded = self.encoder.encode(self.canvas, dialog_tokens)
+        patterns = self.canvas.analyze_patterns()
+        
+        return f"""
+{FORMAT_HELP[mode]}:
+{encoded}
 
-Responde EXACTAMENTE con este formato JSON:
-{{
-    "x": número,
-    "y": número,
-    "symbol": "carácter",
-    "reason": "tu justificación"
-}}
+Canvas {self.canvas.width}x{self.canvas.height}, turno {turn_number}
+Posiciones vacías: {len(self.canvas.get_empty_positions())}
+Llenado: {patterns['filled_percentage']:.1f}% - Símbolos: {symbol_summary(self.canvas.grid)}
+"""
+    
+    def _history_block(self) -> str:
+        if not self.history:
+            return ''
+        history = self.history.render(self.memory, self.canvas.width, self.canvas.height)
+        return f"{history}\n" if history else ''
+    
+    def _prepare_context(self, turn_number: int) -> str:
+        summary = self._canvas_summary(turn_number)
+        if self.encoder and self.encoder.last_mode == 'diff':
+            # Las instrucciones ya están en la conversación
+            return summary + "\nDecide tu próximo movimiento con el mismo formato JSON."
+        
+        x_min, x_max, y_min, y_max = self._coordinate_range()
+        return f"""{summary}
+{self._history_block()}Rango de coordenadas: x {x_min}-{x_max}, y {y_min}-{y_max}
+Decide tu próximo movimiento.
+"""
+    
+    def _prepare_plan_context(self, turn_number: int) -> str:
+        summary = self._canvas_summary(turn_number)
+        if self.encoder and self.encoder.last_mode == 'diff':
+            return summary + f"\nPlanifica tus próximos {self.plan_size} movimientos con el mismo formato JSON."
+        
+        x_min, x_max, y_min, y_max = self._coordinate_range()
+        return f"""{summary}
+{self._history_block()}Rango de coordenadas: x {x_min}-{x_max}, y {y_min}-{y_max}
+Planifica tus próximos {self.plan_size} movimientos.
 """
-        return context
     
     def _parse_decision(self, response_text: str) -> Dict[str, Any]:
-        try:
-            # Limpiar el texto para extraer JSON válido
-            start = response_text.find('{')
-            end = response_text.rfind('}') + 1
-            if start != -1 and end != 0:
-                json_str = response_text[start:end]
-                return json.loads(json_str)
-        except:
-            pass
+        # Parseo tolerante: repara comas finales, comillas simples, salidas cortadas...
+        decision = parse_json_tolerant(response_text, 'move')
+        if decision is not None:
+            return decision
         
+        mark_fallback()
         return self._make_random_move()
     
     def _validate_move(self, decision: Dict[str, Any]) -> bool:
@@ -163,5 +290,6 @@ Responde EXACTAMENTE con este formato JSON:
             "name": self.name,
             "total_moves": len(moves),
             "style": self.personal_style,
-            "memory_size": len(self.memory)
+            "memory_size": len(self.memory),
+            "llm_requests": self.llm_requests
         }
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Memoria del agente en el prompt
+Convierte la memoria de movimientos de un agente en un bloque de historial
+con presupuesto fijo de tokens: los movimientos recientes van detallados y
+los antiguos se resumen en agregados (símbolos, zonas, motivos), así el
+prompt no crece con la duración de la sesión
+"""
+
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from context_encoder import estimate_tokens
+
+# Zonas del canvas en una rejilla 3x3
+ZONES = [['NO', 'N', 'NE'], ['O', 'C', 'E'], ['SO', 'S', 'SE']]
+
+
+def zone_of(x: int, y: int, width: int, height: int) -> str:
+    column = min(2, max(0, x * 3 // max(1, width)))
+    row = min(2, max(0, y * 3 // max(1, height)))
+    return ZONES[row][column]
+
+
+def dedupe_moves(moves: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Una entrada por (x, y, símbolo), en la posición de su aparición más reciente"""
+    latest: Dict[Tuple[Any, Any, Any], int] = {}
+    ordered = [move for move in moves if isinstance(move, dict) and 'x' in move and 'y' in move]
+    for index, move in enumerate(ordered):
+        latest[(move['x'], move['y'], move.get('symbol'))] = index
+    return [ordered[index] for index in sorted(latest.values())]
+
+
+def short_reason(move: Dict[str, Any], limit: int = 32) -> str:
+    reason = str(move.get('reason') or '').strip().replace('\n', ' ')
+    return reason if len(reason) <= limit else reason[:limit - 1] + '…'
+
+
+class MemoryContext:
+    """Bloque de historial para el prompt a partir de la memoria de un agente
+
+    Se incluyen hasta `recent` movimientos detallados, del más nuevo al más
+    antiguo (un motivo igual al de la línea anterior se abrevia con 〃); el
+    resto se pliega en una línea de agregados. Si no cabe en `token_budget`
+    se pasan movimientos recientes al agregado y, en último caso, se
+    simplifica el agregado.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, recent: Optional[int] = None):
+        self.token_budget = token_budget if token_budget is not None else Config.AGENT_MEMORY_TOKENS
+        self.recent = recent if recent is not None else Config.AGENT_MEMORY_RECENT
+        self.last_tokens = 0
+
+    def summarize(self, moves: List[Dict[str, Any]], width: int, height: int, detail: int = 2) -> str:
+        """Agregado de movimientos antiguos; `detail` 2 = símbolos, zonas y motivos, 0 = solo el número"""
+        if not moves:
+            return ''
+        text = f"Antes: {len(moves)} movimientos"
+        if detail >= 1:
+            symbols = Counter(move.get('symbol') for move in moves if move.get('symbol'))
+            zones = Counter(zone_of(move['x'], move['y'], width, height) for move in moves)
+            text += " - símbolos " + ' '.join(f"{s}{n}" for s, n in symbols.most_common(6))
+            text += "; zonas " + ' '.join(f"{z}{n}" for z, n in zones.most_common())
+        if detail >= 2:
+            reasons = Counter(short_reason(move, 24) for move in moves if move.get('reason'))
+            common = [f"{reason}×{n}" for reason, n in reasons.most_common(3) if n > 1]
+            if common:
+                text += "; motivos " + ', '.join(common)
+        return text
+
+    def describe(self, moves: List[Dict[str, Any]]) -> List[str]:
+        """Líneas `x,y S motivo` del más reciente al más antiguo"""
+        lines = []
+        previous = None
+        for move in reversed(moves):
+            reason = short_reason(move)
+            line = f"{move['x']},{move['y']} {move.get('symbol', '?')}"
+            if reason:
+                line += f" {reason}" if reason != previous else " 〃"
+            previous = reason
+            lines.append(line)
+        return lines
+
+    def render(self, memory: Iterable[Dict[str, Any]], width: int, height: int) -> str:
+        """Historial que cabe en el presupuesto ('' si no hay memoria o está desactivado)"""
+        if self.token_budget <= 0:
+            return ''
+        moves = dedupe_moves(memory)
+        if not moves:
+            self.last_tokens = 0
+            return ''
+
+        header = "Tus movimientos (más reciente primero):"
+        keep = min(self.recent, len(moves))
+        detail = 2
+        while True:
+            older, recent = moves[:len(moves) - keep], moves[len(moves) - keep:]
+            lines = [header] + self.describe(recent)
+            aggregate = self.summarize(older, width, height, detail)
+            if aggregate:
+                lines.append(aggregate)
+            text = '\n'.join(lines)
+            tokens = estimate_tokens(text)
+            if tokens <= self.token_budget:
+                break
+            if keep > 0:
+                keep -= 1
+            elif detail > 0:
+                detail -= 1
+            else:
+                text, tokens = '', 0
+                break
+
+        self.last_tokens = tokens
+        return text
@@ -4,6 +4,7 @@ import threading
 from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
+from lm_client import run_async
 import json
 
 # Configuración global
@@ -51,7 +52,7 @@ class SimpleAgentApp:
                 
                 agent = agents[idx]
                 try:
-                    move = agent.make_move(turn)
+                    move = run_async(agent.make_move(turn))
                     self.messages.append(f"Turno {turn+1}: {agent.name} dibujó '{move['symbol']}'")
                     idx = (idx + 1) % 2
                     time.sleep(delay)
@@ -4,6 +4,7 @@ import threading
 from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
+from lm_client import run_async
 
 # Configuración simple
 class ArtCanvas:
@@ -41,7 +42,7 @@ class ArtCanvas:
             for turn in range(turns):
                 agent = agents[idx]
                 try:
-                    move = agent.make_move(turn)
+                    move = run_async(agent.make_move(turn))
                     self.messages.append(f"Turno {turn+1}: {agent.name} dibujó '{move['symbol']}'")
                     time.sleep(delay)
                     idx = (idx + 1) % 2
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Motor de Simulación por Lotes
+Avanza B canvas independientes a la vez con los scorers ML (sin LLM)
+"""
+
+import time
+import itertools
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+# Mismos símbolos que MLEnhancedApp.run_ml_enhanced_session
+DEFAULT_SYMBOLS = ["█", "▓", "▒", "░", "▄", "▀", "▌", "▐", "•", "+", "■", "◆"]
+
+# Factores de MLEnhancedAgent.score_position (ml_enhanced_app.py)
+DEFAULT_PARAMS = {
+    'low_density': 0.1,       # Por debajo: favorecer el centro
+    'high_density': 0.7,      # Por encima: favorecer huecos
+    'center_weight': 1.0,
+    'gap_weight': 1.0,
+    'symmetry_weight': 0.5,
+    'balance_weight': 0.3,
+    'exploration_rate': 0.3,
+    'exploration_noise': 0.1
+}
+
+
+def neighbor_counts(filled: np.ndarray) -> np.ndarray:
+    """Suma 3x3 (incluida la propia celda) sobre la última pareja de ejes"""
+    padded = np.pad(filled, [(0, 0)] * (filled.ndim - 2) + [(1, 1), (1, 1)])
+    height, width = filled.shape[-2:]
+    total = np.zeros(filled.shape, dtype=np.int32)
+    for dy in range(3):
+        for dx in range(3):
+            total += padded[..., dy:dy + height, dx:dx + width]
+    return total
+
+
+def quadrant_counts(filled: np.ndarray) -> np.ndarray:
+    """Celdas llenas por cuadrante (TL, TR, BL, BR) -> (B, 4)"""
+    height, width = filled.shape[-2:]
+    mid_x, mid_y = width // 2, height // 2
+    return np.stack([
+        filled[:, :mid_y, :mid_x].sum(axis=(1, 2)),
+        filled[:, :mid_y, mid_x:].sum(axis=(1, 2)),
+        filled[:, mid_y:, :mid_x].sum(axis=(1, 2)),
+        filled[:, mid_y:, mid_x:].sum(axis=(1, 2))
+    ], axis=1)
+
+
+def batch_patterns(filled: np.ndarray) -> Dict[str, np.ndarray]:
+    """Versión vectorizada de MLCanvas.analyze_patterns_ml para (B, H, W)"""
+    filled = filled.astype(np.int32)
+    batch, height, width = filled.shape
+    total = width * height
+
+    # Densidad
+    density = filled.sum(axis=(1, 2)) / total
+
+    # Simetría horizontal
+    half = width // 2
+    left = filled[:, :, :half]
+    right = filled[:, :, width - half:][:, :, ::-1]
+    symmetry = (left == right).sum(axis=(1, 2)) / max(1, total // 2)
+
+    # Clustering (solo celdas interiores, como el original)
+    neighbors = neighbor_counts(filled)
+    interior = np.zeros((height, width), dtype=bool)
+    interior[1:-1, 1:-1] = True
+    clustered = (filled == 1) & (neighbors > 2) & interior
+    clustering = clustered.sum(axis=(1, 2)) / total
+
+    # Balance entre cuadrantes
+    quadrants = quadrant_counts(filled)
+    q_max = quadrants.max(axis=1)
+    q_min = quadrants.min(axis=1)
+    balance = np.where(q_max > 0, 1 - (q_max - q_min) / np.maximum(q_max, 1), 0.0)
+
+    # Preferencia de bordes
+    edge = np.zeros((height, width), dtype=bool)
+    edge[0, :] = edge[-1, :] = True
+    edge[:, 0] = edge[:, -1] = True
+    edge_preference = (filled & edge).sum(axis=(1, 2)) / edge.sum()
+
+    return {
+        'density': density,
+        'symmetry': symmetry,
+        'clustering': clustering,
+        'balance': balance,
+        'edge_preference': edge_preference
+    }
+
+
+class BatchedMLEngine:
+    """Simulación headless de B sesiones ML en pasos vectorizados"""
+
+    def __init__(self, batch_size: int, width: int = 30, height: int = 15,
+                 symbols: Optional[List[str]] = None, params: Optional[Dict[str, Any]] = None,
+                 seed: Optional[int] = None):
+        self.batch_size = batch_size
+        self.width = width
+        self.height = height
+        self.symbols = symbols or DEFAULT_SYMBOLS
+        self.rng = np.random.default_rng(seed)
+
+        # Cada parámetro puede ser escalar o un array (B,) para barridos
+        self.params = {}
+        for key, default in DEFAULT_PARAMS.items():
+            value = (params or {}).get(key, default)
+            self.params[key] = np.broadcast_to(np.asarray(value, dtype=np.float64), (batch_size,)).copy()
+
+        # 0 = vacío, k + 1 = índice del símbolo
+        self.grid = np.zeros((batch_size, height, width), dtype=np.int16)
+        self.turn = 0
+        self.moves = []
+
+        # Geometría fija reutilizada en cada paso
+        ys, xs = np.mgrid[0:height, 0:width]
+        center_x, center_y = width // 2, height // 2
+        self.center_score = 1 - (np.abs(xs - center_x) + np.abs(ys - center_y)) / (width + height)
+        mid_x, mid_y = width // 2, height // 2
+        self.quadrant_map = (ys >= mid_y) * 2 + (xs >= mid_x)
+
+    def score_cells(self) -> np.ndarray:
+        """Puntuar todas las celdas de todas las sesiones -> (B, H, W)"""
+        filled = (self.grid > 0).astype(np.int32)
+        p = {key: value[:, None, None] for key, value in self.params.items()}
+        density = (filled.sum(axis=(1, 2)) / (self.width * self.height))[:, None, None]
+
+        score = np.zeros(self.grid.shape, dtype=np.float64)
+
+        # Factor de densidad: centro si está vacío, huecos si está lleno
+        score += np.where(density < p['low_density'], p['center_weight'] * self.center_score, 0.0)
+        gaps = 1 - neighbor_counts(filled) / 8
+        score += np.where(density > p['high_density'], p['gap_weight'] * gaps, 0.0)
+
+        # Factor de simetría: la celda espejo ya está dibujada
+        score += p['symmetry_weight'] * filled[:, :, ::-1]
+
+        # Factor de balance: cuadrantes menos usados que el máximo
+        quadrants = quadrant_counts(filled)
+        underused = quadrants < quadrants.max(axis=1, keepdims=True)
+        score += p['balance_weight'] * np.take_along_axis(
+            underused, self.quadrant_map.reshape(1, -1).repeat(self.batch_size, axis=0), axis=1
+        ).reshape(self.grid.shape)
+
+        # Exploración
+        explore = self.rng.random(self.grid.shape) < p['exploration_rate']
+        noise = self.rng.uniform(-1.0, 1.0, self.grid.shape) * p['exploration_noise']
+        score += np.where(explore, noise, 0.0)
+
+        score = np.maximum(0, score)
+        # Solo celdas vacías son candidatas
+        return np.where(filled == 0, score, -np.inf)
+
+    def step(self) -> np.ndarray:
+        """Elegir y aplicar un movimiento en cada sesión -> (B, 3) con x, y, símbolo"""
+        scores = self.score_cells().reshape(self.batch_size, -1)
+        best = scores.argmax(axis=1)
+        active = np.isfinite(scores[np.arange(self.batch_size), best])
+
+        ys, xs = np.divmod(best, self.width)
+        explores = self.params['exploration_rate'] > 0
+        symbols = np.where(explores, self.rng.integers(0, len(self.symbols), self.batch_size), 0)
+
+        rows = np.arange(self.batch_size)[active]
+        self.grid[rows, ys[active], xs[active]] = symbols[active] + 1
+
+        move = np.stack([xs, ys, np.where(active, symbols, -1)], axis=1)
+        self.moves.append(move)
+        self.turn += 1
+        return move
+
+    def run(self, turns: int = 20) -> Dict[str, Any]:
+        """Ejecutar todas las sesiones durante `turns` turnos"""
+        start = time.perf_counter()
+        for _ in range(turns):
+            self.step()
+        elapsed = time.perf_counter() - start
+
+        return {
+            'patterns': batch_patterns(self.grid > 0),
+            'moves': np.stack(self.moves, axis=1) if self.moves else np.zeros((self.batch_size, 0, 3), dtype=np.int64),
+            'elapsed': elapsed,
+            'sessions_per_minute': self.batch_size / elapsed * 60 if elapsed > 0 else float('inf')
+        }
+
+    def render(self, index: int) -> str:
+        """Canvas de una sesión como texto"""
+        lookup = np.array([' '] + list(self.symbols), dtype=object)
+        return '\n'.join(''.join(row) for row in lookup[self.grid[index]])
+
+
+def run_parameter_sweep(param_grid: Dict[str, List[float]], sessions_per_config: int = 50,
+                        turns: int = 20, width: int = 30, height: int = 15,
+                        seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Barrido cartesiano de parámetros en un único lote"""
+    keys = list(param_grid.keys())
+    configs = [dict(zip(keys, values)) for values in itertools.product(*param_grid.values())]
+
+    params = {key: np.repeat([config[key] for config in configs], sessions_per_config) for key in keys}
+    engine = BatchedMLEngine(len(configs) * sessions_per_config, width, height, params=params, seed=seed)
+    result = engine.run(turns)
+
+    summary = []
+    for i, config in enumerate(configs):
+        block = slice(i * sessions_per_config, (i + 1) * sessions_per_config)
+        summary.append({
+            'params': config,
+            'patterns': {name: float(values[block].mean()) for name, values in result['patterns'].items()}
+        })
+    return summary
+
+
+if __name__ == "__main__":
+    console = Console()
+    console.print("[bold magenta]🤖 Motor ML por lotes - barrido de parámetros[/]")
+
+    sweep = run_parameter_sweep({
+        'symmetry_weight': [0.0, 0.5, 1.0],
+        'balance_weight': [0.0, 0.3]
+    }, sessions_per_config=500, turns=20, seed=42)
+
+    table = Table(title="📊 Resultado medio por configuración")
+    table.add_column("Parámetros", style="cyan")
+    for name in ('density', 'symmetry', 'clustering', 'balance'):
+        table.add_column(name.capitalize(), style="magenta")
+    for row in sweep:
+        params = ', '.join(f"{k}={v}" for k, v in row['params'].items())
+        table.add_row(params, *(f"{row['patterns'][name]:.3f}" for name in ('density', 'symmetry', 'clustering', 'balance')))
+    console.print(table)
+
+    engine = BatchedMLEngine(2000, seed=0)
+    stats = engine.run(20)
+    console.print(f"[green]✅ {engine.batch_size} sesiones en {stats['elapsed']:.2f}s "
+                  f"({stats['sessions_per_minute']:.0f} sesiones/minuto)[/]")
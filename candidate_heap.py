@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Heap de Candidatos
+Cola de prioridad incremental para elegir movimientos sin reevaluar el canvas
+"""
+
+import heapq
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class CandidateHeap:
+    """Mejores celdas libres con re-puntuación solo del vecindario afectado
+
+    `score_fn(x, y)` debe depender únicamente de la celda, sus vecinas dentro
+    de `radius` y su celda espejo. Los términos globales que son constantes
+    por grupo (p. ej. el bonus por cuadrante) se suman al consultar mediante
+    `group_fn` y `bonus`. Si cambia un término global de otro tipo hay que
+    llamar a `rebuild()`.
+    """
+
+    def __init__(self, width: int, height: int, score_fn: Callable[[int, int], float],
+                 is_free: Callable[[int, int], bool],
+                 group_fn: Optional[Callable[[int, int], Hashable]] = None,
+                 radius: int = 1, mirror: bool = True):
+        self.width = width
+        self.height = height
+        self.score_fn = score_fn
+        self.is_free = is_free
+        self.group_fn = group_fn or (lambda x, y: None)
+        self.radius = radius
+        self.mirror = mirror
+
+        self.heaps: Dict[Hashable, list] = defaultdict(list)
+        self.versions = [[0] * width for _ in range(height)]
+        self.free = [[False] * width for _ in range(height)]
+        self.groups = [[self.group_fn(x, y) for x in range(width)] for y in range(height)]
+        self.filled_counts: Dict[Hashable, int] = defaultdict(int)
+        self.history_seen = 0
+        self.rebuild()
+
+    def rebuild(self):
+        """Re-puntuar todas las celdas (solo al cambiar un término global)"""
+        self.heaps = defaultdict(list)
+        self.filled_counts = defaultdict(int)
+        for y in range(self.height):
+            for x in range(self.width):
+                group = self.groups[y][x]
+                self.versions[y][x] += 1
+                self.free[y][x] = self.is_free(x, y)
+                if self.free[y][x]:
+                    self.heaps[group].append((-self.score_fn(x, y), y, x, self.versions[y][x]))
+                else:
+                    self.filled_counts[group] += 1
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def _rescore(self, x: int, y: int):
+        was_free = self.free[y][x]
+        self.versions[y][x] += 1
+        self.free[y][x] = self.is_free(x, y)
+        group = self.groups[y][x]
+
+        if was_free != self.free[y][x]:
+            self.filled_counts[group] += -1 if self.free[y][x] else 1
+        if self.free[y][x]:
+            heapq.heappush(self.heaps[group], (-self.score_fn(x, y), y, x, self.versions[y][x]))
+
+    def invalidate(self, x: int, y: int):
+        """Re-puntuar el vecindario de (x, y) y su celda espejo tras un draw_pixel"""
+        touched = set()
+        for dy in range(-self.radius, self.radius + 1):
+            for dx in range(-self.radius, self.radius + 1):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.width and 0 <= ny < self.height:
+                    touched.add((nx, ny))
+        # La celda cuyo espejo es (x, y) también cambia su factor de simetría
+        if self.mirror:
+            touched.add((self.width - 1 - x, y))
+
+        for tx, ty in touched:
+            self._rescore(tx, ty)
+
+    def sync(self, history: List[dict]) -> List[dict]:
+        """Aplicar los movimientos nuevos de un historial (move_history / draw_history)"""
+        new_moves = history[self.history_seen:]
+        for move in new_moves:
+            self.invalidate(move['x'], move['y'])
+        self.history_seen = len(history)
+        return new_moves
+
+    def _clean_top(self, heap: list):
+        """Descartar entradas obsoletas de la cima (borrado perezoso)"""
+        while heap:
+            _, y, x, version = heap[0]
+            if version == self.versions[y][x] and self.free[y][x]:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def best(self, bonus: Optional[Dict[Hashable, float]] = None) -> Optional[Tuple[int, int, float]]:
+        """Mejor celda libre en O(log n) amortizado"""
+        top = self.top_k(1, bonus)
+        return top[0] if top else None
+
+    def top_k(self, k: int, bonus: Optional[Dict[Hashable, float]] = None) -> List[Tuple[int, int, float]]:
+        """Las k mejores celdas libres como (x, y, score), en O(k log n)"""
+        bonus = bonus or {}
+        popped = defaultdict(list)
+        result = []
+
+        # Fusión de los heaps por grupo; empates en orden de filas como el barrido completo
+        frontier = []
+        for group, heap in self.heaps.items():
+            entry = self._clean_top(heap)
+            if entry:
+                frontier.append((entry[0] - bonus.get(group, 0.0), entry[1], entry[2], group))
+        heapq.heapify(frontier)
+
+        while frontier and len(result) < k:
+            group = heapq.heappop(frontier)[-1]
+            heap = self.heaps[group]
+            entry = heapq.heappop(heap)
+            popped[group].append(entry)
+            result.append((entry[2], entry[1], -entry[0] + bonus.get(group, 0.0)))
+
+            entry = self._clean_top(heap)
+            if entry:
+                heapq.heappush(frontier, (entry[0] - bonus.get(group, 0.0), entry[1], entry[2], group))
+
+        # Devolver las entradas consultadas (siguen siendo válidas)
+        for group, entries in popped.items():
+            for entry in entries:
+                heapq.heappush(self.heaps[group], entry)
+
+        return result
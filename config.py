@@ -7,6 +7,54 @@ class Config:
     # Configuración LM Studio
     LM_STUDIO_BASE_URL = os.getenv("LM_STUDIO_BASE_URL", "http://localhost:1234/v1")
     LM_STUDIO_API_KEY = os.getenv("LM_STUDIO_API_KEY", "not-needed-for-local")
+    LM_STUDIO_MODEL = os.getenv("LM_STUDIO_MODEL", "local-model")
+    # Varias instancias separadas por comas: las decisiones se reparten entre ellas;
+    # con PIN_SESSIONS cada agente se queda en el mismo servidor (caché KV)
+    LM_STUDIO_BASE_URLS = [url.strip() for url in os.getenv("LM_STUDIO_BASE_URLS", "").split(",") if url.strip()]
+    LM_STUDIO_PIN_SESSIONS = os.getenv("LM_STUDIO_PIN_SESSIONS", "true").lower() in ("1", "true", "yes")
+    
+    # Cliente compartido: deadline por llamada, reintentos y pool de conexiones
+    LM_STUDIO_TIMEOUT = float(os.getenv("LM_STUDIO_TIMEOUT", 30.0))
+    LM_STUDIO_MAX_RETRIES = int(os.getenv("LM_STUDIO_MAX_RETRIES", 2))
+    LM_STUDIO_BACKOFF_BASE = float(os.getenv("LM_STUDIO_BACKOFF_BASE", 0.5))
+    LM_STUDIO_BACKOFF_MAX = float(os.getenv("LM_STUDIO_BACKOFF_MAX", 4.0))
+    LM_STUDIO_MAX_CONCURRENCY = int(os.getenv("LM_STUDIO_MAX_CONCURRENCY", 4))
+    LM_STUDIO_POOL_SIZE = int(os.getenv("LM_STUDIO_POOL_SIZE", 8))
+    # Prioridad por defecto del proceso (interactive, normal, batch), límites por clase
+    # ("batch=2"; por defecto batch deja un hueco libre) y segundos de espera por nivel ganado
+    LM_PRIORITY = os.getenv("LM_PRIORITY", "normal")
+    LM_SCHED_CAPS = os.getenv("LM_SCHED_CAPS", "")
+    LM_SCHED_AGING = float(os.getenv("LM_SCHED_AGING", 10.0))
+    # Decisiones independientes lanzadas a la vez (población inicial, cruces, formas...)
+    LM_FANOUT_WORKERS = int(os.getenv("LM_FANOUT_WORKERS", 4))
+    
+    # Circuit breaker: fallos seguidos para abrir, segundos hasta el reintento y timeout de la sonda /models
+    LM_BREAKER_THRESHOLD = int(os.getenv("LM_BREAKER_THRESHOLD", 3))
+    LM_BREAKER_RESET = float(os.getenv("LM_BREAKER_RESET", 15.0))
+    LM_PROBE_TIMEOUT = float(os.getenv("LM_PROBE_TIMEOUT", 2.0))
+    # Segundos que vale la lista de modelos servidos (parte de la clave de caché) antes de volver a pedirla
+    LM_MODELS_TTL = float(os.getenv("LM_MODELS_TTL", 60.0))
+    
+    # Disposición de los prompts: "prefix" (instrucciones fijas delante, reutiliza la caché KV) o "legacy"
+    LM_PROMPT_LAYOUT = os.getenv("LM_PROMPT_LAYOUT", "prefix")
+    
+    # Pedir salida con esquema JSON (response_format); se desactiva sola si el servidor la rechaza
+    LM_STRUCTURED_OUTPUT = os.getenv("LM_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+    
+    # Caché de respuestas en disco (solo temperatura 0 salvo que se permita)
+    LM_CACHE_ENABLED = os.getenv("LM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LM_CACHE_ANY_TEMPERATURE = os.getenv("LM_CACHE_ANY_TEMPERATURE", "false").lower() in ("1", "true", "yes")
+    LM_CACHE_PATH = os.getenv("LM_CACHE_PATH", "lm_cache.sqlite3")
+    LM_CACHE_MAX_ENTRIES = int(os.getenv("LM_CACHE_MAX_ENTRIES", 20000))
+    LM_CACHE_MAX_BYTES = int(os.getenv("LM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    LM_CACHE_TTL = float(os.getenv("LM_CACHE_TTL", 7 * 24 * 3600))
+    
+    # Grabar la sesión en un NDJSON (LM_TRANSCRIPT) o reproducir una grabada sin servidor (LM_REPLAY)
+    LM_TRANSCRIPT = os.getenv("LM_TRANSCRIPT", "")
+    LM_TRANSCRIPT_MESSAGES = os.getenv("LM_TRANSCRIPT_MESSAGES", "false").lower() in ("1", "true", "yes")
+    LM_TRANSCRIPT_SEED = os.getenv("LM_TRANSCRIPT_SEED", "")
+    LM_REPLAY = os.getenv("LM_REPLAY", "")
+    LM_REPLAY_MODE = os.getenv("LM_REPLAY_MODE", "hash")
     
     # Configuración del canvas
     CANVAS_WIDTH = int(os.getenv("CANVAS_WIDTH", 40))
@@ -17,6 +65,38 @@ class Config:
     AGENT_2_NAME = os.getenv("AGENT_2_NAME", "Agente_Rojo")
     MAX_TURNS = int(os.getenv("MAX_TURNS", 50))
     DELAY_ENTRE_TURNOS = float(os.getenv("DELAY_ENTRE_TURNOS", 1.0))
+    # Movimientos pedidos por consulta al modelo (1 = uno por turno)
+    AGENT_PLAN_SIZE = int(os.getenv("AGENT_PLAN_SIZE", 1))
+    # Contexto del prompt: "compact" (RLE/disperso/diff) o "full" (canvas completo)
+    CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "compact")
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+    CONTEXT_ALLOW_DIFF = os.getenv("CONTEXT_ALLOW_DIFF", "true").lower() in ("1", "true", "yes")
+    # Ventana de enfoque ("20x10"; vacío = canvas completo) y cómo se centra ("recent" o "ml")
+    CONTEXT_VIEWPORT = os.getenv("CONTEXT_VIEWPORT", "")
+    CONTEXT_FOCUS = os.getenv("CONTEXT_FOCUS", "recent")
+    # Historial de movimientos propios en el prompt: tokens máximos (0 = no incluirlo) y movimientos detallados
+    AGENT_MEMORY_TOKENS = int(os.getenv("AGENT_MEMORY_TOKENS", 120))
+    AGENT_MEMORY_RECENT = int(os.getenv("AGENT_MEMORY_RECENT", 8))
+    
+    # Presupuesto por turno en segundos (0 = esperar siempre al LLM); pasado el plazo se usa el scorer ML local
+    TURN_BUDGET = float(os.getenv("TURN_BUDGET", 0))
+    TURN_LATE_LOG = os.getenv("TURN_LATE_LOG", "late_moves.jsonl")
+    # Ritmo objetivo en turnos/s (0 = sin gobernador): reparte los turnos entre el LLM y el scorer local
+    TURN_RATE = float(os.getenv("TURN_RATE", 0))
+    
+    # Selección genética: "batch" (ranking de la población en una consulta por bloque), "individual"
+    # o "local" (la mejor mitad por fitness, sin consultas)
+    GENETIC_SELECTION = os.getenv("GENETIC_SELECTION", "batch")
+    GENETIC_RANK_CHUNK = int(os.getenv("GENETIC_RANK_CHUNK", 20))
+    # Modo de evolución: "llm" (cada operación con LM Studio) o "hybrid" (operadores locales
+    # y como mucho GENETIC_LLM_BUDGET llamadas por generación para los hijos más prometedores)
+    GENETIC_MODE = os.getenv("GENETIC_MODE", "llm")
+    GENETIC_LLM_BUDGET = int(os.getenv("GENETIC_LLM_BUDGET", 6))
+    GENETIC_POPULATION = int(os.getenv("GENETIC_POPULATION", 20))
+    # Fitness genético: "llm" (el fitness_score que declara el modelo) o "local" (aesthetic_fitness)
+    GENETIC_FITNESS = os.getenv("GENETIC_FITNESS", "llm")
+    # Densidad del canvas que puntúa más alto en el fitness estético
+    AESTHETIC_TARGET_DENSITY = float(os.getenv("AESTHETIC_TARGET_DENSITY", 0.12))
     
     # Símbolos ASCII para dibujar
     SYMBOLS = ['█', '▓', '▒', '░', '▄', '▀', '▌', '▐', '•', '*', '+', '#', '@', '■', '□', '▪', '▫']
@@ -7,9 +7,10 @@ Interfaz simple que funciona en la terminal sin problemas de navegador
 import os
 import sys
 import time
-from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
+from turn_scheduler import TurnScheduler
+from lm_client import get_lm_client, run_async
 from config import Config
 
 class ConsoleInterface:
@@ -20,6 +21,7 @@ class ConsoleInterface:
         self.agent1 = None
         self.agent2 = None
         self.running = False
+        self.scheduler = TurnScheduler() if self.config.TURN_BUDGET > 0 or self.config.TURN_RATE > 0 else None
         
     def clear_screen(self):
         """Limpiar pantalla"""
@@ -42,13 +44,9 @@ class ConsoleInterface:
     def connect_lm_studio(self, url):
         """Conectar a LM Studio"""
         try:
-            self.client = OpenAI(base_url=url, api_key="not-needed")
-            # Probar conexión
-            self.client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
+            self.client = get_lm_client(url, "not-needed")
+            # Probar conexión (sonda barata a /models)
+            self.client.health_check()
             return True, "✅ LM Studio conectado exitosamente"
         except Exception as e:
             return False, f"❌ Error conectando a LM Studio: {e}"
@@ -74,11 +72,16 @@ class ConsoleInterface:
         
         agents = [self.agent1, self.agent2]
         idx = 0
+        if self.scheduler and self.scheduler.governor:
+            self.scheduler.governor.reset(turns)
         
         for turn in range(turns):
             agent = agents[idx]
             try:
-                move = agent.make_move(turn)
+                if self.scheduler:
+                    move = run_async(self.scheduler.play_turn(agent, turn))
+                else:
+                    move = run_async(agent.make_move(turn))
                 
                 # Mostrar progreso
                 self.clear_screen()
@@ -87,6 +90,10 @@ class ConsoleInterface:
                 print(f"🤖 Agente: {agent.name}")
                 print(f"✏️  Símbolo: '{move['symbol']}'")
                 print(f"📍 Posición: ({move['x']}, {move['y']})")
+                if move.get('governed'):
+                    print(f"⏱️  Ritmo objetivo ({self.scheduler.governor.describe()}): movimiento ML local")
+                elif move.get('source') == 'local':
+                    print(f"⏱️  LLM fuera de plazo ({self.scheduler.budget:.1f}s): movimiento ML local")
                 
                 self.display_canvas()
                 
@@ -116,6 +123,8 @@ class ConsoleInterface:
         print(f"\n📊 Estadísticas:")
         print(f"   • Canvas llenado: {patterns['filled_percentage']:.1f}%")
         print(f"   • Símbolos únicos: {len(set([cell for row in self.canvas.grid for cell in row if cell != ' ']))}")
+        if self.scheduler and self.scheduler.governor:
+            print(f"   • Ritmo: {self.scheduler.governor.describe()}")
         
         return True, "Proceso completado"
     
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Codificador de contexto
+Representaciones compactas del canvas para los prompts: RLE por filas, lista
+dispersa de celdas ocupadas o diff desde el último turno, la más corta que
+quepa en el presupuesto de tokens; o una ventana de enfoque de tamaño fijo
+para canvas grandes
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+
+EMPTY = ' '
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens: ~4 caracteres ASCII por token, 1 por símbolo no ASCII"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def encode_rle(grid: List[List[str]]) -> str:
+    """Filas con contenido como runs: `+N` salta N vacías, `S*N` repite un símbolo"""
+    lines = []
+    for y, row in enumerate(grid):
+        runs = []
+        x = 0
+        while x < len(row):
+            symbol = row[x]
+            run = 1
+            while x + run < len(row) and row[x + run] == symbol:
+                run += 1
+            if symbol == EMPTY:
+                runs.append(f"+{run}")
+            else:
+                runs.append(symbol if run == 1 else f"{symbol}*{run}")
+            x += run
+        # Las vacías del final no aportan nada
+        if runs and runs[-1].startswith('+'):
+            runs.pop()
+        if runs:
+            lines.append(f"y{y}: {' '.join(runs)}")
+    return '\n'.join(lines) or "(vacío)"
+
+
+def encode_sparse(grid: List[List[str]]) -> str:
+    """Celdas ocupadas agrupadas por símbolo: `S: x,y x,y ...`"""
+    cells: Dict[str, List[str]] = {}
+    for y, row in enumerate(grid):
+        for x, symbol in enumerate(row):
+            if symbol != EMPTY:
+                cells.setdefault(symbol, []).append(f"{x},{y}")
+    return '\n'.join(f"{symbol}: {' '.join(coords)}" for symbol, coords in cells.items()) or "(vacío)"
+
+
+def encode_diff(moves: List[dict]) -> str:
+    """Movimientos desde el último turno: `x,y=S (agente)`"""
+    return '\n'.join(
+        f"{m['x']},{m['y']}={m['symbol']}" + (f" ({m['agent']})" if m.get('agent') else '')
+        for m in moves
+    ) or "(sin cambios)"
+
+
+def symbol_summary(grid: List[List[str]]) -> str:
+    """Distribución de símbolos en una línea: `█12 ▓3`"""
+    counts: Dict[str, int] = {}
+    for row in grid:
+        for cell in row:
+            if cell != EMPTY:
+                counts[cell] = counts.get(cell, 0) + 1
+    return ' '.join(f"{symbol}{count}" for symbol, count in sorted(counts.items(), key=lambda kv: -kv[1])) or "-"
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """Recortar líneas completas hasta que el texto quepa en el presupuesto"""
+    if estimate_tokens(text) <= budget:
+        return text
+    kept = []
+    used = estimate_tokens("… (recortado)")
+    for line in text.split('\n'):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return '\n'.join(kept + ["… (recortado)"])
+
+
+FORMAT_HELP = {
+    'rle': "Canvas en RLE por filas (yN: +K = K celdas vacías, S*K = K veces el símbolo S; filas omitidas están vacías)",
+    'sparse': "Celdas ocupadas por símbolo (S: x,y ...; el resto está vacío)",
+    'diff': "Cambios desde tu último turno (x,y=S); el resto del canvas sigue como en el mensaje anterior",
+}
+
+
+class ContextEncoder:
+    """Elige la codificación más corta del canvas para cada turno de un agente
+
+    El diff solo es válido si el modelo ya vio el estado anterior, así que se
+    usa únicamente cuando el agente mantiene la conversación (`dialog_tokens`)
+    y esta sigue dentro del presupuesto; si no, se envía un estado completo.
+    Compensa cuando el servidor reutiliza la caché KV del prefijo común
+    (LM Studio / llama.cpp); con `allow_diff=False` siempre se envía el estado.
+    """
+
+    def __init__(self, token_budget: int = 600, allow_diff: bool = True):
+        self.token_budget = token_budget
+        self.allow_diff = allow_diff
+        self.seen: Optional[int] = None
+        self.last_mode = ''
+
+    def reset(self):
+        """Olvidar el último estado enviado (p. ej. si la consulta falló)"""
+        self.seen = None
+
+    def encode(self, canvas, dialog_tokens: Optional[int] = None) -> Tuple[str, str]:
+        """Devuelve (modo, texto) para el estado actual de `canvas`"""
+        history = getattr(canvas, 'draw_history', [])
+        candidates = {
+            'rle': encode_rle(canvas.grid),
+            'sparse': encode_sparse(canvas.grid),
+        }
+        if self.allow_diff and self.seen is not None and dialog_tokens is not None and self.seen <= len(history):
+            diff = encode_diff(history[self.seen:])
+            if dialog_tokens + estimate_tokens(diff) <= self.token_budget:
+                candidates['diff'] = diff
+
+        mode = min(candidates, key=lambda m: estimate_tokens(candidates[m]))
+        self.seen = len(history)
+        self.last_mode = mode
+        return mode, truncate_to_budget(candidates[mode], self.token_budget)
+
+
+def encode_window(grid: List[List[str]], x0: int, y0: int, width: int, height: int) -> str:
+    """Ventana del canvas con coordenadas absolutas (`.` = vacía)"""
+    lines = [f"x={x0}..{x0 + width - 1}"]
+    for y in range(y0, y0 + height):
+        row = ''.join(grid[y][x0:x0 + width]).replace(EMPTY, '.')
+        lines.append(f"y{y}: {row}")
+    return '\n'.join(lines)
+
+
+def coarse_map(grid: List[List[str]], cols: int = 8, rows: int = 4) -> str:
+    """Mapa de densidad de tamaño fijo: cada dígito es la ocupación de un bloque (0-9)"""
+    height, width = len(grid), len(grid[0]) if grid else 0
+    lines = []
+    for by in range(rows):
+        y_start, y_end = by * height // rows, max((by + 1) * height // rows, by * height // rows + 1)
+        digits = []
+        for bx in range(cols):
+            x_start, x_end = bx * width // cols, max((bx + 1) * width // cols, bx * width // cols + 1)
+            cells = [grid[y][x] for y in range(y_start, min(y_end, height)) for x in range(x_start, min(x_end, width))]
+            filled = sum(1 for cell in cells if cell != EMPTY)
+            digits.append(str(min(9, filled * 10 // len(cells))) if cells else '0')
+        lines.append(''.join(digits))
+    return '\n'.join(lines)
+
+
+def recent_focus(moves: List[dict], width: int, height: int, recent: int = 8) -> Tuple[int, int]:
+    """Centro de los últimos movimientos (o del canvas si aún no hay)"""
+    moves = moves[-recent:]
+    if not moves:
+        return width // 2, height // 2
+    return (round(sum(m['x'] for m in moves) / len(moves)),
+            round(sum(m['y'] for m in moves) / len(moves)))
+
+
+# Motor de ml_focus por tamaño de canvas: la geometría (centro, cuadrantes) se calcula una vez
+_focus_engines: Dict[Tuple[int, int], Any] = {}
+
+
+def ml_focus(grid: List[List[str]]) -> Tuple[int, int]:
+    """Celda preferida por el scorer ML (BatchedMLEngine sin exploración)"""
+    import numpy as np
+    from batch_engine import BatchedMLEngine
+
+    height, width = len(grid), len(grid[0])
+    engine = _focus_engines.get((width, height))
+    if engine is None:
+        engine = _focus_engines[(width, height)] = BatchedMLEngine(1, width, height, params={'exploration_rate': 0.0})
+    engine.grid[0] = np.array(grid) != EMPTY
+    scores = engine.score_cells()[0]
+    y, x = divmod(int(scores.argmax()), width)
+    return x, y
+
+
+class Viewport:
+    """Ventana de enfoque de tamaño fijo más un resumen grueso del resto
+
+    El prompt mide lo mismo sea cual sea el tamaño del canvas. El centro sigue
+    los movimientos recientes del agente (`focus="recent"`) o la celda que
+    prefiere el scorer ML (`focus="ml"`).
+    """
+
+    def __init__(self, width: int = 20, height: int = 10, focus: str = "recent"):
+        self.width = width
+        self.height = height
+        self.focus = focus
+        self.bounds = (0, 0, width, height)
+
+    def locate(self, canvas, moves: List[dict]) -> Tuple[int, int, int, int]:
+        """(x0, y0, ancho, alto) de la ventana, recortada al canvas"""
+        width, height = min(self.width, canvas.width), min(self.height, canvas.height)
+        if self.focus == "ml":
+            cx, cy = ml_focus(canvas.grid)
+        else:
+            cx, cy = recent_focus(moves, canvas.width, canvas.height)
+        x0 = max(0, min(cx - width // 2, canvas.width - width))
+        y0 = max(0, min(cy - height // 2, canvas.height - height))
+        self.bounds = (x0, y0, width, height)
+        return self.bounds
+
+    def render(self, canvas, moves: List[dict]) -> str:
+        """Ventana en detalle + mapa de densidad 8x4 de todo el canvas"""
+        x0, y0, width, height = self.locate(canvas, moves)
+        return (f"Tu zona de trabajo ({width}x{height} desde ({x0},{y0})):\n"
+                f"{encode_window(canvas.grid, x0, y0, width, height)}\n\n"
+                f"Mapa de ocupación del canvas completo (8x4 bloques, 0 = vacío, 9 = lleno):\n"
+                f"{coarse_map(canvas.grid)}")
+
+
+def viewport_from_config() -> Optional[Viewport]:
+    """Viewport de CONTEXT_VIEWPORT ("20x10"), o None si está desactivado"""
+    if not Config.CONTEXT_VIEWPORT:
+        return None
+    try:
+        width, height = (int(v) for v in Config.CONTEXT_VIEWPORT.lower().split('x'))
+    except ValueError:
+        print(f"⚠️ CONTEXT_VIEWPORT={Config.CONTEXT_VIEWPORT!r} no es ANCHOxALTO (p. ej. 20x10): ventana desactivada")
+        return None
+    if width <= 0 or height <= 0:
+        print(f"⚠️ CONTEXT_VIEWPORT={Config.CONTEXT_VIEWPORT!r} debe ser positivo: ventana desactivada")
+        return None
+    return Viewport(width, height, Config.CONTEXT_FOCUS)
@@ -11,6 +11,7 @@ import requests
 from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
+from lm_client import run_async
 
 class DebugApp:
     def __init__(self):
@@ -98,7 +99,7 @@ class DebugApp:
             return False
             
         try:
-            move = self.agent1.make_move(0)
+            move = run_async(self.agent1.make_move(0))
             print("✅ Agente respondió correctamente")
             print(f"📤 Movimiento: {move}")
             return True
@@ -131,7 +132,7 @@ class DebugApp:
             agent = agent1 if turn % 2 == 0 else agent2
             
             try:
-                move = agent.make_move(turn)
+                move = run_async(agent.make_move(turn))
                 
                 # Mostrar canvas actualizado
                 self.clear_screen()
@@ -213,7 +214,7 @@ class DebugApp:
             agent = agent1 if turn % 2 == 0 else agent2
             
             try:
-                move = agent.make_move(turn)
+                move = run_async(agent.make_move(turn))
                 
                 self.clear_screen()
                 print(f"Turno {turn + 1}/{turns}")
@@ -10,7 +10,14 @@ import json
 import math
 import random
 from datetime import datetime
-from openai import OpenAI
+from lm_client import get_lm_client
+from lm_executor import fan_out, waves
+from lm_json import has_keys
+from lm_metrics import session as llm_metrics, tracked
+from lm_prompts import DIVERSE_INSTRUCTIONS, layout_messages
+from lm_scheduler import BATCH, set_priority
+from lm_schemas import DIVERSE_DECISION
+from lm_transcript import seed_session
 from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
@@ -28,54 +35,33 @@ class RealDiverseLMStudio:
     def connect_lm_studio(self):
         """Conectar REALMENTE con LM Studio"""
         try:
-            self.client = OpenAI(base_url="http://localhost:1234/v1", api_key="not-needed")
+            self.client = get_lm_client()
+            if not self.client.health.probe():
+                self.console.print("[yellow]⚠️ LM Studio no responde: se usarán los fallbacks locales[/]")
             return True
         except Exception as e:
             self.console.print(f"[red]❌ LM Studio no está corriendo: {e}[/]")
             return False
     
+    @tracked('diverse')
     def ask_lm_studio_for_diverse_shape(self, context, shape_id):
         """LM Studio decide CADA FORMA ÚNICA y POSICIÓN"""
-        if not self.client:
+        if not self.client or self.client.health.is_open:
             return None
             
-        prompt = f"""
-        Eres un artista de formas ASCII ultra-creativo. Contexto:
+        messages = layout_messages(DIVERSE_INSTRUCTIONS, f"""Contexto:
         {context}
         
-        Forma #{shape_id} - DEBE ser única y creativa
-        
-        Devuelve EXACTAMENTE en formato JSON:
-        {{
-            "shape_type": "geometric|fractal|organic|abstract|symbolic|textural",
-            "specific_shape": "circle|square|triangle|diamond|hexagon|star|cross|spiral|wave|lattice|mandala|kaleidoscope",
-            "x": número 0-39,
-            "y": número 0-24,
-            "width": número 2-15,
-            "height": número 2-15,
-            "symbol": "█|▓|▒|░|▄|▀|▌|▐|◆|●|■|▲|▼|◉|◎|◈|◇|◊|★|✦|✧",
-            "rotation": 0-360,
-            "complexity": 1-10,
-            "creativity_reason": "razón creativa única",
-            "diversity_score": 1-10,
-            "artistic_intent": "intención artística"
-        }}
-        """
+        Forma #{shape_id}""")
         
         try:
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": prompt}],
+            return self.client.stream_json(
+                messages=messages,
                 temperature=0.95,
-                max_tokens=400
+                max_tokens=400,
+                validate=has_keys('specific_shape', 'x', 'y', 'width', 'height', 'symbol', 'diversity_score'),
+                schema=DIVERSE_DECISION
             )
-            
-            content = response.choices[0].message.content
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start != -1 and end != -1:
-                import json
-                return json.loads(content[start:end])
                 
         except Exception as e:
             self.console.print(f"[red]❌ Error LM Studio diversidad: {e}[/]")
@@ -232,6 +218,11 @@ class RealDiverseLMStudio:
                         points.append((x+i, y+j))
         return canvas
     
+    def report_task_error(self, shape_id, error):
+        """Fallback de fan_out: la forma se omite"""
+        self.console.print(f"[red]❌ Forma #{shape_id} fallida: {error}[/]")
+        return None
+    
     def generate_diverse_artwork(self, shapes_count=15):
         """Generar arte diverso REAL con LM Studio"""
         
@@ -247,30 +238,34 @@ class RealDiverseLMStudio:
         
         final_canvas = [[' ' for _ in range(40)] for _ in range(25)]
         
-        for shape_id in range(shapes_count):
-            # Crear forma única con LM Studio
-            diverse_shape = self.create_shape_from_lm_decision(shape_id)
-            self.shapes_created.append(diverse_shape)
-            
-            # Dibujar forma según decisión LM Studio
-            shape_canvas = self.draw_diverse_shape_from_lm(diverse_shape)
+        # Formas pedidas en paralelo por tandas: cada tanda ve el historial de las anteriores
+        for wave in waves(shapes_count):
+            wave_shapes = fan_out(self.create_shape_from_lm_decision, wave, fallback=self.report_task_error)
             
-            # Combinar en canvas final
-            for y in range(25):
-                for x in range(40):
-                    if shape_canvas[y][x] != ' ':
-                        final_canvas[y][x] = shape_canvas[y][x]
-            
-            # Guardar decisión LM Studio
-            self.lm_decisions.append({
-                'shape_id': shape_id,
-                'lm_decision': diverse_shape['lm_decision'],
-                'diversity_score': diverse_shape['diversity_score'],
-                'uniqueness_hash': diverse_shape['uniqueness_hash']
-            })
-            
-            # Mostrar progreso
-            self.console.print(f"[cyan]Forma {shape_id+1}: {diverse_shape['lm_decision']['specific_shape']} - {diverse_shape['lm_decision']['creativity_reason']}[/]")
+            for shape_id, diverse_shape in zip(wave, wave_shapes):
+                if diverse_shape is None:
+                    continue
+                self.shapes_created.append(diverse_shape)
+                
+                # Dibujar forma según decisión LM Studio
+                shape_canvas = self.draw_diverse_shape_from_lm(diverse_shape)
+                
+                # Combinar en canvas final
+                for y in range(25):
+                    for x in range(40):
+                        if shape_canvas[y][x] != ' ':
+                            final_canvas[y][x] = shape_canvas[y][x]
+                
+                # Guardar decisión LM Studio
+                self.lm_decisions.append({
+                    'shape_id': shape_id,
+                    'lm_decision': diverse_shape['lm_decision'],
+                    'diversity_score': diverse_shape['diversity_score'],
+                    'uniqueness_hash': diverse_shape['uniqueness_hash']
+                })
+                
+                # Mostrar progreso
+                self.console.print(f"[cyan]Forma {shape_id+1}: {diverse_shape['lm_decision']['specific_shape']} - {diverse_shape['lm_decision']['creativity_reason']}[/]")
         
         # Calcular métricas de diversidad
         unique_shapes = len(set([s['lm_decision']['specific_shape'] for s in self.shapes_created]))
@@ -310,7 +305,8 @@ class RealDiverseLMStudio:
                 'average_diversity': sum([s['diversity_score'] for s in self.shapes_created])/len(self.shapes_created)
             },
             'lm_studio_active': True,
-            'diversity_strategy': 'lm_studio_driven'
+            'diversity_strategy': 'lm_studio_driven',
+            'llm_metrics': llm_metrics.summary()
         }
         
         with open(f"lm_studio_diverse_{timestamp}.json", 'w', encoding='utf-8') as f:
@@ -319,5 +315,7 @@ class RealDiverseLMStudio:
         self.console.print(f"[green]✅ Diversidad LM Studio guardada en lm_studio_diverse_{timestamp}.json[/]")
 
 if __name__ == "__main__":
+    set_priority(BATCH)
+    seed_session()
     diverse = RealDiverseLMStudio()
     diverse.generate_diverse_artwork(shapes_count=12)
@@ -16,6 +16,8 @@ from rich.panel import Panel
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from collections import defaultdict, deque
+from aesthetic_fitness import AestheticFitness, grid_mask
+from config import Config
 
 class GeneticShape:
     """Genes de una forma ASCII"""
@@ -101,21 +103,33 @@ class GeneticShape:
 class EvolutionaryCanvas:
     """Canvas con evolución genética"""
     
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, fitness: AestheticFitness = None):
         self.width = width
         self.height = height
         self.grid = [[' ' for _ in range(width)] for _ in range(height)]
         self.population = []
         self.generation = 0
         self.fitness_history = []
+        # Con evaluador estético toda la población se puntúa antes de cada selección
+        self.fitness = fitness
         
     def initialize_population(self, size=20):
         """Inicializar población genética"""
         for _ in range(size):
             self.population.append(GeneticShape())
     
-    def evolve_population(self):
+    def score_population(self, position):
+        """Fitness estético de cada forma dibujada en `position` sobre el canvas actual"""
+        scores = self.fitness.score([shape.genes for shape in self.population], base=grid_mask(self.grid),
+                                    positions=[position] * len(self.population))
+        for shape, score in zip(self.population, scores):
+            shape.genes['fitness'] = score['fitness']
+    
+    def evolve_population(self, position=None):
         """Evolución de una generación"""
+        if self.fitness and position is not None:
+            self.score_population(position)
+        
         # Selección natural
         self.population.sort(key=lambda x: x.genes['fitness'], reverse=True)
         survivors = self.population[:len(self.population)//2]
@@ -254,12 +268,6 @@ class GeneticArtist:
     
     def create_evolutionary_art(self, generation: int) -> dict:
         """Crear arte con evolución genética"""
-        # Evolucionar población
-        self.canvas.evolve_population()
-        
-        # Seleccionar mejor forma
-        best_shape = max(self.canvas.population, key=lambda x: x.genes['fitness'])
-        
         # Posición evolutiva
         positions = [
             (10, 8), (25, 8), (15, 15), (30, 12), (5, 18),
@@ -269,12 +277,21 @@ class GeneticArtist:
         
         pos_x, pos_y = positions[generation % len(positions)]
         
+        # Evolucionar población (con fitness estético, puntuada en la posición donde se dibujará)
+        self.canvas.evolve_population((pos_x, pos_y))
+        
+        # Seleccionar mejor forma
+        best_shape = max(self.canvas.population, key=lambda x: x.genes['fitness'])
+        
         # Símbolos evolutivos
         symbols = ["█", "▓", "▒", "░", "▄", "▀", "▌", "▐", "•", "+", "■", "◆"]
         symbol = symbols[generation % len(symbols)]
         
         # Calcular fitness
-        fitness = best_shape.calculate_fitness(self.canvas, (pos_x, pos_y), symbol)
+        if self.canvas.fitness:
+            fitness = best_shape.genes['fitness']
+        else:
+            fitness = best_shape.calculate_fitness(self.canvas, (pos_x, pos_y), symbol)
         
         # Dibujar forma
         points = self.canvas.draw_genetic_shape(best_shape, (pos_x, pos_y), symbol)
@@ -308,7 +325,8 @@ class GeneticEvolutionApp:
     
     def __init__(self):
         self.console = Console()
-        self.canvas = EvolutionaryCanvas(40, 25)
+        fitness = AestheticFitness(40, 25) if Config.GENETIC_FITNESS == "local" else None
+        self.canvas = EvolutionaryCanvas(40, 25, fitness)
         self.client = None
     
     def clear_screen(self):
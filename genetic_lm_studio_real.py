@@ -9,72 +9,158 @@ import time
 import json
 import math
 import random
+import argparse
+import threading
 from datetime import datetime
-from openai import OpenAI
+from aesthetic_fitness import AestheticFitness
+from config import Config
+from lm_client import get_lm_client
+from lm_executor import fan_out
+from lm_json import has_keys
+from lm_metrics import session as llm_metrics, tracked
+from lm_prompts import GENETIC_INSTRUCTIONS, RANKING_INSTRUCTIONS, layout_messages
+from lm_scheduler import BATCH, set_priority
+from lm_schemas import GENETIC_DECISION, ranking_schema
+from lm_transcript import seed_session
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
+# Valores de los genes (los mismos que ofrece el prompt genético)
+SHAPES = ['circle', 'square', 'triangle', 'fractal', 'wave', 'spiral']
+SYMBOLS = ['█', '▓', '▒', '░', '◆', '●', '■']
+STRATEGIES = ['aggressive', 'conservative', 'balanced']
+# Orden de los genes para el cruce de un punto
+GENE_ORDER = ['shape', 'x', 'y', 'size', 'symbol', 'mutation_rate', 'evolution_strategy']
+# Vecinos del archivo que promedia la estimación de fitness
+ESTIMATE_NEIGHBOURS = 3
+ARCHIVE_LIMIT = 500
+
+
+def random_genes():
+    """Genes aleatorios dentro de los rangos del prompt genético"""
+    return {
+        'shape': random.choice(SHAPES),
+        'x': random.randint(0, 39),
+        'y': random.randint(0, 24),
+        'size': random.randint(3, 10),
+        'symbol': random.choice(SYMBOLS),
+        'mutation_rate': round(random.uniform(0.1, 0.5), 2),
+        'evolution_strategy': random.choice(STRATEGIES),
+        'creativity_reason': "Genes aleatorios"
+    }
+
+
+def local_mutate(genes):
+    """Mutación local: con probabilidad mutation_rate cambia un gen (copia, no modifica `genes`)"""
+    child = dict(genes)
+    if random.random() < float(child.get('mutation_rate', 0.2)):
+        gene = random.choice(['x', 'y', 'size', 'shape', 'symbol'])
+        if gene == 'x':
+            child['x'] = max(0, min(39, int(child.get('x', 20)) + random.randint(-3, 3)))
+        elif gene == 'y':
+            child['y'] = max(0, min(24, int(child.get('y', 12)) + random.randint(-3, 3)))
+        elif gene == 'size':
+            child['size'] = max(3, min(10, int(child.get('size', 5)) + random.choice([-1, 1])))
+        elif gene == 'shape':
+            child['shape'] = random.choice(SHAPES)
+        else:
+            child['symbol'] = random.choice(SYMBOLS)
+        child['creativity_reason'] = f"Mutación local de {gene}"
+    return child
+
+
+def local_crossover(genes1, genes2):
+    """Cruce local de un punto sobre GENE_ORDER"""
+    point = random.randint(1, len(GENE_ORDER) - 1)
+    child = {key: (genes1 if i < point else genes2).get(key) for i, key in enumerate(GENE_ORDER)}
+    child['creativity_reason'] = f"Cruce local en {GENE_ORDER[point]}"
+    return child
+
+
+def gene_distance(genes1, genes2):
+    """Distancia 0-1 entre dos conjuntos de genes (posición, tamaño y genes categóricos)"""
+    def number(genes, key, default):
+        try:
+            return float(genes.get(key, default))
+        except (TypeError, ValueError):
+            return default
+    
+    parts = [
+        abs(number(genes1, 'x', 20) - number(genes2, 'x', 20)) / 39,
+        abs(number(genes1, 'y', 12) - number(genes2, 'y', 12)) / 24,
+        abs(number(genes1, 'size', 5) - number(genes2, 'size', 5)) / 7,
+        abs(number(genes1, 'mutation_rate', 0.2) - number(genes2, 'mutation_rate', 0.2)),
+    ]
+    parts += [float(genes1.get(key) != genes2.get(key)) for key in ('shape', 'symbol', 'evolution_strategy')]
+    return sum(parts) / len(parts)
+
 class RealGeneticLMStudio:
     """Evolución genética donde LM Studio decide MUTACIONES y CRUCES"""
     
-    def __init__(self):
+    def __init__(self, selection_mode=None, rank_chunk=None, evolution_mode=None, llm_budget=None,
+                 population_size=None, fitness_mode=None):
         self.client = None
         self.console = Console()
         self.generation = 0
         self.population = []
         self.lm_decisions = []
+        # "batch": una consulta de ranking por bloque; "individual": una por individuo;
+        # "local": la mejor mitad por fitness, sin consultas
+        self.selection_mode = selection_mode or Config.GENETIC_SELECTION
+        self.rank_chunk = max(2, rank_chunk or Config.GENETIC_RANK_CHUNK)
+        self.selection_requests = 0
+        # "llm": todas las operaciones con LM Studio; "hybrid": operadores locales y
+        # como mucho llm_budget llamadas por generación
+        self.evolution_mode = evolution_mode or Config.GENETIC_MODE
+        self.llm_budget = llm_budget if llm_budget is not None else Config.GENETIC_LLM_BUDGET
+        self.population_size = population_size or Config.GENETIC_POPULATION
+        # Genes evaluados por LM Studio y su fitness: base de la estimación local
+        self.archive = []
+        self.next_id = 0
+        self.generation_stats = []
+        # Las decisiones corren en hilos de fan_out: contadores y archivo bajo el lock
+        self.lock = threading.Lock()
+        self.llm_calls = 0
+        # "local": el fitness lo calcula aesthetic_fitness sobre los genes rasterizados
+        self.fitness_mode = fitness_mode or Config.GENETIC_FITNESS
+        self.aesthetic = AestheticFitness() if self.fitness_mode == "local" else None
         
     def connect_lm_studio(self):
         """Conectar REALMENTE con LM Studio"""
         try:
-            self.client = OpenAI(base_url="http://localhost:1234/v1", api_key="not-needed")
+            self.client = get_lm_client()
+            # Si la sonda falla el circuito queda abierto y cada decisión va directa al fallback
+            if not self.client.health.probe():
+                self.console.print("[yellow]⚠️ LM Studio no responde: se usarán los fallbacks locales[/]")
             return True
         except Exception as e:
             self.console.print(f"[red]❌ LM Studio no está corriendo: {e}[/]")
             return False
     
+    @tracked('genetic')
     def ask_lm_studio_for_genetic_decision(self, context, decision_type):
         """LM Studio decide MUTACIONES, CRUCES y FITNESS"""
-        if not self.client:
+        if not self.client or self.client.health.is_open:
             return None
+        with self.lock:
+            self.llm_calls += 1
             
-        prompt = f"""
-        Eres un experto en algoritmos genéticos. Contexto:
+        # Instrucciones fijas primero: el servidor reutiliza su caché KV entre decisiones
+        messages = layout_messages(GENETIC_INSTRUCTIONS, f"""Contexto:
         {context}
         
-        Tipo de decisión: {decision_type}
-        
-        Devuelve EXACTAMENTE en formato JSON:
-        {{
-            "action": "mutate|crossover|select|evolve",
-            "shape": "circle|square|triangle|fractal|wave|spiral",
-            "x": número 0-39,
-            "y": número 0-24,
-            "size": número 3-10,
-            "symbol": "█|▓|▒|░|◆|●|■",
-            "mutation_rate": 0.0-1.0,
-            "fitness_score": 0-10,
-            "creativity_reason": "razón genética",
-            "evolution_strategy": "aggressive|conservative|balanced"
-        }}
-        """
+        Tipo de decisión: {decision_type}""")
         
         try:
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": prompt}],
+            return self.client.stream_json(
+                messages=messages,
                 temperature=0.7,
-                max_tokens=300
+                max_tokens=300,
+                validate=has_keys('shape', 'x', 'y', 'size', 'symbol', 'fitness_score'),
+                schema=GENETIC_DECISION
             )
-            
-            content = response.choices[0].message.content
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start != -1 and end != -1:
-                import json
-                return json.loads(content[start:end])
                 
         except Exception as e:
             self.console.print(f"[red]❌ Error LM Studio genético: {e}[/]")
@@ -91,8 +177,10 @@ class RealGeneticLMStudio:
         
         lm_decision = self.ask_lm_studio_for_genetic_decision(context, "create_individual")
         
+        created_by = 'lm_studio'
         if not lm_decision:
             # Fallback
+            created_by = 'fallback'
             lm_decision = {
                 "shape": random.choice(['circle', 'square', 'triangle']),
                 "x": random.randint(5, 35),
@@ -110,7 +198,7 @@ class RealGeneticLMStudio:
             'genes': lm_decision,
             'fitness': lm_decision['fitness_score'],
             'lm_studio_decision': lm_decision,
-            'created_by': 'lm_studio'
+            'created_by': created_by
         }
         
         return individual
@@ -129,7 +217,9 @@ class RealGeneticLMStudio:
         
         if mutation:
             child = parent.copy()
-            child['genes'].update(mutation)
+            # Genes nuevos: el padre no debe cambiar
+            child['genes'] = dict(parent['genes'], **mutation)
+            child['fitness'] = mutation.get('fitness_score', parent['fitness'])
             child['lm_studio_decision'] = mutation
             child['created_by'] = 'lm_studio_mutation'
             return child
@@ -161,22 +251,181 @@ class RealGeneticLMStudio:
         
         return None
     
-    def evolve_population(self, generations=10):
-        """Evolución genética REAL con LM Studio"""
+    def breed_pair(self, pair):
+        """Cruce de una pareja y mutación del hijo (None si no hay cruce)"""
+        child = self.crossover_with_lm_studio(*pair)
+        return self.mutate_with_lm_studio(child) if child else None
+    
+    def report_task_error(self, item, error):
+        """Fallback de fan_out: se pierde esa decisión y sigue el resto"""
+        self.console.print(f"[red]❌ Decisión genética fallida: {error}[/]")
+        return None
+    
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+    
+    def remember(self, genes, fitness):
+        """Guardar una evaluación de LM Studio para estimar el fitness de los hijos locales"""
+        try:
+            fitness = float(fitness)
+        except (TypeError, ValueError):
+            return
+        with self.lock:
+            self.archive.append((genes, fitness))
+            if len(self.archive) > ARCHIVE_LIMIT:
+                del self.archive[:len(self.archive) - ARCHIVE_LIMIT]
+    
+    def estimate_fitness(self, genes):
+        """(fitness estimado, incertidumbre) a partir de los vecinos evaluados más cercanos
         
-        if not self.connect_lm_studio():
+        El fitness es la media de los ESTIMATE_NEIGHBOURS vecinos ponderada por
+        cercanía; la incertidumbre, la distancia al vecino más cercano.
+        """
+        if not self.archive:
+            return 5.0, 1.0
+        nearest = sorted((gene_distance(genes, known), fitness)
+                         for known, fitness in self.archive)[:ESTIMATE_NEIGHBOURS]
+        weights = [1.0 / (distance + 0.05) for distance, _ in nearest]
+        estimate = sum(weight * fitness for weight, (_, fitness) in zip(weights, nearest)) / sum(weights)
+        return round(estimate, 2), round(nearest[0][0], 3)
+    
+    def make_local_individual(self, genes, parents, created_by):
+        fitness, uncertainty = self.estimate_fitness(genes)
+        return {
+            'id': self.new_id(),
+            'genes': genes,
+            'fitness': fitness,
+            'uncertainty': uncertainty,
+            'parents': [parent['id'] for parent in parents],
+            'created_by': created_by
+        }
+    
+    def pick_for_llm(self, children):
+        """Índices de los hijos que refina LM Studio
+        
+        La mitad del presupuesto (redondeando hacia arriba) va a los de mayor
+        fitness estimado y el resto a los más inciertos, lejos de todo lo evaluado.
+        """
+        budget = min(self.llm_budget, len(children))
+        indices = sorted(range(len(children)), key=lambda i: -children[i]['fitness'])
+        picked = indices[:math.ceil(budget / 2)]
+        uncertain = sorted((i for i in indices if i not in picked), key=lambda i: -children[i]['uncertainty'])
+        return picked + uncertain[:budget - len(picked)]
+    
+    def refine_with_lm_studio(self, individual):
+        """Mutación de LM Studio sobre un hijo local; su fitness pasa a ser una evaluación real"""
+        child = self.mutate_with_lm_studio(individual)
+        if child is individual:
+            return None
+        child['uncertainty'] = 0.0
+        return child
+    
+    def select_individually(self):
+        """Selección original: una consulta por individuo (en paralelo)"""
+        survivals = fan_out(self.ask_survival, self.population)
+        # Se cuenta aquí y no en ask_survival, que corre en los hilos de fan_out
+        self.selection_requests += len(self.population)
+        return [individual for individual, survival in zip(self.population, survivals)
+                if survival and survival.get('fitness_score', 0) > 5]
+    
+    def ask_survival(self, individual):
+        context = f"""
+        Selección natural. Individuo #{individual['id']}
+        Fitness: {individual['fitness']}
+        Genes: {individual['genes']}
+        
+        Decide si sobrevive o muere.
+        """
+        
+        return self.ask_lm_studio_for_genetic_decision(context, "select")
+    
+    def select_locally(self):
+        """Selección sin LM Studio: la mejor mitad de la población por fitness"""
+        ranked = sorted(self.population, key=lambda ind: -ind['fitness'])
+        return ranked[:max(2, len(ranked) // 2)]
+    
+    def score_locally(self, individuals):
+        """Fitness estético (0-10) de los individuos en una pasada; el declarado por LM Studio queda en sus genes"""
+        if not self.aesthetic or not individuals:
             return
+        scores = self.aesthetic.score([ind['genes'] for ind in individuals])
+        for individual, score in zip(individuals, scores):
+            individual['fitness'] = round(10 * score['fitness'], 2)
+            individual['aesthetic'] = score
+    
+    def select_by_ranking(self):
+        """Selección por bloques: LM Studio ve los genes de todo el bloque y devuelve los supervivientes ordenados"""
+        chunks = [self.population[start:start + self.rank_chunk]
+                  for start in range(0, len(self.population), self.rank_chunk)]
+        selected = []
+        for chunk, survivors in zip(chunks, fan_out(self.rank_chunk_with_lm_studio, chunks)):
+            if survivors is None:
+                # Fallback: mismo umbral que la selección individual, con el fitness ya conocido
+                survivors = sorted((ind for ind in chunk if ind['fitness'] > 5), key=lambda ind: -ind['fitness'])
+            selected.extend(survivors)
+        return selected
+    
+    @tracked('ranking')
+    def rank_chunk_with_lm_studio(self, chunk):
+        """Supervivientes de un bloque en orden de mejor a peor, o None si LM Studio no responde"""
+        if not self.client or self.client.health.is_open:
+            return None
         
-        self.console.print(Panel("""
-╔══════════════════════════════════════════════════════════════════════════════╗
-║                    🧬 EVOLUCIÓN GENÉTICA LM STUDIO REAL                     ║
-║                   ¡Cada decisión tomada por LM Studio!                      ║
-╚══════════════════════════════════════════════════════════════════════════════╝
-        """, style="bold bright_magenta"))
+        # Índices dentro del bloque: los ids de los hijos pueden repetirse
+        lines = []
+        for index, individual in enumerate(chunk):
+            genes = individual['genes']
+            lines.append(f"{index}: {genes.get('shape')} ({genes.get('x')},{genes.get('y')}) "
+                         f"size={genes.get('size')} {genes.get('symbol')} "
+                         f"{genes.get('evolution_strategy', '-')} fit={individual['fitness']}")
+        
+        context = f"Generación {self.generation}. Población:\n" + "\n".join(lines)
         
-        # Población inicial con LM Studio
-        for i in range(20):
-            individual = self.create_individual_from_lm_decision(i)
+        try:
+            ranking = self.client.complete_json(
+                messages=layout_messages(RANKING_INSTRUCTIONS, context),
+                schema=ranking_schema(len(chunk)),
+                validate=has_keys('survivors'),
+                temperature=0.3,
+                max_tokens=8 * len(chunk) + 80
+            )
+        except Exception as e:
+            self.console.print(f"[red]❌ Error LM Studio ranking: {e}[/]")
+            return None
+        finally:
+            with self.lock:
+                self.selection_requests += 1
+        
+        if not ranking or not isinstance(ranking['survivors'], list):
+            return None
+        
+        survivors = []
+        seen = set()
+        for index in ranking['survivors']:
+            if isinstance(index, int) and 0 <= index < len(chunk) and index not in seen:
+                seen.add(index)
+                survivors.append(chunk[index])
+        
+        self.lm_decisions.append({
+            'generation': self.generation,
+            'selection': 'batch',
+            'survivors': [ind['id'] for ind in survivors],
+            'lm_decision': ranking
+        })
+        return survivors
+    
+    def create_initial_population(self):
+        """Población inicial: toda con LM Studio, o en modo híbrido solo llm_budget individuos y el resto aleatorio"""
+        llm_count = self.population_size
+        if self.evolution_mode == "hybrid":
+            llm_count = min(self.llm_budget, self.population_size)
+        
+        # Decisiones independientes, en paralelo
+        initial = fan_out(self.create_individual_from_lm_decision, range(llm_count), fallback=self.report_task_error)
+        for i, individual in enumerate(initial):
+            if individual is None:
+                continue
             self.population.append(individual)
             self.lm_decisions.append({
                 'generation': 0,
@@ -184,50 +433,149 @@ class RealGeneticLMStudio:
                 'lm_decision': individual['lm_studio_decision']
             })
         
+        self.next_id = llm_count
+        while len(self.population) < self.population_size:
+            self.population.append(self.make_local_individual(random_genes(), [], 'random'))
+        self.score_locally(self.population)
+        self.remember_evaluated(ind for ind in self.population if ind['created_by'] == 'lm_studio')
+    
+    def remember_evaluated(self, individuals):
+        """Archivar los individuos de LM Studio con su fitness definitivo (el estético si es local)"""
+        for individual in individuals:
+            self.remember(individual['genes'], individual['fitness'])
+    
+    def llm_generation(self):
+        """Generación original: selección, cruce y mutación con LM Studio"""
+        if self.selection_mode == "batch":
+            selected = self.select_by_ranking()
+        elif self.selection_mode == "local":
+            selected = self.select_locally()
+        else:
+            selected = self.select_individually()
+        
+        # Cruce y mutación con LM Studio: cada pareja es independiente
+        pairs = [(selected[i], selected[i+1]) for i in range(0, len(selected) - 1, 2)]
+        new_population = []
+        for mutated_child in fan_out(self.breed_pair, pairs, fallback=self.report_task_error):
+            if mutated_child:
+                new_population.append(mutated_child)
+                self.lm_decisions.append({
+                    'generation': self.generation,
+                    'child_id': mutated_child['id'],
+                    'lm_decision': mutated_child['lm_studio_decision']
+                })
+        
+        self.population = new_population
+        self.score_locally(self.population)
+    
+    def hybrid_generation(self):
+        """Generación híbrida: selección y cría locales, LM Studio solo para llm_budget hijos"""
+        ranked = sorted(self.population, key=lambda ind: -ind['fitness'])
+        parents = ranked[:max(2, len(ranked) // 2)]
+        elites = ranked[:min(2, self.population_size - 1)]
+        
+        children = []
+        while len(elites) + len(children) < self.population_size:
+            if len(parents) >= 2:
+                pair = random.sample(parents, 2)
+                genes = local_mutate(local_crossover(pair[0]['genes'], pair[1]['genes']))
+            elif parents:
+                # Población reducida a un individuo: solo mutación
+                pair = parents[:1]
+                genes = local_mutate(pair[0]['genes'])
+            else:
+                pair, genes = [], random_genes()
+            children.append(self.make_local_individual(genes, pair, 'local'))
+        # Con fitness local los hijos prometedores se eligen por su puntuación real
+        self.score_locally(elites + children)
+        
+        picked = self.pick_for_llm(children) if self.llm_budget > 0 else []
+        refined = fan_out(self.refine_with_lm_studio, [children[i] for i in picked], fallback=self.report_task_error)
+        evaluated = []
+        for index, child in zip(picked, refined):
+            if child is not None:
+                children[index] = child
+                evaluated.append(child)
+                self.lm_decisions.append({
+                    'generation': self.generation,
+                    'child_id': child['id'],
+                    'lm_decision': child['lm_studio_decision']
+                })
+        
+        self.population = elites + children
+        self.score_locally(self.population)
+        self.remember_evaluated(evaluated)
+    
+    def record_generation(self, started, llm_calls):
+        """Coste y calidad de la generación recién terminada"""
+        fitness = [ind['fitness'] for ind in self.population] or [0]
+        evaluated = [ind['fitness'] for ind in self.population if ind['created_by'].startswith('lm_studio')]
+        stats = {
+            'generation': self.generation,
+            'seconds': round(time.perf_counter() - started, 3),
+            'llm_calls': self.llm_calls - llm_calls,
+            'population': len(self.population),
+            'best': max(fitness),
+            'mean': round(sum(fitness) / len(fitness), 2),
+            'best_evaluated': max(evaluated) if evaluated else None,
+            'evaluated_share': round(len(evaluated) / max(1, len(self.population)), 2)
+        }
+        self.generation_stats.append(stats)
+        return stats
+    
+    def run_generations(self, generations, verbose=True):
+        """Población inicial y `generations` generaciones en el modo configurado"""
+        self.create_initial_population()
+        
         for gen in range(generations):
             self.generation = gen + 1
+            started, llm_calls = time.perf_counter(), self.llm_calls
+            if self.evolution_mode == "hybrid":
+                self.hybrid_generation()
+            else:
+                self.llm_generation()
+            stats = self.record_generation(started, llm_calls)
             
-            # Selección por LM Studio
-            selected = []
-            for individual in self.population:
-                context = f"""
-                Selección natural. Individuo #{individual['id']}
-                Fitness: {individual['fitness']}
-                Genes: {individual['genes']}
-                
-                Decide si sobrevive o muere.
-                """
-                
-                survival = self.ask_lm_studio_for_genetic_decision(context, "select")
-                if survival and survival.get('fitness_score', 0) > 5:
-                    selected.append(individual)
-            
-            # Cruce y mutación con LM Studio
-            new_population = []
-            for i in range(0, len(selected), 2):
-                if i + 1 < len(selected):
-                    child = self.crossover_with_lm_studio(selected[i], selected[i+1])
-                    if child:
-                        mutated_child = self.mutate_with_lm_studio(child)
-                        new_population.append(mutated_child)
-                        self.lm_decisions.append({
-                            'generation': self.generation,
-                            'child_id': mutated_child['id'],
-                            'lm_decision': mutated_child['lm_studio_decision']
-                        })
-            
-            self.population = new_population
-            
+            if not verbose:
+                continue
             # Mostrar progreso
             self.console.print(f"[cyan]Generación {gen+1}: {len(self.population)} individuos[/]")
-            for ind in self.population:
-                self.console.print(f"  [yellow]#{ind['id']}: {ind['genes']['shape']} - {ind['genes']['creativity_reason']}[/]")
+            if self.evolution_mode == "hybrid":
+                self.console.print(f"  [yellow]{stats['seconds']:.2f}s, {stats['llm_calls']} llamadas LM Studio, "
+                                   f"fitness mejor {stats['best']} / medio {stats['mean']}, "
+                                   f"evaluados {stats['evaluated_share']:.0%}[/]")
+            else:
+                for ind in self.population:
+                    self.console.print(f"  [yellow]#{ind['id']}: {ind['genes']['shape']} - {ind['genes']['creativity_reason']}[/]")
+    
+    def evolve_population(self, generations=10):
+        """Evolución genética REAL con LM Studio"""
+        
+        if not self.connect_lm_studio():
+            return
+        
+        self.console.print(Panel("""
+╔══════════════════════════════════════════════════════════════════════════════╗
+║                    🧬 EVOLUCIÓN GENÉTICA LM STUDIO REAL                     ║
+║                   ¡Cada decisión tomada por LM Studio!                      ║
+╚══════════════════════════════════════════════════════════════════════════════╝
+        """, style="bold bright_magenta"))
+        
+        self.run_generations(generations)
         
+        if self.evolution_mode == "hybrid":
+            budget, selection = f" (presupuesto {self.llm_budget}/generación)", ""
+        else:
+            # En modo híbrido la selección es local: no hay consultas que contar
+            budget, selection = "", f"\n- Consultas de selección: {self.selection_requests} ({self.selection_mode})"
         # Resultado final
         final_stats = f"""
 🧬 EVOLUCIÓN GENÉTICA LM STUDIO COMPLETADA:
 - Generaciones: {generations}
+- Modo: {self.evolution_mode}
+- Fitness: {self.fitness_mode}
 - Decisiones LM Studio: {len(self.lm_decisions)}
+- Llamadas LM Studio: {self.llm_calls}{budget}{selection}
 - Individuos finales: {len(self.population)}
 - Formas únicas: {len(set([ind['genes']['shape'] for ind in self.population]))}
 - Estrategias evolutivas: {len(set([ind['genes']['evolution_strategy'] for ind in self.population]))}
@@ -247,16 +595,77 @@ class RealGeneticLMStudio:
                 'final_population': self.population,
                 'lm_decisions': self.lm_decisions,
                 'lm_studio_active': True,
-                'evolution_strategy': 'lm_studio_driven'
+                'selection_mode': self.selection_mode,
+                'selection_requests': self.selection_requests,
+                'evolution_strategy': 'hybrid' if self.evolution_mode == "hybrid" else 'lm_studio_driven',
+                'llm_budget': self.llm_budget if self.evolution_mode == "hybrid" else None,
+                'fitness_mode': self.fitness_mode,
+                'llm_calls': self.llm_calls,
+                'generation_stats': self.generation_stats
             },
-            'timestamp': timestamp
+            'timestamp': timestamp,
+            'llm_metrics': llm_metrics.summary()
         }
         
         with open(f"lm_studio_genetic_{timestamp}.json", 'w', encoding='utf-8') as f:
             json.dump(result, f, indent=2, ensure_ascii=False)
         
         self.console.print(f"[green]✅ Evolución genética LM Studio guardada en lm_studio_genetic_{timestamp}.json[/]")
+    
+    def budget_sweep(self, budgets, generations=5):
+        """Evolución híbrida con cada presupuesto de llamadas por generación: calidad frente a coste"""
+        if not self.connect_lm_studio():
+            return
+        
+        rows = []
+        for budget in budgets:
+            run = RealGeneticLMStudio(self.selection_mode, self.rank_chunk, "hybrid", budget, self.population_size,
+                                      self.fitness_mode)
+            run.client = self.client
+            run.run_generations(generations, verbose=False)
+            stats = run.generation_stats
+            evaluated = [s['best_evaluated'] for s in stats if s['best_evaluated'] is not None]
+            rows.append({
+                'budget': budget,
+                'seconds_per_generation': round(sum(s['seconds'] for s in stats) / max(1, len(stats)), 3),
+                'llm_calls': run.llm_calls,
+                'final_best': stats[-1]['best'] if stats else None,
+                'final_mean': stats[-1]['mean'] if stats else None,
+                'best_evaluated': max(evaluated) if evaluated else None,
+                'evaluated_share': stats[-1]['evaluated_share'] if stats else 0.0,
+                'generation_stats': stats
+            })
+        
+        table = Table(title=f"Evolución híbrida: {generations} generaciones, población {self.population_size}")
+        for column in ("Presupuesto", "s/generación", "Llamadas LLM", "Mejor", "Medio", "Mejor evaluado", "Evaluados"):
+            table.add_column(column, justify="right")
+        for row in rows:
+            table.add_row(str(row['budget']), f"{row['seconds_per_generation']:.2f}", str(row['llm_calls']),
+                          str(row['final_best']), str(row['final_mean']), str(row['best_evaluated'] or "-"),
+                          f"{row['evaluated_share']:.0%}")
+        self.console.print(table)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        with open(f"lm_studio_genetic_sweep_{timestamp}.json", 'w', encoding='utf-8') as f:
+            json.dump({'generations': generations, 'population_size': self.population_size,
+                       'fitness_mode': self.fitness_mode, 'runs': rows,
+                       'timestamp': timestamp, 'llm_metrics': llm_metrics.summary()}, f, indent=2, ensure_ascii=False)
+        self.console.print(f"[green]✅ Barrido guardado en lm_studio_genetic_sweep_{timestamp}.json[/]")
 
 if __name__ == "__main__":
-    genetic = RealGeneticLMStudio()
-    genetic.evolve_population(generations=5)
+    parser = argparse.ArgumentParser(description="Evolución genética con LM Studio")
+    parser.add_argument('--mode', choices=['llm', 'hybrid'], default=None)
+    parser.add_argument('--budget', type=int, default=None, help="llamadas LM Studio por generación (hybrid)")
+    parser.add_argument('--fitness', choices=['llm', 'local'], default=None)
+    parser.add_argument('--generations', type=int, default=5)
+    parser.add_argument('--sweep', default=None, help="presupuestos a comparar en modo híbrido, p. ej. 0,2,4,8")
+    args = parser.parse_args()
+    
+    # Lote largo: cede el paso a los turnos interactivos que compartan el servidor
+    set_priority(BATCH)
+    seed_session()
+    genetic = RealGeneticLMStudio(evolution_mode=args.mode, llm_budget=args.budget, fitness_mode=args.fitness)
+    if args.sweep:
+        genetic.budget_sweep([int(b) for b in args.sweep.split(',')], generations=args.generations)
+    else:
+        genetic.evolve_population(generations=args.generations)
@@ -3,8 +3,8 @@ import asyncio
 import json
 import time
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
-import threading
+from lm_client import get_lm_client, get_background_loop
+from lm_scheduler import INTERACTIVE, set_priority
 import queue
 from dataclasses import dataclass
 import numpy as np
@@ -12,6 +12,7 @@ import numpy as np
 # Importar nuestras clases
 from canvas import Canvas
 from agent import DrawingAgent
+from turn_scheduler import TurnScheduler
 from config import Config
 
 @dataclass
@@ -38,21 +39,16 @@ class GradioInterface:
         self.client = None
         self.update_queue = queue.Queue()
         self.setup_complete = False
+        # Turnos con deadline (y ritmo objetivo): si el LLM tarda, se dibuja el movimiento ML local
+        self.scheduler = TurnScheduler() if self.config.TURN_BUDGET > 0 or self.config.TURN_RATE > 0 else None
         
     def setup_lm_studio(self, base_url: str, api_key: str) -> Dict[str, Any]:
         """Configurar conexión con LM Studio"""
         try:
-            self.client = OpenAI(
-                base_url=base_url,
-                api_key=api_key
-            )
+            self.client = get_lm_client(base_url, api_key)
             
-            # Probar conexión
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
+            # Probar conexión (sonda barata a /models)
+            self.client.health_check()
             
             self.setup_complete = True
             return {"status": "success", "message": "✅ LM Studio conectado correctamente"}
@@ -143,9 +139,11 @@ class GradioInterface:
         self.state.delay = delay
         self.state.is_running = True
         self.state.current_turn = 0
+        if self.scheduler and self.scheduler.governor:
+            self.scheduler.governor.reset(max_turns)
         
-        # Iniciar el dibujo en un thread separado
-        threading.Thread(target=self._run_drawing_process, daemon=True).start()
+        # Iniciar el dibujo en el event loop compartido (de larga vida)
+        get_background_loop().submit(self._run_drawing_process())
         
         return "🎨 Proceso de dibujo iniciado"
     
@@ -154,8 +152,10 @@ class GradioInterface:
         self.state.is_running = False
         return "⏹️ Proceso detenido"
     
-    def _run_drawing_process(self):
+    async def _run_drawing_process(self):
         """Ejecutar el proceso de dibujo"""
+        # Los turnos que ve el usuario pasan delante de los lotes en el mismo servidor
+        set_priority(INTERACTIVE)
         agents = [self.state.agent1, self.state.agent2]
         current_agent_idx = 0
         
@@ -164,10 +164,17 @@ class GradioInterface:
                 current_agent = agents[current_agent_idx]
                 
                 # El agente hace su movimiento
-                move = asyncio.run(current_agent.make_move(self.state.current_turn))
+                if self.scheduler:
+                    move = await self.scheduler.play_turn(current_agent, self.state.current_turn)
+                else:
+                    move = await current_agent.make_move(self.state.current_turn)
                 
                 # Actualizar mensajes
                 message = f"Turno {self.state.current_turn + 1}: {current_agent.name} dibujó '{move['symbol']}' en ({move['x']}, {move['y']})"
+                if move.get('governed'):
+                    message += " (ML local, ritmo objetivo)"
+                elif move.get('source') == 'local':
+                    message += " (ML local, LLM fuera de plazo)"
                 self.state.messages.append(message)
                 
                 # Limitar mensajes
@@ -184,7 +191,7 @@ class GradioInterface:
                     self.state.is_running = False
                     break
                 
-                time.sleep(self.state.delay)
+                await asyncio.sleep(self.state.delay)
                 
             except Exception as e:
                 self.state.messages.append(f"❌ Error: {str(e)}")
@@ -193,6 +200,8 @@ class GradioInterface:
         
         if self.state.current_turn >= self.state.max_turns:
             self.state.messages.append("⏰ Límite de turnos alcanzado")
+        if self.scheduler and self.scheduler.governor:
+            self.state.messages.append(f"⏱️ Ritmo: {self.scheduler.governor.describe()}")
         
         self.state.is_running = False
     
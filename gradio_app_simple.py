@@ -3,6 +3,7 @@ import time
 from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
+from lm_client import run_async
 from config import Config
 import threading
 import json
@@ -76,7 +77,7 @@ class SimpleGradioApp:
             while self.is_running and self.current_turn < max_turns:
                 try:
                     agent = agents[idx]
-                    move = agent.make_move(self.current_turn)
+                    move = run_async(agent.make_move(self.current_turn))
                     
                     msg = f"Turno {self.current_turn+1}: {agent.name} dibujó '{move['symbol']}'"
                     self.messages.append(msg)
@@ -4,6 +4,7 @@ import threading
 from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
+from lm_client import run_async
 from config import Config
 
 class MinimalGradioApp:
@@ -55,7 +56,7 @@ class MinimalGradioApp:
             while self.is_running and self.current_turn < max_turns:
                 try:
                     agent = agents[idx]
-                    move = agent.make_move(self.current_turn)
+                    move = run_async(agent.make_move(self.current_turn))
                     
                     self.messages.append(f"Turno {self.current_turn+1}: {agent.name} dibujó '{move['symbol']}'")
                     self.current_turn += 1
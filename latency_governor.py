@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Gobernador de latencia
+Mantiene un ritmo objetivo de turnos por segundo decidiendo en cada turno si
+se consulta al LLM o se usa el scorer local, según la latencia reciente de
+cada camino, para que una sesión de MAX_TURNS dure lo previsto con cualquier
+modelo cargado
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+
+
+class LatencyGovernor:
+    """Controlador de la fracción de turnos que van al LLM
+
+    Con latencias medias `llm` y `local` (medias móviles) y el tiempo fuera de
+    la decisión (render, pausas), la fracción que cabe en el tiempo por turno
+    permitido es `(permitido - local - resto) / (llm - local)`. El tiempo
+    permitido sale de lo que queda hasta el final previsto de la sesión (con
+    `total_turns`) o del periodo objetivo corregido por el retraso acumulado.
+    Un acumulador reparte los turnos LLM de forma regular, y cada `probe_every`
+    turnos locales se consulta igualmente al LLM para refrescar su latencia.
+    """
+
+    def __init__(self, target_rate: Optional[float] = None, total_turns: Optional[int] = None,
+                 smoothing: float = 0.3, catchup_turns: int = 10, probe_every: int = 20):
+        self.target_rate = target_rate if target_rate is not None else Config.TURN_RATE
+        self.smoothing = smoothing
+        self.catchup_turns = max(1, catchup_turns)
+        self.probe_every = probe_every
+        self.reset(total_turns)
+
+    def reset(self, total_turns: Optional[int] = None):
+        """Empezar una sesión nueva (opcionalmente de `total_turns` turnos)"""
+        self.total_turns = total_turns
+        self.started: Optional[float] = None
+        self.last: Optional[float] = None
+        self.turns = 0
+        self.llm_turns = 0
+        self.since_llm = 0
+        self.credit = 0.0
+        self.share = 1.0
+        self.llm_latency: Optional[float] = None
+        self.local_latency: Optional[float] = None
+        self.overhead = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.target_rate > 0
+
+    def _smooth(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.smoothing * (value - current)
+
+    def allowed_turn_time(self, now: float) -> float:
+        """Segundos que puede durar el próximo turno para llegar al ritmo objetivo"""
+        period = 1.0 / self.target_rate
+        elapsed = now - self.started
+        if self.total_turns:
+            remaining = max(1, self.total_turns - self.turns)
+            return max(0.0, (self.total_turns * period - elapsed) / remaining)
+        behind = elapsed - self.turns * period
+        return max(0.0, period - behind / self.catchup_turns)
+
+    def compute_share(self, now: float) -> float:
+        if self.llm_latency is None:
+            # Aún sin medir el LLM: se prueba
+            return 1.0
+        local = self.local_latency or 0.0
+        if self.llm_latency <= local:
+            return 1.0
+        allowed = self.allowed_turn_time(now) - self.overhead
+        return min(1.0, max(0.0, (allowed - local) / (self.llm_latency - local)))
+
+    def use_llm(self) -> bool:
+        """¿Consultar al LLM en este turno?"""
+        if not self.enabled:
+            return True
+        now = time.monotonic()
+        if self.started is None:
+            self.started = self.last = now
+
+        self.share = self.compute_share(now)
+        self.credit += self.share
+        if self.credit >= 1.0 or (self.probe_every and self.since_llm >= self.probe_every):
+            self.credit = max(0.0, self.credit - 1.0)
+            return True
+        return False
+
+    def record(self, latency: float, consulted: bool):
+        """Fin de turno: `latency` de la decisión y si se consultó al LLM (aunque llegara tarde)"""
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now - latency
+        wall = now - self.last if self.last is not None else latency
+        self.last = now
+        self.overhead = self._smooth(self.overhead if self.turns else None, max(0.0, wall - latency))
+
+        self.turns += 1
+        if consulted:
+            self.llm_turns += 1
+            self.since_llm = 0
+            self.llm_latency = self._smooth(self.llm_latency, latency)
+        else:
+            self.since_llm += 1
+            self.local_latency = self._smooth(self.local_latency, latency)
+
+    def report(self) -> Dict[str, Any]:
+        """Ritmo conseguido frente al objetivo y fracción de turnos con LLM"""
+        elapsed = (self.last - self.started) if self.started is not None and self.last is not None else 0.0
+        return {
+            'target_rate': self.target_rate,
+            'achieved_rate': self.turns / elapsed if elapsed > 0 else None,
+            'turns': self.turns,
+            'llm_turns': self.llm_turns,
+            'llm_share': self.llm_turns / self.turns if self.turns else 0.0,
+            'current_share': self.share,
+            'elapsed': round(elapsed, 3),
+            'llm_latency': self.llm_latency,
+            'local_latency': self.local_latency,
+            'overhead': self.overhead,
+        }
+
+    def describe(self) -> str:
+        report = self.report()
+        rate = f"{report['achieved_rate']:.2f}" if report['achieved_rate'] else "-"
+        return (f"{rate} turnos/s (objetivo {self.target_rate:.2f}), "
+                f"LLM en {report['llm_turns']}/{report['turns']} turnos ({report['llm_share']:.0%})")
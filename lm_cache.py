@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Caché de respuestas LM Studio
+Caché en disco (SQLite) por hash de (modelo, mensajes, temperatura, max_tokens)
+con expulsión LRU/TTL y tamaño máximo
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+
+def request_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                extra: Optional[Dict[str, Any]] = None) -> str:
+    """Hash estable de la petición (extra: otros parámetros que cambian la salida)"""
+    payload = json.dumps({
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'extra': extra or {}
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Respuestas de LM Studio guardadas en SQLite"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.path = path or Config.LM_CACHE_PATH
+        self.max_entries = max_entries if max_entries is not None else Config.LM_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else Config.LM_CACHE_MAX_BYTES
+        self.ttl = ttl if ttl is not None else Config.LM_CACHE_TTL
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.db = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)")
+        self.db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Respuesta guardada o None (las caducadas se borran al leerlas)"""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created = row
+            if self.ttl > 0 and now - created > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.db.commit()
+                self.misses += 1
+                return None
+
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        """Guardar una respuesta y aplicar los límites de tamaño"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self.evict(now)
+            self.db.commit()
+
+    def evict(self, now: float):
+        """Borrar caducadas y después las menos usadas hasta cumplir los límites"""
+        if self.ttl > 0:
+            self.db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        freed_count, freed_bytes = 0, 0
+        victims = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            if count - freed_count <= self.max_entries and total - freed_bytes <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed_count += 1
+            freed_bytes += size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def clear(self):
+        """Vaciar la caché"""
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Aciertos, fallos y ocupación"""
+        with self.lock:
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': count,
+            'bytes': total
+        }
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Cliente LM Studio compartido
+Pool de conexiones keep-alive, deadlines por llamada, reintentos con jitter
+límite de concurrencia y circuit breaker para todas las decisiones
+(síncronas y asíncronas)
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import weakref
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from config import Config
+from lm_cache import ResponseCache, request_key
+from lm_json import JsonObjectScanner, parse_json_tolerant, parse_stats
+from lm_schemas import response_format
+from lm_health import CircuitOpenError, get_health_monitor
+from lm_metrics import add, mark_first_token, note
+from lm_scheduler import RequestScheduler
+from context_encoder import estimate_tokens
+
+# Errores transitorios que merecen un reintento
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+# Un 400 que nombra alguno de estos es un rechazo del esquema, no de la petición
+SCHEMA_ERROR_MARKERS = ('response_format', 'json_schema', 'grammar')
+
+
+def is_schema_error(error: openai.BadRequestError) -> bool:
+    text = f"{error.message} {error.body}".lower()
+    return any(marker in text for marker in SCHEMA_ERROR_MARKERS)
+
+
+class LMStudioClient:
+    """Cliente único para LM Studio con timeouts, reintentos y concurrencia acotada"""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, pool_size: Optional[int] = None,
+                 openai_client: Optional[OpenAI] = None, cache: Optional[ResponseCache] = None):
+        self.base_url = base_url or Config.LM_STUDIO_BASE_URL
+        self.api_key = api_key or Config.LM_STUDIO_API_KEY
+        self.timeout = timeout if timeout is not None else Config.LM_STUDIO_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else Config.LM_STUDIO_MAX_RETRIES
+        self.max_concurrency = max_concurrency or Config.LM_STUDIO_MAX_CONCURRENCY
+        self.pool_size = pool_size or Config.LM_STUDIO_POOL_SIZE
+        self.model = Config.LM_STUDIO_MODEL
+
+        if openai_client is not None:
+            # Envolver un cliente existente (p. ej. el que crea una app antigua): su URL y su
+            # clave valen también para la sonda de salud y los clientes asíncronos
+            self.http_client = None
+            self.client = openai_client
+            self.base_url = str(openai_client.base_url)
+            self.api_key = openai_client.api_key
+        else:
+            self.http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=min(5.0, self.timeout))
+            )
+            # Los reintentos los gestionamos aquí, con jitter y deadline
+            self.client = OpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                http_client=self.http_client,
+                max_retries=0
+            )
+
+        # Huecos del servidor compartidos por hilos y corrutinas, por clase de prioridad
+        self.scheduler = RequestScheduler(self.max_concurrency)
+        # Una caché inyectada (p. ej. la del EndpointPool) es compartida: la cierra su dueño
+        self.owns_cache = cache is None
+        self.cache = cache if cache is not None else (ResponseCache() if Config.LM_CACHE_ENABLED else None)
+        # Circuit breaker compartido con los demás clientes del mismo servidor
+        self.health = get_health_monitor(str(self.client.base_url), self.api_key)
+        # Salida con esquema: None = sin probar, True/False = el servidor la acepta o no
+        self.structured_output: Optional[bool] = None if Config.LM_STRUCTURED_OUTPUT else False
+
+        # Clientes asíncronos: httpx.AsyncClient va ligado a un loop
+        self.async_clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+    def backoff(self, attempt: int) -> float:
+        """Espera exponencial con jitter completo"""
+        return random.uniform(0, min(Config.LM_STUDIO_BACKOFF_MAX, Config.LM_STUDIO_BACKOFF_BASE * 2 ** attempt))
+
+    def admit(self, last_error: Optional[BaseException] = None):
+        """Lanzar CircuitOpenError si el circuito no deja pasar la llamada"""
+        if not self.health.allow_request():
+            raise CircuitOpenError(f"LM Studio no disponible en {self.health.base_url} (circuito abierto)") from last_error
+
+    def health_check(self):
+        """Sonda barata a /models; lanza ConnectionError si LM Studio no responde"""
+        if not self.health.probe():
+            raise ConnectionError(f"LM Studio no responde en {self.health.base_url}/models")
+
+    def cacheable(self, temperature: float, cache: Optional[bool]) -> bool:
+        if self.cache is None or cache is False:
+            return False
+        return cache is True or temperature == 0 or Config.LM_CACHE_ANY_TEMPERATURE
+
+    def cache_key(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                  model: Optional[str], cache: Optional[bool], extra: Dict[str, Any]) -> Optional[str]:
+        """Clave de caché, o None si esta llamada no se cachea
+
+        cache=False la salta siempre; cache=True la permite con cualquier
+        temperatura; None solo cachea respuestas deterministas (temperatura 0)
+        salvo que LM_CACHE_ANY_TEMPERATURE esté activo. La clave incluye el
+        servidor y el modelo que sirve (LM_STUDIO_MODEL suele ser un marcador):
+        al cambiar de modelo no se reutilizan las respuestas del anterior.
+        """
+        if not self.cacheable(temperature, cache):
+            return None
+        served_model = self.health.served_model()
+        if served_model is None:
+            # Sin saber qué modelo responde no se puede reutilizar nada con seguridad
+            return None
+        served = {'base_url': self.health.base_url, 'served_model': served_model}
+        return request_key(model or self.model, messages, temperature, max_tokens, dict(extra, **served))
+
+    def structured_kwargs(self, kwargs: Dict[str, Any], schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Añadir `response_format` con el esquema si el servidor no lo ha rechazado antes"""
+        if schema is None or self.structured_output is False:
+            return kwargs
+        return dict(kwargs, response_format=response_format(schema))
+
+    def structured_rejected(self, request: Dict[str, Any], error: openai.BadRequestError) -> bool:
+        """¿El 400 recibido se debe a `response_format`?
+
+        Solo si el servidor aún no lo ha aceptado nunca y el error habla del
+        esquema: un contexto demasiado largo o un max_tokens inválido no lo desactivan.
+        """
+        return 'response_format' in request and not self.structured_output and is_schema_error(error)
+
+    def disable_structured(self, error: openai.BadRequestError):
+        """La repetición sin esquema funcionó: no volver a pedirlo en este proceso"""
+        if self.structured_output is not False:
+            self.structured_output = False
+            print(f"⚠️ {self.base_url} rechaza response_format, se sigue sin esquema: {error.message}", file=sys.stderr)
+
+    def _with_schema(self, call: Callable[..., Any], schema: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> Any:
+        request = self.structured_kwargs(kwargs, schema)
+        try:
+            result = call(**request)
+        except openai.BadRequestError as e:
+            if not self.structured_rejected(request, e):
+                raise
+            result = call(**kwargs)
+            self.disable_structured(e)
+            return result
+        if 'response_format' in request:
+            self.structured_output = True
+        return result
+
+    async def _awith_schema(self, call: Callable[..., Awaitable[Any]], schema: Optional[Dict[str, Any]],
+                            kwargs: Dict[str, Any]) -> Any:
+        request = self.structured_kwargs(kwargs, schema)
+        try:
+            result = await call(**request)
+        except openai.BadRequestError as e:
+            if not self.structured_rejected(request, e):
+                raise
+            result = await call(**kwargs)
+            self.disable_structured(e)
+            return result
+        if 'response_format' in request:
+            self.structured_output = True
+        return result
+
+    def complete(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                 max_tokens: int = 200, timeout: Optional[float] = None,
+                 model: Optional[str] = None, cache: Optional[bool] = None,
+                 schema: Optional[Dict[str, Any]] = None, **kwargs: Any) -> str:
+        """Completar un chat y devolver el texto; lanza la última excepción si se agota el deadline
+
+        Con `schema` (ver lm_schemas) se pide salida restringida al esquema; si
+        el servidor no la soporta se repite la llamada sin él y no se vuelve a pedir.
+        """
+        key = self.cache_key(messages, temperature, max_tokens, model, cache, kwargs)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                note(cached=True)
+                return cached
+
+        content = self._with_schema(
+            lambda **request: self._complete(messages, temperature, max_tokens, timeout, model, **request),
+            schema, kwargs
+        )
+        if key and content:
+            self.cache.put(key, content)
+        return content
+
+    def _complete(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                  timeout: Optional[float], model: Optional[str], **kwargs: Any) -> str:
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self.admit(last_error)
+            try:
+                with self.scheduler.slot():
+                    response = self.client.chat.completions.create(
+                        model=model or self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=remaining,
+                        **kwargs
+                    )
+                self.health.record_success()
+                self._note_usage(response)
+                return response.choices[0].message.content or ''
+
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                self.health.record_failure()
+                if attempt < self.max_retries:
+                    time.sleep(min(self.backoff(attempt), max(0.0, deadline - time.monotonic())))
+            except BaseException:
+                self.health.release_trial()
+                raise
+
+        raise last_error or openai.APITimeoutError(request=httpx.Request("POST", self.base_url))
+
+    def _note_usage(self, response: Any):
+        """Tokens reales de la respuesta en la métrica de la llamada en curso"""
+        mark_first_token()
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            add('prompt_tokens', usage.prompt_tokens or 0)
+            add('completion_tokens', usage.completion_tokens or 0)
+
+    def complete_json(self, messages: List[Dict[str, str]], schema: Optional[Dict[str, Any]] = None,
+                      expect: Any = dict, validate: Optional[Callable[[Any], bool]] = None,
+                      **kwargs: Any) -> Optional[Any]:
+        """complete() + parseo tolerante; None si la respuesta no contiene JSON aprovechable"""
+        text = self.complete(messages, schema=schema, **kwargs)
+        return parse_json_tolerant(text, schema['name'] if schema else 'json', expect, validate)
+
+    def stream_json(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                    max_tokens: int = 200, timeout: Optional[float] = None,
+                    model: Optional[str] = None, cache: Optional[bool] = None,
+                    validate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                    schema: Optional[Dict[str, Any]] = None,
+                    **kwargs: Any) -> Optional[Dict[str, Any]]:
+        """Leer la respuesta por streaming y cortarla en cuanto llega un objeto JSON válido
+
+        Devuelve None si la respuesta termina sin ningún objeto que pase `validate`.
+        """
+        key = self.cache_key(messages, temperature, max_tokens, model, cache, dict(kwargs, stream_json=True))
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                note(cached=True)
+                return json.loads(cached)
+
+        name = schema['name'] if schema else 'json'
+        result = self._with_schema(
+            lambda **request: self._stream_json(messages, temperature, max_tokens, timeout, model, validate, name, **request),
+            schema, kwargs
+        )
+        if key and result is not None:
+            self.cache.put(key, json.dumps(result, ensure_ascii=False))
+        return result
+
+    def _stream_json(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                     timeout: Optional[float], model: Optional[str],
+                     validate: Optional[Callable[[Dict[str, Any]], bool]], name: str,
+                     **kwargs: Any) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            scanner = JsonObjectScanner(validate)
+            self.admit(last_error)
+            add('prompt_tokens', estimate_tokens(json.dumps(messages, ensure_ascii=False)))
+            try:
+                with self.scheduler.slot():
+                    stream = self.client.chat.completions.create(
+                        model=model or self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=remaining,
+                        stream=True,
+                        **kwargs
+                    )
+                    # Cerrar el stream corta la generación en el servidor
+                    with stream:
+                        for chunk in stream:
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if not delta:
+                                continue
+                            # En streaming cada trozo es ~1 token; el prompt se estima
+                            mark_first_token()
+                            add('completion_tokens', 1)
+                            if scanner.feed(delta) is not None:
+                                break
+                            if time.monotonic() > deadline:
+                                raise openai.APITimeoutError(request=httpx.Request("POST", self.base_url))
+
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                self.health.record_failure()
+                if attempt < self.max_retries:
+                    time.sleep(min(self.backoff(attempt), max(0.0, deadline - time.monotonic())))
+                continue
+            except BaseException:
+                self.health.release_trial()
+                raise
+
+            self.health.record_success()
+            if scanner.result is not None:
+                parse_stats.record(name, 'ok')
+                return scanner.result
+            # Respuesta completa sin objeto cerrado limpio: parseo tolerante con reparación
+            return parse_json_tolerant(scanner.buffer, name, dict, validate)
+
+        raise last_error or openai.APITimeoutError(request=httpx.Request("POST", self.base_url))
+
+    def async_client(self):
+        """AsyncOpenAI del event loop actual (creado una vez por loop)"""
+        loop = asyncio.get_running_loop()
+        if loop not in self.async_clients:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=min(5.0, self.timeout))
+            )
+            client = AsyncOpenAI(
+                base_url=str(self.client.base_url),
+                api_key=self.client.api_key,
+                http_client=http_client,
+                max_retries=0
+            )
+            self.async_clients[loop] = client
+        return self.async_clients[loop]
+
+    async def acomplete(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                        max_tokens: int = 200, timeout: Optional[float] = None,
+                        model: Optional[str] = None, cache: Optional[bool] = None,
+                        schema: Optional[Dict[str, Any]] = None, **kwargs: Any) -> str:
+        """Versión no bloqueante de complete() sobre AsyncOpenAI"""
+        if self.cacheable(temperature, cache) and self.health.models_stale():
+            # Refrescar los modelos de la clave de caché sin bloquear el loop
+            await asyncio.to_thread(self.health.refresh_models)
+        key = self.cache_key(messages, temperature, max_tokens, model, cache, kwargs)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                note(cached=True)
+                return cached
+
+        content = await self._awith_schema(
+            lambda **request: self._acomplete(messages, temperature, max_tokens, timeout, model, **request),
+            schema, kwargs
+        )
+        if key and content:
+            self.cache.put(key, content)
+        return content
+
+    async def _acomplete(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                         timeout: Optional[float], model: Optional[str], **kwargs: Any) -> str:
+        client = self.async_client()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self.admit(last_error)
+            try:
+                async with self.scheduler.aslot():
+                    response = await client.chat.completions.create(
+                        model=model or self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=remaining,
+                        **kwargs
+                    )
+                self.health.record_success()
+                self._note_usage(response)
+                return response.choices[0].message.content or ''
+
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                self.health.record_failure()
+                if attempt < self.max_retries:
+                    await asyncio.sleep(min(self.backoff(attempt), max(0.0, deadline - time.monotonic())))
+            except BaseException:
+                self.health.release_trial()
+                raise
+
+        raise last_error or openai.APITimeoutError(request=httpx.Request("POST", self.base_url))
+
+    @staticmethod
+    def _close_async(loop: asyncio.AbstractEventLoop, client: AsyncOpenAI):
+        """Cerrar un AsyncOpenAI (y su httpx.AsyncClient) en el loop al que pertenece"""
+        if loop.is_closed():
+            # Sus sockets murieron con el loop
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(client.close())
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+        else:
+            loop.run_until_complete(client.close())
+
+    def close(self):
+        """Cerrar el pool de conexiones"""
+        if self.http_client is not None:
+            self.http_client.close()
+        for loop, client in list(self.async_clients.items()):
+            self._close_async(loop, client)
+        self.async_clients.clear()
+        if self.cache is not None and self.owns_cache:
+            self.cache.db.close()
+
+
+_clients: Dict[Any, LMStudioClient] = {}
+_clients_lock = threading.Lock()
+# Envoltorios de clientes OpenAI ajenos: se liberan con el cliente original
+_wrapped: 'weakref.WeakKeyDictionary[OpenAI, LMStudioClient]' = weakref.WeakKeyDictionary()
+
+
+def get_lm_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> LMStudioClient:
+    """Cliente compartido por URL: todas las decisiones reutilizan el mismo pool
+
+    Sin URL explícita y con LM_STUDIO_BASE_URLS configurado devuelve el
+    EndpointPool compartido, que tiene la misma interfaz. Con LM_REPLAY
+    devuelve un ReplayClient y con LM_TRANSCRIPT el cliente graba la sesión.
+    """
+    if Config.LM_REPLAY:
+        from lm_transcript import ReplayClient
+
+        key = ('replay', Config.LM_REPLAY)
+        with _clients_lock:
+            if key not in _clients:
+                _clients[key] = ReplayClient(Config.LM_REPLAY)
+            return _clients[key]
+
+    if base_url is None and len(Config.LM_STUDIO_BASE_URLS) > 1:
+        from lm_endpoints import EndpointPool
+
+        key = ('pool', api_key or Config.LM_STUDIO_API_KEY)
+        with _clients_lock:
+            if key not in _clients:
+                _clients[key] = EndpointPool(Config.LM_STUDIO_BASE_URLS, key[1])
+            client = _clients[key]
+    else:
+        key = (base_url or Config.LM_STUDIO_BASE_URL, api_key or Config.LM_STUDIO_API_KEY)
+        with _clients_lock:
+            if key not in _clients:
+                _clients[key] = LMStudioClient(*key)
+            client = _clients[key]
+
+    if Config.LM_TRANSCRIPT:
+        from lm_transcript import RecordingClient, get_recorder
+
+        with _clients_lock:
+            if ('record', key) not in _clients:
+                _clients[('record', key)] = RecordingClient(client, get_recorder())
+            return _clients[('record', key)]
+    return client
+
+
+def as_lm_client(client) -> Optional[LMStudioClient]:
+    """Aceptar un LMStudioClient o un OpenAI ya creado (se envuelve una sola vez)
+
+    Un EndpointPool (o un cliente de grabación/reproducción) se devuelve tal
+    cual: ya ofrece la interfaz del cliente.
+    """
+    if client is None or isinstance(client, LMStudioClient) or hasattr(client, 'for_session'):
+        return client
+
+    with _clients_lock:
+        wrapper = _wrapped.get(client)
+        if wrapper is None:
+            # Sin reintentos del SDK: los gestiona el bucle con deadline del envoltorio
+            wrapper = _wrapped[client] = LMStudioClient(openai_client=client.with_options(max_retries=0))
+        return wrapper
+
+
+class BackgroundLoop:
+    """Event loop de larga vida en un hilo propio para los front ends síncronos"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="lm-event-loop", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Programar una corrutina sin esperar su resultado"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Ejecutar una corrutina en el loop compartido y esperar su resultado"""
+        return self.submit(coro).result(timeout)
+
+
+_background_loop: Optional[BackgroundLoop] = None
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Loop compartido por todas las sesiones del proceso"""
+    global _background_loop
+    with _clients_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Atajo para código síncrono: ejecutar en el loop compartido"""
+    return get_background_loop().run(coro, timeout)
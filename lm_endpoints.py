@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Pool de servidores LM Studio
+Reparte las decisiones entre varias instancias de LM Studio: al servidor con
+menos peticiones en curso y menor latencia reciente, sin los que tengan el
+circuito abierto y, opcionalmente, fijando cada sesión a un servidor para
+aprovechar su caché KV
+"""
+
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config import Config
+from lm_cache import ResponseCache
+from lm_client import RETRYABLE_ERRORS, LMStudioClient
+from lm_health import CircuitOpenError
+from lm_metrics import note
+
+# Errores tras los que se prueba otro servidor (el cliente ya agotó sus reintentos)
+FAILOVER_ERRORS = (CircuitOpenError,) + RETRYABLE_ERRORS
+
+
+class Endpoint:
+    """Un servidor del pool con su carga y latencia recientes"""
+
+    def __init__(self, client: LMStudioClient):
+        self.client = client
+        self.url = client.health.base_url
+        self.outstanding = 0
+        # Media móvil exponencial de la latencia (None hasta la primera respuesta)
+        self.latency: Optional[float] = None
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return not self.client.health.is_open
+
+    def score(self, unknown_latency: float) -> float:
+        """Tiempo esperado hasta atender una petición más"""
+        return (self.outstanding + 1) * (self.latency if self.latency is not None else unknown_latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'latency': self.latency,
+            'calls': self.calls,
+            'errors': self.errors,
+            'breaker': self.client.health.snapshot()['state'],
+            'queued': sum(cls['queued'] for cls in self.client.scheduler.snapshot().values()),
+        }
+
+
+class PoolHealth:
+    """Vista de salud del pool con la interfaz de HealthMonitor que usan las apps"""
+
+    def __init__(self, pool: 'EndpointPool'):
+        self.pool = pool
+        self.base_url = ', '.join(endpoint.url for endpoint in pool.endpoints)
+
+    @property
+    def is_open(self) -> bool:
+        """Solo se considera caído si lo están todos los servidores"""
+        return not any(endpoint.available for endpoint in self.pool.endpoints)
+
+    def probe(self) -> bool:
+        """Sondear todos los servidores; basta con que uno responda"""
+        return any([endpoint.client.health.probe() for endpoint in self.pool.endpoints])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'endpoints': [endpoint.snapshot() for endpoint in self.pool.endpoints]}
+
+
+class EndpointPool:
+    """Varios LMStudioClient tras la misma interfaz (complete, acomplete, stream_json...)
+
+    Cada llamada va al servidor disponible con menor `(en curso + 1) * latencia`;
+    los servidores sin latencia conocida se prueban pronto. Si un servidor
+    agota sus reintentos o tiene el circuito abierto se repite en otro.
+    """
+
+    def __init__(self, base_urls: Optional[Sequence[str]] = None, api_key: Optional[str] = None,
+                 pin_sessions: Optional[bool] = None, smoothing: float = 0.3):
+        urls = list(base_urls or Config.LM_STUDIO_BASE_URLS)
+        if not urls:
+            raise ValueError("EndpointPool necesita al menos una URL (LM_STUDIO_BASE_URLS)")
+        # Una sola caché para todos los servidores: una conexión SQLite y un único límite de tamaño
+        self.cache = ResponseCache() if Config.LM_CACHE_ENABLED else None
+        self.endpoints = [Endpoint(LMStudioClient(url, api_key, cache=self.cache)) for url in urls]
+        self.pin_sessions = Config.LM_STUDIO_PIN_SESSIONS if pin_sessions is None else pin_sessions
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.pins: Dict[str, Endpoint] = {}
+        self.health = PoolHealth(self)
+        self.model = Config.LM_STUDIO_MODEL
+
+    def pick(self, session: Optional[str] = None, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """Elegir servidor y contar la petición como en curso"""
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude] or list(self.endpoints)
+            # Si todos tienen el circuito abierto se elige igual: el cliente lanzará CircuitOpenError
+            healthy = [e for e in candidates if e.available] or candidates
+
+            chosen = None
+            if session is not None and self.pin_sessions:
+                pinned = self.pins.get(session)
+                if pinned in healthy:
+                    chosen = pinned
+            if chosen is None:
+                known = [e.latency for e in healthy if e.latency is not None]
+                unknown_latency = min(known) / 2 if known else 1.0
+                chosen = min(healthy, key=lambda e: (e.score(unknown_latency), e.outstanding))
+                if session is not None and self.pin_sessions:
+                    self.pins[session] = chosen
+
+            chosen.outstanding += 1
+            return chosen
+
+    def release(self, endpoint: Endpoint, latency: Optional[float] = None):
+        """Fin de una petición; sin latencia cuenta como error"""
+        with self.lock:
+            endpoint.outstanding -= 1
+            endpoint.calls += 1
+            if latency is None:
+                endpoint.errors += 1
+            elif endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (latency - endpoint.latency)
+
+    def _route(self, call: Callable[[LMStudioClient], Any], session: Optional[str]) -> Any:
+        tried: List[Endpoint] = []
+        last_error: Optional[BaseException] = None
+        for _ in range(len(self.endpoints)):
+            endpoint = self.pick(session, tried)
+            note(endpoint=endpoint.url)
+            start = time.monotonic()
+            try:
+                result = call(endpoint.client)
+            except FAILOVER_ERRORS as e:
+                self.release(endpoint)
+                tried.append(endpoint)
+                last_error = e
+                continue
+            except BaseException:
+                self.release(endpoint)
+                raise
+            self.release(endpoint, time.monotonic() - start)
+            return result
+        raise last_error
+
+    async def _aroute(self, call: Callable[[LMStudioClient], Any], session: Optional[str]) -> Any:
+        tried: List[Endpoint] = []
+        last_error: Optional[BaseException] = None
+        for _ in range(len(self.endpoints)):
+            endpoint = self.pick(session, tried)
+            note(endpoint=endpoint.url)
+            start = time.monotonic()
+            try:
+                result = await call(endpoint.client)
+            except FAILOVER_ERRORS as e:
+                self.release(endpoint)
+                tried.append(endpoint)
+                last_error = e
+                continue
+            except BaseException:
+                self.release(endpoint)
+                raise
+            self.release(endpoint, time.monotonic() - start)
+            return result
+        raise last_error
+
+    def complete(self, *args: Any, session: Optional[str] = None, **kwargs: Any) -> str:
+        return self._route(lambda client: client.complete(*args, **kwargs), session)
+
+    def complete_json(self, *args: Any, session: Optional[str] = None, **kwargs: Any) -> Optional[Any]:
+        return self._route(lambda client: client.complete_json(*args, **kwargs), session)
+
+    def stream_json(self, *args: Any, session: Optional[str] = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        return self._route(lambda client: client.stream_json(*args, **kwargs), session)
+
+    async def acomplete(self, *args: Any, session: Optional[str] = None, **kwargs: Any) -> str:
+        return await self._aroute(lambda client: client.acomplete(*args, **kwargs), session)
+
+    def for_session(self, session: str) -> 'SessionClient':
+        """Cliente ligado a una sesión (p. ej. un agente): con pinning usa siempre el mismo servidor"""
+        return SessionClient(self, session)
+
+    def health_check(self):
+        """Lanza ConnectionError si ningún servidor responde"""
+        if not self.health.probe():
+            raise ConnectionError(f"Ningún LM Studio responde ({self.health.base_url})")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+        if self.cache is not None:
+            self.cache.db.close()
+
+
+class SessionClient:
+    """Vista de un EndpointPool que pasa siempre la misma sesión"""
+
+    def __init__(self, pool: EndpointPool, session: str):
+        self.pool = pool
+        self.session = session
+        self.health = pool.health
+        self.model = pool.model
+
+    def complete(self, *args: Any, **kwargs: Any) -> str:
+        return self.pool.complete(*args, session=self.session, **kwargs)
+
+    def complete_json(self, *args: Any, **kwargs: Any) -> Optional[Any]:
+        return self.pool.complete_json(*args, session=self.session, **kwargs)
+
+    def stream_json(self, *args: Any, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        return self.pool.stream_json(*args, session=self.session, **kwargs)
+
+    async def acomplete(self, *args: Any, **kwargs: Any) -> str:
+        return await self.pool.acomplete(*args, session=self.session, **kwargs)
+
+    def for_session(self, session: str) -> 'SessionClient':
+        """Ya está ligado a una sesión: se conserva la que eligió quien lo creó"""
+        return self
+
+    def health_check(self):
+        self.pool.health_check()
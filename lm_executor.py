@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Reparto concurrente de decisiones
+Lanza decisiones independientes de LM Studio en paralelo con un máximo de
+hilos, devuelve los resultados en el orden de entrada y aplica un fallback
+por tarea si alguna falla
+"""
+
+import contextvars
+import concurrent.futures
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
+
+from config import Config
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def fan_out(func: Callable[[T], R], items: Iterable[T],
+            fallback: Optional[Callable[[T, BaseException], R]] = None,
+            max_workers: Optional[int] = None) -> List[Optional[R]]:
+    """`[func(item) for item in items]` con hasta `max_workers` llamadas a la vez
+
+    Si una tarea lanza una excepción su hueco se rellena con
+    `fallback(item, error)` (o None) y el resto sigue adelante. Los límites del
+    cliente (planificador, circuit breaker) siguen aplicando dentro de cada
+    tarea, que corre con una copia del contexto del llamante (prioridad...).
+    """
+    items = list(items)
+    workers = max(1, min(max_workers or Config.LM_FANOUT_WORKERS, len(items) or 1))
+    if workers == 1:
+        return [_run(func, item, fallback) for item in items]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lm-fanout') as pool:
+        futures = [pool.submit(contextvars.copy_context().run, func, item) for item in items]
+        results = []
+        for item, future in zip(items, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(fallback(item, e) if fallback else None)
+        return results
+
+
+def _run(func: Callable[[T], R], item: T, fallback: Optional[Callable[[T, BaseException], R]]) -> Optional[R]:
+    try:
+        return func(item)
+    except Exception as e:
+        return fallback(item, e) if fallback else None
+
+
+def waves(count: int, size: Optional[int] = None) -> List[range]:
+    """Índices 0..count-1 en tandas del tamaño del reparto
+
+    Para decisiones cuyo contexto depende de las anteriores: cada tanda ve el
+    resultado de las tandas previas.
+    """
+    size = max(1, size or Config.LM_FANOUT_WORKERS)
+    return [range(start, min(start + size, count)) for start in range(0, count, size)]
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Salud de LM Studio
+Sonda barata al endpoint /models y circuit breaker compartido por URL: tras N
+fallos seguidos las llamadas van directas al fallback, con reintentos
+periódicos en modo semiabierto
+"""
+
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from config import Config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# Reintento de la lista de modelos cuando aún no se conoce
+MODELS_RETRY = 5.0
+
+
+class CircuitOpenError(Exception):
+    """LM Studio marcado como caído: el llamante debe usar su fallback"""
+
+
+class HealthMonitor:
+    """Circuit breaker de un servidor LM Studio"""
+
+    def __init__(self, base_url: str, api_key: str = '', failure_threshold: Optional[int] = None,
+                 reset_timeout: Optional[float] = None, probe_timeout: Optional[float] = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.failure_threshold = failure_threshold or Config.LM_BREAKER_THRESHOLD
+        self.reset_timeout = reset_timeout if reset_timeout is not None else Config.LM_BREAKER_RESET
+        self.probe_timeout = probe_timeout if probe_timeout is not None else Config.LM_PROBE_TIMEOUT
+
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+        # Modelos que sirve el servidor según la última consulta a /models (None = aún sin saber)
+        self.models: Optional[List[str]] = None
+        self.models_checked = float('-inf')
+
+    @property
+    def is_open(self) -> bool:
+        """Abierto y aún sin tocar reintento (no cambia el estado)"""
+        with self.lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow_request(self) -> bool:
+        """¿Puede salir una llamada? En semiabierto solo pasa una de prueba"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+            self.stats['successes'] += 1
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.stats['failures'] += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open()
+
+    def release_trial(self):
+        """La llamada de prueba terminó sin veredicto (error del cliente, cancelación)"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def _open(self):
+        if self.state != OPEN:
+            self.stats['opened'] += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def _get_models(self) -> httpx.Response:
+        response = httpx.get(
+            f"{self.base_url}/models",
+            headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None,
+            timeout=self.probe_timeout
+        )
+        self.models_checked = time.monotonic()
+        if response.status_code == 200:
+            self.models = _model_ids(response) or self.models
+        return response
+
+    def probe(self) -> bool:
+        """GET /models con timeout corto; un fallo abre el circuito directamente"""
+        try:
+            healthy = self._get_models().status_code < 500
+        except httpx.HTTPError:
+            healthy = False
+
+        if healthy:
+            self.record_success()
+        else:
+            with self.lock:
+                self.failures = max(self.failures + 1, self.failure_threshold)
+                self.stats['failures'] += 1
+                self._open()
+        return healthy
+
+    def models_stale(self) -> bool:
+        """¿Toca volver a pedir la lista de modelos? (LM_MODELS_TTL, o MODELS_RETRY si no se conoce)"""
+        ttl = Config.LM_MODELS_TTL if self.models is not None else MODELS_RETRY
+        return time.monotonic() - self.models_checked >= ttl
+
+    def refresh_models(self):
+        """Actualizar la lista de modelos servidos; un fallo aquí no cuenta para el circuito"""
+        try:
+            self._get_models()
+        except httpx.HTTPError:
+            self.models_checked = time.monotonic()
+
+    def served_model(self) -> Optional[str]:
+        """Ids de los modelos cargados, refrescados cada LM_MODELS_TTL (None si no se conocen)"""
+        if self.models_stale():
+            self.refresh_models()
+        return ','.join(self.models) if self.models is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, state=self.state, consecutive_failures=self.failures)
+
+
+def _model_ids(response: httpx.Response) -> Optional[List[str]]:
+    try:
+        data = response.json().get('data')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(data, list):
+        return None
+    return sorted(str(model.get('id')) for model in data if isinstance(model, dict) and model.get('id'))
+
+
+_monitors: Dict[str, HealthMonitor] = {}
+_monitors_lock = threading.Lock()
+
+
+def get_health_monitor(base_url: str, api_key: str = '') -> HealthMonitor:
+    """Un monitor por servidor, compartido por todos los clientes que lo usan"""
+    key = base_url.rstrip('/')
+    with _monitors_lock:
+        if key not in _monitors:
+            _monitors[key] = HealthMonitor(key, api_key)
+        return _monitors[key]
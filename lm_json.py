@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Extracción de JSON
+Localizar objetos y listas JSON dentro del texto libre que devuelve el modelo,
+también mientras llega por streaming
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from lm_metrics import note
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_values(text: str, openers: str = '{['):
+    """Valores JSON completos que aparecen en el texto, de izquierda a derecha"""
+    pos = 0
+    while True:
+        starts = [i for i in (text.find(ch, pos) for ch in openers) if i != -1]
+        if not starts:
+            return
+        start = min(starts)
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        yield value
+        pos = end
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Primer objeto JSON del texto, o None"""
+    for value in iter_json_values(text or '', '{'):
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def extract_json_list(text: str, key: str = 'moves') -> Optional[List[Dict[str, Any]]]:
+    """Primera lista de objetos del texto
+
+    Acepta también `{"moves": [...]}` o un único objeto suelto (lista de uno),
+    porque los modelos locales no siempre respetan el formato pedido.
+    """
+    for value in iter_json_values(text or ''):
+        items = as_json_list(value, key)
+        if items:
+            return items
+    return None
+
+
+def as_json_list(value: Any, key: str = 'moves') -> Optional[List[Dict[str, Any]]]:
+    """Normalizar un valor ya parseado a lista de objetos, como extract_json_list"""
+    if isinstance(value, dict) and isinstance(value.get(key), list):
+        value = value[key]
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, dict)] or None
+    if isinstance(value, dict):
+        return [value]
+    return None
+
+
+def has_keys(*keys: str) -> Callable[[Dict[str, Any]], bool]:
+    """Validador que exige ciertas claves en el objeto"""
+    return lambda obj: all(key in obj for key in keys)
+
+
+class JsonObjectScanner:
+    """Detecta el primer objeto JSON de nivel superior completo en un texto que llega por trozos
+
+    Lleva la cuenta de llaves fuera de las cadenas, así que sabe cuándo un
+    objeto está cerrado sin esperar al final de la respuesta. Un objeto que no
+    parsea o no pasa `validate` se descarta y se sigue buscando el siguiente.
+    """
+
+    def __init__(self, validate: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.validate = validate
+        self.buffer = ''
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.raw = ''
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """Añadir texto; devuelve el objeto en cuanto está completo y es válido"""
+        if self.result is not None:
+            return self.result
+
+        offset = len(self.buffer)
+        self.buffer += chunk
+        for i in range(offset, len(self.buffer)):
+            ch = self.buffer[i]
+            if self.depth == 0:
+                if ch == '{':
+                    self.start, self.depth = i, 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0 and self._accept(self.buffer[self.start:i + 1]):
+                    return self.result
+
+        return None
+
+    def _accept(self, raw: str) -> bool:
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return False
+        if not isinstance(value, dict) or (self.validate and not self.validate(value)):
+            return False
+        self.result, self.raw = value, raw
+        return True
+
+
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def repair_json(text: str) -> str:
+    """Arreglar los errores habituales de los modelos locales
+
+    Comillas simples o tipográficas, comas finales, claves sin comillas,
+    literales de Python y salidas cortadas (se cierran cadenas y llaves).
+    Empieza en el primer `{` o `[` y termina al cerrar ese valor.
+    """
+    text = (text or '').translate(_SMART_QUOTES)
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        return text
+
+    out = []
+    stack = []
+    quote = None
+    i = min(starts)
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == '\\' and i + 1 < len(text):
+                # \' no es un escape JSON válido: dentro de la cadena basta el apóstrofo
+                out.append("'" if text[i + 1] == "'" else ch + text[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in '"\'':
+            quote = ch
+            out.append('"')
+        elif ch in '{[':
+            stack.append(ch)
+            out.append(ch)
+        elif ch in '}]':
+            # Coma final antes de cerrar
+            while out and out[-1].strip() in ('', ','):
+                if out.pop().strip() == ',':
+                    break
+            if stack:
+                out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                break
+        elif ch.isalpha() or ch == '_':
+            j = i
+            while j < len(text) and (text[j].isalnum() or text[j] in '_-'):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < len(text) and text[k] in ' \t\r\n':
+                k += 1
+            if k < len(text) and text[k] == ':':
+                out.append(json.dumps(word))
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Salida truncada: cerrar la cadena y las estructuras abiertas
+    if quote:
+        out.append('"')
+    while out and out[-1].strip() in ('', ','):
+        out.pop()
+    while stack:
+        out.append(_CLOSERS[stack.pop()])
+    return ''.join(out)
+
+
+class ParseStats:
+    """Resultado de cada parseo por tipo de decisión: ok, reparado o fallido"""
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, outcome: str):
+        counts = self.counts.setdefault(name, {'ok': 0, 'repaired': 0, 'failed': 0})
+        counts[outcome] += 1
+        note(parse=outcome)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Conteos y tasa de fallo por tipo"""
+        result = {}
+        for name, counts in self.counts.items():
+            total = sum(counts.values())
+            result[name] = dict(counts, total=total, failure_rate=counts['failed'] / total if total else 0.0)
+        return result
+
+
+parse_stats = ParseStats()
+
+
+def parse_json_tolerant(text: str, name: str = 'json', expect: Any = dict,
+                        validate: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+    """Parsear el primer objeto (o lista) del texto, reparándolo si hace falta
+
+    `expect` es el tipo (o tupla de tipos) aceptado. Cada llamada queda
+    registrada en `parse_stats` bajo `name`.
+    """
+    text = text or ''
+    openers = '{' if expect is dict else '{['
+    accept = lambda value: isinstance(value, expect) and (validate is None or validate(value))
+
+    # Lo normal: el primer valor del texto ya es JSON válido
+    starts = [i for i in (text.find(ch) for ch in openers) if i != -1]
+    if starts:
+        try:
+            value, _ = _decoder.raw_decode(text, min(starts))
+        except ValueError:
+            value = None
+        if accept(value):
+            parse_stats.record(name, 'ok')
+            return value
+
+    # Reparar ese primer valor; si no, cualquier otro valor válido del texto
+    try:
+        candidates = [json.loads(repair_json(text[min(starts):] if starts else text))]
+    except ValueError:
+        candidates = []
+    candidates.extend(iter_json_values(text, openers))
+    for value in candidates:
+        if accept(value):
+            parse_stats.record(name, 'repaired')
+            return value
+
+    parse_stats.record(name, 'failed')
+    return None
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Métricas por llamada al LLM
+Cada decisión registra latencia, tiempo hasta el primer token, tokens, parseo
+y si hubo fallback; al final de la sesión se resumen con p50/p95/p99 y se
+guardan junto a los resultados
+"""
+
+import math
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_current: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('lm_call', default=None)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano (None si no hay valores)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'mean': sum(values) / len(values) if values else None,
+        'max': max(values) if values else None,
+    }
+
+
+class SessionMetrics:
+    """Registros de llamadas de una sesión"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+        self.started = time.time()
+
+    def add(self, record: Dict[str, Any]):
+        with self.lock:
+            self.records.append(record)
+
+    def reset(self):
+        with self.lock:
+            self.records = []
+            self.started = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen global, por tipo de decisión, por agente y por prioridad"""
+        with self.lock:
+            records = list(self.records)
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        by_agent: Dict[str, List[Dict[str, Any]]] = {}
+        by_priority: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            by_type.setdefault(record['type'], []).append(record)
+            by_agent.setdefault(record.get('agent') or '-', []).append(record)
+            if record.get('priority'):
+                by_priority.setdefault(record['priority'], []).append(record)
+        return {
+            'session_seconds': round(time.time() - self.started, 3),
+            'overall': summarize(records),
+            'by_type': {name: summarize(group) for name, group in by_type.items()},
+            'by_agent': {name: summarize(group) for name, group in by_agent.items()},
+            'by_priority': {name: summarize(group) for name, group in by_priority.items()},
+        }
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agregado de un grupo de registros"""
+    parsed = [r['parse'] for r in records if r.get('parse')]
+    llm_time = sum(r['latency'] for r in records)
+    return {
+        'calls': len(records),
+        'llm_seconds': round(llm_time, 3),
+        'latency': distribution([r['latency'] for r in records]),
+        'ttft': distribution([r['ttft'] for r in records if r.get('ttft') is not None]),
+        'queue_wait': distribution([r['queue_wait'] for r in records if r.get('queue_wait') is not None]),
+        'prompt_tokens': sum(r.get('prompt_tokens', 0) for r in records),
+        'completion_tokens': sum(r.get('completion_tokens', 0) for r in records),
+        'parse': {outcome: parsed.count(outcome) for outcome in ('ok', 'repaired', 'failed')},
+        'fallbacks': sum(1 for r in records if r.get('fallback')),
+        'fallback_rate': sum(1 for r in records if r.get('fallback')) / len(records) if records else 0.0,
+        'cached': sum(1 for r in records if r.get('cached')),
+        'replayed': sum(1 for r in records if r.get('replayed')),
+        'errors': sum(1 for r in records if r.get('error')),
+    }
+
+
+session = SessionMetrics()
+
+
+@contextmanager
+def track(decision_type: str, agent: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Medir una decisión; las llamadas al cliente dentro del bloque anotan tokens y ttft
+
+    Una excepción que sale del bloque cuenta como fallback (el llamante recurre a su plan B).
+    """
+    start = time.perf_counter()
+    record: Dict[str, Any] = {'type': decision_type, 'agent': agent, 'fallback': False, '_start': start}
+    token = _current.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        record['fallback'] = True
+        raise
+    finally:
+        record['latency'] = time.perf_counter() - start
+        del record['_start']
+        _current.reset(token)
+        session.add(record)
+
+
+def tracked(decision_type: str) -> Callable:
+    """Decorador para helpers `ask_*` que devuelven None cuando hay que usar el fallback"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with track(decision_type, getattr(self, 'name', type(self).__name__)) as record:
+                result = func(self, *args, **kwargs)
+                record['fallback'] = result is None
+                return result
+        return wrapper
+    return decorator
+
+
+def note(**fields: Any):
+    """Anotar campos en la llamada en curso (sin efecto fuera de `track`)"""
+    record = _current.get()
+    if record is not None:
+        record.update(fields)
+
+
+def add(field: str, amount: float):
+    """Acumular en un campo de la llamada en curso (tokens de varios intentos...)"""
+    record = _current.get()
+    if record is not None:
+        record[field] = record.get(field, 0) + amount
+
+
+def mark_first_token():
+    """Primer token de la llamada en curso (solo cuenta el primero, aunque haya reintentos)"""
+    record = _current.get()
+    if record is not None and 'ttft' not in record and '_start' in record:
+        record['ttft'] = time.perf_counter() - record['_start']
+
+
+def mark_fallback():
+    note(fallback=True)
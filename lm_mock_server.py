@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Servidor LM Studio simulado
+Servidor compatible con la API de OpenAI (chat completions con y sin
+streaming, /v1/models) que devuelve decisiones válidas para cada tipo de
+decisión, con latencia, errores y salidas mal formadas configurables; base
+para benchmarks reproducibles sin LM Studio
+"""
+
+import json
+import math
+import os
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from config import Config
+from lm_schemas import (ACTIVE_DECISION, DIVERSE_DECISION, GENETIC_DECISION, QUANTUM_DECISION,
+                        move_schema, plan_schema, ranking_schema)
+
+# Perfiles de latencia: tiempo hasta el primer token (lognormal: mediana y sigma),
+# velocidad de generación y tasas de error / salida mal formada
+PROFILES: Dict[str, Dict[str, float]] = {
+    'instant': {'ttft': 0.0, 'sigma': 0.0, 'tokens_per_second': 0, 'error_rate': 0.0, 'malformed_rate': 0.0},
+    'fast': {'ttft': 0.05, 'sigma': 0.2, 'tokens_per_second': 400, 'error_rate': 0.0, 'malformed_rate': 0.0},
+    'local': {'ttft': 0.4, 'sigma': 0.5, 'tokens_per_second': 30, 'error_rate': 0.01, 'malformed_rate': 0.05},
+    'slow': {'ttft': 2.0, 'sigma': 0.6, 'tokens_per_second': 8, 'error_rate': 0.02, 'malformed_rate': 0.1},
+    'flaky': {'ttft': 0.3, 'sigma': 0.8, 'tokens_per_second': 30, 'error_rate': 0.25, 'malformed_rate': 0.1},
+    'messy': {'ttft': 0.2, 'sigma': 0.3, 'tokens_per_second': 60, 'error_rate': 0.0, 'malformed_rate': 0.5},
+}
+
+# Claves del prompt que identifican el tipo de decisión cuando no llega esquema
+PROMPT_SCHEMAS = [
+    ('survivors', lambda: ranking_schema(20)),
+    ('fractal_type', lambda: QUANTUM_DECISION),
+    ('specific_shape', lambda: DIVERSE_DECISION),
+    ('fitness_score', lambda: GENETIC_DECISION),
+    ('evolution_stage', lambda: ACTIVE_DECISION),
+    ('Planifica', lambda: plan_schema(Config.SYMBOLS, Config.CANVAS_WIDTH, Config.CANVAS_HEIGHT, 5)),
+]
+
+
+def sample_from_schema(schema: Dict[str, Any], rng: random.Random) -> Any:
+    """Valor aleatorio que cumple un esquema JSON (el subconjunto que usa lm_schemas)"""
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    kind = schema.get('type')
+    if kind == 'object':
+        return {key: sample_from_schema(sub, rng) for key, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        low = schema.get('minItems', 1)
+        high = max(low, min(schema.get('maxItems', 5), 10))
+        return [sample_from_schema(schema['items'], rng) for _ in range(rng.randint(low, high))]
+    if kind == 'integer':
+        return rng.randint(schema.get('minimum', 0), schema.get('maximum', 100))
+    if kind == 'number':
+        return round(rng.uniform(schema.get('minimum', 0.0), schema.get('maximum', 1.0)), 3)
+    if kind == 'boolean':
+        return rng.random() < 0.5
+    return rng.choice(['composición equilibrada', 'contraste', 'continuar el patrón', 'explorar zona vacía'])
+
+
+def corrupt(text: str, rng: random.Random) -> str:
+    """Errores típicos de un modelo local; la mayoría los repara lm_json.repair_json"""
+    kind = rng.choice(['trailing_comma', 'single_quotes', 'prose', 'truncated', 'garbage'])
+    if kind == 'trailing_comma':
+        return text[:-1] + ',}'
+    if kind == 'single_quotes':
+        return text.replace('"', "'")
+    if kind == 'prose':
+        return f"Claro, aquí tienes mi decisión:\n```json\n{text}\n```\nEspero que te guste."
+    if kind == 'truncated':
+        return text[:max(1, int(len(text) * rng.uniform(0.5, 0.9)))]
+    return "Lo siento, no puedo decidir ahora mismo."
+
+
+class MockLM:
+    """Estado del servidor simulado: perfil, generador aleatorio y contadores"""
+
+    def __init__(self, profile: str = 'fast', seed: Optional[int] = None, reject_schema: bool = False,
+                 **overrides: float):
+        self.profile = dict(PROFILES[profile], **{k: v for k, v in overrides.items() if v is not None})
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reject_schema = reject_schema
+        # Caché de prefijo de un solo hueco, como la de llama.cpp: el último prompt procesado
+        self.last_prompt = ''
+        self.stats = {'requests': 0, 'streams': 0, 'errors': 0, 'malformed': 0, 'rejected_schema': 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.rng.random() < rate
+
+    def ttft(self) -> float:
+        """Tiempo hasta el primer token según el perfil"""
+        median, sigma = self.profile['ttft'], self.profile['sigma']
+        if median <= 0:
+            return 0.0
+        with self.lock:
+            return median * math.exp(self.rng.gauss(0, sigma))
+
+    def prefill(self, body: Dict[str, Any]) -> float:
+        """Tiempo de procesar la parte del prompt que no comparte prefijo con el anterior"""
+        rate = self.profile.get('prefill_tokens_per_second', 0)
+        prompt = json.dumps(body.get('messages', []), ensure_ascii=False)
+        with self.lock:
+            shared = len(os.path.commonprefix([prompt, self.last_prompt]))
+            self.last_prompt = prompt
+        return estimate_tokens(prompt[shared:]) / rate if rate > 0 else 0.0
+
+    def token_delay(self) -> float:
+        rate = self.profile['tokens_per_second']
+        return 1.0 / rate if rate > 0 else 0.0
+
+    def decision(self, body: Dict[str, Any]) -> str:
+        """Texto de respuesta: JSON válido para el esquema pedido (o deducido del prompt)
+
+        Con `response_format` la gramática del servidor garantiza JSON válido,
+        así que solo se corrompen las respuestas sin esquema.
+        """
+        response_format = body.get('response_format') or {}
+        constrained = response_format.get('type') == 'json_schema'
+        if constrained:
+            schema = response_format['json_schema']['schema']
+        else:
+            prompt = ' '.join(str(m.get('content', '')) for m in body.get('messages', []))
+            for marker, factory in PROMPT_SCHEMAS:
+                if marker in prompt:
+                    schema = factory()['schema']
+                    break
+            else:
+                schema = move_schema(Config.SYMBOLS, Config.CANVAS_WIDTH, Config.CANVAS_HEIGHT)['schema']
+
+        with self.lock:
+            text = json.dumps(sample_from_schema(schema, self.rng), ensure_ascii=False)
+        if not constrained and self.roll(self.profile['malformed_rate']):
+            self.count('malformed')
+            with self.lock:
+                text = corrupt(text, self.rng)
+        return text
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def make_handler(mock: MockLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, payload: Dict[str, Any]):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/models'):
+                self.send_json(200, {'object': 'list', 'data': [{'id': Config.LM_STUDIO_MODEL, 'object': 'model'}]})
+            elif self.path.rstrip('/').endswith('/stats'):
+                self.send_json(200, dict(mock.stats, profile=mock.profile))
+            else:
+                self.send_json(404, {'error': {'message': f'Ruta desconocida: {self.path}'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self.send_json(400, {'error': {'message': 'JSON inválido'}})
+                return
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self.send_json(404, {'error': {'message': f'Ruta desconocida: {self.path}'}})
+                return
+
+            mock.count('requests')
+            if mock.reject_schema and body.get('response_format'):
+                mock.count('rejected_schema')
+                self.send_json(400, {'error': {'message': "'response_format' no soportado"}})
+                return
+
+            time.sleep(mock.ttft() + mock.prefill(body))
+            if mock.roll(mock.profile['error_rate']):
+                mock.count('errors')
+                self.send_json(503, {'error': {'message': 'Modelo ocupado (error simulado)'}})
+                return
+
+            content = mock.decision(body)
+            model = body.get('model') or Config.LM_STUDIO_MODEL
+            if body.get('stream'):
+                mock.count('streams')
+                self.stream(content, model)
+            else:
+                time.sleep(mock.token_delay() * estimate_tokens(content))
+                prompt_tokens = estimate_tokens(json.dumps(body.get('messages', []), ensure_ascii=False))
+                completion_tokens = estimate_tokens(content)
+                self.send_json(200, {
+                    'id': f'chatcmpl-mock-{mock.stats["requests"]}',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                              'total_tokens': prompt_tokens + completion_tokens},
+                })
+
+        def stream(self, content: str, model: str):
+            """SSE con trozos de ~1 token; si el cliente corta, se deja de generar"""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+
+            delay = mock.token_delay()
+            pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+            try:
+                for i, piece in enumerate(pieces + [None]):
+                    chunk = {
+                        'id': 'chatcmpl-mock-stream',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{'index': 0,
+                                     'delta': {'content': piece} if piece is not None else {},
+                                     'finish_reason': None if piece is not None else 'stop'}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    if piece is not None and delay:
+                        time.sleep(delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+class MockLMServer:
+    """Servidor simulado en un hilo, para benchmarks y pruebas desde Python
+
+        with MockLMServer(profile='local', seed=1) as server:
+            client = LMStudioClient(server.base_url)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, profile: str = 'fast',
+                 seed: Optional[int] = None, reject_schema: bool = False, **overrides: float):
+        self.mock = MockLM(profile, seed, reject_schema, **overrides)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.mock))
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'MockLMServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'MockLMServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor LM Studio simulado (API de OpenAI)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1234)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='local')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--ttft', type=float, default=None, help="mediana del tiempo hasta el primer token (s)")
+    parser.add_argument('--sigma', type=float, default=None, help="dispersión lognormal del ttft")
+    parser.add_argument('--tokens-per-second', type=float, default=None)
+    parser.add_argument('--prefill-tokens-per-second', type=float, default=None,
+                        help="velocidad de prefill; solo se cobra lo que no está en la caché de prefijo")
+    parser.add_argument('--error-rate', type=float, default=None)
+    parser.add_argument('--malformed-rate', type=float, default=None)
+    parser.add_argument('--reject-schema', action='store_true', help="responder 400 a response_format")
+    args = parser.parse_args()
+
+    server = MockLMServer(args.host, args.port, args.profile, args.seed, args.reject_schema,
+                          ttft=args.ttft, sigma=args.sigma, tokens_per_second=args.tokens_per_second,
+                          error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                          prefill_tokens_per_second=args.prefill_tokens_per_second)
+    print(f"🧪 LM Studio simulado en {server.base_url} (perfil {args.profile}: {server.mock.profile})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n⏹️ Servidor detenido: {server.mock.stats}")
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Prompts con prefijo estable
+Instrucciones y formato JSON de cada tipo de decisión van primero (mensaje
+system, idéntico en todas las llamadas) y el contexto variable después, para
+que LM Studio reutilice la caché KV del prefijo y solo procese lo nuevo
+"""
+
+import time
+import random
+import argparse
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import Config
+from lm_metrics import distribution
+
+# "prefix": instrucciones fijas delante; "legacy": contexto delante, como antes (para comparar)
+LAYOUTS = ('prefix', 'legacy')
+
+GENETIC_INSTRUCTIONS = """Eres un experto en algoritmos genéticos. En cada consulta recibes un contexto y un tipo de decisión, y decides mutaciones, cruces y fitness.
+
+Devuelve EXACTAMENTE en formato JSON:
+{
+    "action": "mutate|crossover|select|evolve",
+    "shape": "circle|square|triangle|fractal|wave|spiral",
+    "x": número 0-39,
+    "y": número 0-24,
+    "size": número 3-10,
+    "symbol": "█|▓|▒|░|◆|●|■",
+    "mutation_rate": 0.0-1.0,
+    "fitness_score": 0-10,
+    "creativity_reason": "razón genética",
+    "evolution_strategy": "aggressive|conservative|balanced"
+}"""
+
+RANKING_INSTRUCTIONS = """Eres el operador de selección natural de un algoritmo genético. Recibes una población con una línea por individuo (índice: forma (x,y) tamaño símbolo estrategia fitness).
+
+Elige los individuos que sobreviven (aprox. la mitad), del mejor al peor.
+Devuelve EXACTAMENTE en formato JSON:
+{"survivors": [índices], "reason": "criterio de selección"}"""
+
+QUANTUM_INSTRUCTIONS = """Eres un físico cuántico creativo. En cada consulta recibes un contexto y un tipo de decisión cuántica.
+
+Devuelve EXACTAMENTE en formato JSON:
+{
+    "quantum_state": "superposition|entanglement|decoherence|collapse",
+    "fractal_type": "mandelbrot|julia|sierpinski|koch|spiral|wave",
+    "coherence_level": 0.0-1.0,
+    "decoherence_rate": 0.0-1.0,
+    "x": número 0-39,
+    "y": número 0-24,
+    "size": número 3-15,
+    "symbol": "█|▓|▒|░|◆|●|■|◉|▌",
+    "quantum_reason": "razón cuántica",
+    "probability_amplitude": 0.0-1.0,
+    "quantum_interference": "constructive|destructive"
+}"""
+
+DIVERSE_INSTRUCTIONS = """Eres un artista de formas ASCII ultra-creativo. Cada forma que propones DEBE ser única y creativa respecto a las anteriores del contexto.
+
+Devuelve EXACTAMENTE en formato JSON:
+{
+    "shape_type": "geometric|fractal|organic|abstract|symbolic|textural",
+    "specific_shape": "circle|square|triangle|diamond|hexagon|star|cross|spiral|wave|lattice|mandala|kaleidoscope",
+    "x": número 0-39,
+    "y": número 0-24,
+    "width": número 2-15,
+    "height": número 2-15,
+    "symbol": "█|▓|▒|░|▄|▀|▌|▐|◆|●|■|▲|▼|◉|◎|◈|◇|◊|★|✦|✧",
+    "rotation": 0-360,
+    "complexity": 1-10,
+    "creativity_reason": "razón creativa única",
+    "diversity_score": 1-10,
+    "artistic_intent": "intención artística"
+}"""
+
+ACTIVE_INSTRUCTIONS = """Eres un artista ASCII creativo. En cada consulta recibes el contexto de la obra y decides la siguiente forma.
+
+Devuelve EXACTAMENTE en formato JSON:
+{
+    "shape": "circle|square|triangle|fractal|wave|spiral",
+    "x": número entre 0-39,
+    "y": número entre 0-24,
+    "size": número entre 3-10,
+    "symbol": "█|▓|▒|░|▄|▀|▌|◆|●|■",
+    "creativity_reason": "razón creativa breve",
+    "evolution_stage": "early|developing|mature|master"
+}"""
+
+PROMPTS = {
+    'genetic': GENETIC_INSTRUCTIONS,
+    'ranking': RANKING_INSTRUCTIONS,
+    'quantum': QUANTUM_INSTRUCTIONS,
+    'diverse': DIVERSE_INSTRUCTIONS,
+    'active': ACTIVE_INSTRUCTIONS,
+}
+
+
+def move_instructions(persona: str, symbols: Sequence[str], width: int, height: int, plan_size: int = 1) -> str:
+    """Instrucciones fijas de un agente de dibujo (un movimiento o un plan de plan_size)
+
+    El rango de coordenadas va en el contexto: con ventana de enfoque cambia cada turno.
+    """
+    if plan_size > 1:
+        task = f"""Planifica tus próximos {plan_size} movimientos en el canvas de {width}x{height}.
+Cada movimiento debe ir a una posición vacía distinta dentro del rango de coordenadas indicado,
+con un único carácter ASCII de la lista ({', '.join(symbols)}) y una justificación muy breve.
+
+Responde EXACTAMENTE con un objeto JSON cuya clave "moves" sea la lista de {plan_size} movimientos:
+{{
+    "moves": [
+        {{"x": número, "y": número, "symbol": "carácter", "reason": "breve"}},
+        ...
+    ]
+}}"""
+    else:
+        task = f"""En cada turno decide, en el canvas de {width}x{height}:
+1. Coordenadas (x, y) vacías donde dibujar, dentro del rango indicado
+2. Símbolo ASCII de la lista ({', '.join(symbols)})
+3. Breve justificación
+
+Responde EXACTAMENTE con este formato JSON:
+{{
+    "x": número,
+    "y": número,
+    "symbol": "carácter",
+    "reason": "tu justificación"
+}}"""
+    return f"{persona}\n\n{task}"
+
+
+def layout_messages(instructions: str, context: str, layout: Optional[str] = None) -> List[Dict[str, str]]:
+    """Mensajes de una decisión: prefijo fijo en system y contexto variable en user"""
+    layout = layout or Config.LM_PROMPT_LAYOUT
+    if layout == 'legacy':
+        return [{"role": "user", "content": f"{context}\n\n{instructions}"}]
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": context}
+    ]
+
+
+def sample_context(index: int, rng: random.Random, rows: int = 12, width: int = 40) -> str:
+    """Contexto sintético del tamaño de un turno real (canvas + estadísticas)"""
+    symbols = '█▓▒░◆●■ '
+    canvas = '\n'.join(''.join(rng.choice(symbols) for _ in range(width)) for _ in range(rows))
+    return f"Turno {index}\nCanvas actual:\n{canvas}\n\nLlenado: {rng.uniform(0, 100):.1f}%"
+
+
+def measure_prefill(client: Any, instructions: str, contexts: Sequence[str],
+                    layouts: Sequence[str] = LAYOUTS) -> Dict[str, Any]:
+    """Latencia de llamadas de 1 token con cada disposición (≈ prefill + ida y vuelta)
+
+    Cada disposición se mide en un bloque seguido, como en una sesión real:
+    alternarlas llamada a llamada vaciaría la caché de prefijo del servidor.
+    La primera llamada de cada bloque calienta la caché y no cuenta; la caché
+    de respuestas del cliente se salta.
+    """
+    timings: Dict[str, List[float]] = {layout: [] for layout in layouts}
+    for layout in layouts:
+        for index, context in enumerate([contexts[0]] + list(contexts)):
+            start = time.perf_counter()
+            client.complete(layout_messages(instructions, context, layout),
+                            temperature=0, max_tokens=1, cache=False)
+            if index:
+                timings[layout].append(time.perf_counter() - start)
+
+    report: Dict[str, Any] = {layout: distribution(values) for layout, values in timings.items()}
+    if 'prefix' in report and 'legacy' in report and report['legacy']['p50']:
+        report['savings_p50'] = 1 - report['prefix']['p50'] / report['legacy']['p50']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir el ahorro de prefill del prefijo estable")
+    parser.add_argument('--base-url', default=None)
+    parser.add_argument('--kind', choices=sorted(PROMPTS), default='genetic')
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=12, help="filas de canvas en el contexto sintético")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from lm_client import LMStudioClient
+
+    client = LMStudioClient(args.base_url)
+    rng = random.Random(args.seed)
+    contexts = [sample_context(i, rng, args.rows) for i in range(args.samples)]
+    report = measure_prefill(client, PROMPTS[args.kind], contexts)
+    for layout in LAYOUTS:
+        stats = report[layout]
+        print(f"{layout:7s} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s mean={stats['mean']:.3f}s")
+    if 'savings_p50' in report:
+        print(f"Ahorro (p50): {report['savings_p50']:.1%}")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Planificador de peticiones al LLM
+Reparte la concurrencia de un servidor entre clases de prioridad
+(interactive, normal, batch) con límite por clase y envejecimiento, para que
+un lote largo no deje sin servicio a la interfaz
+"""
+
+import time
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+from lm_metrics import add, distribution, note
+
+INTERACTIVE = 'interactive'
+NORMAL = 'normal'
+BATCH = 'batch'
+PRIORITIES = {INTERACTIVE: 0, NORMAL: 1, BATCH: 2}
+
+_priority: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('lm_priority', default=None)
+
+
+def current_priority() -> str:
+    """Clase de la petición en curso: la del contexto o LM_PRIORITY"""
+    return _priority.get() or Config.LM_PRIORITY
+
+
+def set_priority(name: str):
+    """Fijar la clase para el resto del contexto actual (p. ej. todo un proceso batch)"""
+    if name not in PRIORITIES:
+        raise ValueError(f"Prioridad desconocida: {name}")
+    _priority.set(name)
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Las peticiones dentro del bloque usan la clase `name`"""
+    if name not in PRIORITIES:
+        raise ValueError(f"Prioridad desconocida: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_caps(spec: str, capacity: int) -> Dict[str, int]:
+    """Límites por clase de "interactive=4,batch=2"; por defecto batch deja un hueco libre"""
+    caps = {INTERACTIVE: capacity, NORMAL: capacity, BATCH: max(1, capacity - 1)}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, sep, value = (part.strip() for part in item.partition('='))
+        if not sep:
+            raise ValueError(f"LM_SCHED_CAPS: falta '=' en {item!r} (formato clase=límite, p. ej. interactive=4,batch=2)")
+        if name not in PRIORITIES:
+            raise ValueError(f"LM_SCHED_CAPS: clase desconocida {name!r} (válidas: {', '.join(PRIORITIES)})")
+        try:
+            caps[name] = max(1, min(capacity, int(value)))
+        except ValueError:
+            raise ValueError(f"LM_SCHED_CAPS: límite no entero para {name}: {value!r}") from None
+    return caps
+
+
+class _Waiter:
+    __slots__ = ('cls', 'enqueued', 'seq', 'event', 'future', 'loop', 'granted')
+
+    def __init__(self, cls: str, seq: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.cls = cls
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+
+class RequestScheduler:
+    """Semáforo con prioridades para hilos y corrutinas (de cualquier event loop)
+
+    Cuando queda un hueco se concede a la petición en espera con menor
+    prioridad efectiva, `prioridad - espera / aging`, cuya clase no haya
+    llegado a su límite; así interactive pasa delante y un batch que lleva
+    mucho esperando acaba entrando. Empates por orden de llegada.
+    """
+
+    def __init__(self, capacity: int, caps: Optional[Dict[str, int]] = None, aging: Optional[float] = None):
+        self.capacity = capacity
+        self.caps = caps or parse_caps(Config.LM_SCHED_CAPS, capacity)
+        self.aging = aging if aging is not None else Config.LM_SCHED_AGING
+        self.lock = threading.Lock()
+        self.waiting: List[_Waiter] = []
+        self.seq = itertools.count()
+        self.in_flight = {name: 0 for name in PRIORITIES}
+        self.stats = {name: {'granted': 0, 'max_queued': 0, 'waits': []} for name in PRIORITIES}
+
+    def _effective(self, waiter: _Waiter, now: float) -> float:
+        age = now - waiter.enqueued
+        return PRIORITIES[waiter.cls] - (age / self.aging if self.aging > 0 else 0)
+
+    def _dispatch(self):
+        """Conceder huecos libres (con el lock tomado)"""
+        while self.waiting and sum(self.in_flight.values()) < self.capacity:
+            now = time.monotonic()
+            eligible = [w for w in self.waiting if self.in_flight[w.cls] < self.caps[w.cls]]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (self._effective(w, now), w.seq))
+            self.waiting.remove(waiter)
+            self._grant(waiter, now)
+
+    def _grant(self, waiter: _Waiter, now: float):
+        waiter.granted = True
+        self.in_flight[waiter.cls] += 1
+        stats = self.stats[waiter.cls]
+        stats['granted'] += 1
+        stats['waits'].append(now - waiter.enqueued)
+        if len(stats['waits']) > 10000:
+            del stats['waits'][:5000]
+        if waiter.event is not None:
+            waiter.event.set()
+        else:
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def _enqueue(self, cls: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> _Waiter:
+        if cls not in PRIORITIES:
+            raise ValueError(f"Prioridad desconocida: {cls}")
+        with self.lock:
+            waiter = _Waiter(cls, next(self.seq), loop)
+            self.waiting.append(waiter)
+            queued = sum(1 for w in self.waiting if w.cls == cls)
+            self.stats[cls]['max_queued'] = max(self.stats[cls]['max_queued'], queued)
+            self._dispatch()
+            return waiter
+
+    def release(self, cls: str):
+        with self.lock:
+            self.in_flight[cls] -= 1
+            self._dispatch()
+
+    def _abandon(self, waiter: _Waiter):
+        """La petición se canceló mientras esperaba"""
+        with self.lock:
+            if waiter.granted:
+                self.in_flight[waiter.cls] -= 1
+                self._dispatch()
+            else:
+                self.waiting.remove(waiter)
+
+    @contextmanager
+    def slot(self, cls: Optional[str] = None) -> Iterator[None]:
+        """Ocupar un hueco desde un hilo (bloquea hasta que se conceda)"""
+        cls = cls or current_priority()
+        waiter = self._enqueue(cls)
+        try:
+            waiter.event.wait()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        note(priority=cls)
+        add('queue_wait', time.monotonic() - waiter.enqueued)
+        try:
+            yield
+        finally:
+            self.release(cls)
+
+    @asynccontextmanager
+    async def aslot(self, cls: Optional[str] = None):
+        """Ocupar un hueco desde una corrutina sin bloquear el event loop"""
+        cls = cls or current_priority()
+        waiter = self._enqueue(cls, asyncio.get_running_loop())
+        try:
+            await waiter.future
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        note(priority=cls)
+        add('queue_wait', time.monotonic() - waiter.enqueued)
+        try:
+            yield
+        finally:
+            self.release(cls)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Profundidad de cola, en curso y esperas por clase"""
+        with self.lock:
+            return {
+                name: {
+                    'in_flight': self.in_flight[name],
+                    'queued': sum(1 for w in self.waiting if w.cls == name),
+                    'max_queued': stats['max_queued'],
+                    'granted': stats['granted'],
+                    'cap': self.caps[name],
+                    'wait': distribution(list(stats['waits'])),
+                }
+                for name, stats in self.stats.items()
+            }
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Esquemas JSON de las decisiones
+Esquemas para `response_format` de LM Studio: con ellos el servidor restringe
+la gramática y el modelo no puede devolver JSON mal formado
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# (x_min, x_max, y_min, y_max), ambos extremos incluidos
+Bounds = Tuple[int, int, int, int]
+
+
+def json_schema(name: str, properties: Dict[str, Any], required: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Esquema con nombre de un objeto; por defecto todas las propiedades son obligatorias"""
+    return {
+        'name': name,
+        'schema': {
+            'type': 'object',
+            'properties': properties,
+            'required': required if required is not None else list(properties),
+        }
+    }
+
+
+def response_format(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Parámetro `response_format` de la API de chat para un esquema de este módulo"""
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': schema['name'], 'strict': True, 'schema': schema['schema']}
+    }
+
+
+def _integer(minimum: int, maximum: int) -> Dict[str, Any]:
+    return {'type': 'integer', 'minimum': minimum, 'maximum': maximum}
+
+
+def _number(minimum: float, maximum: float) -> Dict[str, Any]:
+    return {'type': 'number', 'minimum': minimum, 'maximum': maximum}
+
+
+def _enum(*values: str) -> Dict[str, Any]:
+    return {'type': 'string', 'enum': list(values)}
+
+
+def move_schema(symbols: List[str], width: int, height: int, bounds: Optional[Bounds] = None) -> Dict[str, Any]:
+    """Un movimiento de DrawingAgent / SyncDrawingAgent (con `bounds`, solo dentro de la ventana de enfoque)"""
+    return json_schema('move', _move_properties(symbols, width, height, bounds))
+
+
+def plan_schema(symbols: List[str], width: int, height: int, size: int,
+                bounds: Optional[Bounds] = None) -> Dict[str, Any]:
+    """Plan de varios movimientos, envuelto en `{"moves": [...]}` (la raíz debe ser un objeto)"""
+    move = {'type': 'object', 'properties': _move_properties(symbols, width, height, bounds),
+            'required': ['x', 'y', 'symbol', 'reason']}
+    return json_schema('plan', {
+        'moves': {'type': 'array', 'items': move, 'minItems': 1, 'maxItems': size}
+    })
+
+
+def _move_properties(symbols: List[str], width: int, height: int, bounds: Optional[Bounds] = None) -> Dict[str, Any]:
+    x_min, x_max, y_min, y_max = bounds or (0, width - 1, 0, height - 1)
+    return {
+        'x': _integer(x_min, x_max),
+        'y': _integer(y_min, y_max),
+        'symbol': _enum(*symbols),
+        'reason': {'type': 'string'},
+    }
+
+
+def ranking_schema(count: int) -> Dict[str, Any]:
+    """Supervivientes de un bloque de `count` individuos, por índice y de mejor a peor"""
+    return json_schema('population_ranking', {
+        'survivors': {'type': 'array', 'items': _integer(0, count - 1), 'maxItems': count},
+        'reason': {'type': 'string'},
+    })
+
+
+GENETIC_DECISION = json_schema('genetic_decision', {
+    'action': _enum('mutate', 'crossover', 'select', 'evolve'),
+    'shape': _enum('circle', 'square', 'triangle', 'fractal', 'wave', 'spiral'),
+    'x': _integer(0, 39),
+    'y': _integer(0, 24),
+    'size': _integer(3, 10),
+    'symbol': _enum('█', '▓', '▒', '░', '◆', '●', '■'),
+    'mutation_rate': _number(0.0, 1.0),
+    'fitness_score': _number(0, 10),
+    'creativity_reason': {'type': 'string'},
+    'evolution_strategy': _enum('aggressive', 'conservative', 'balanced'),
+})
+
+QUANTUM_DECISION = json_schema('quantum_decision', {
+    'quantum_state': _enum('superposition', 'entanglement', 'decoherence', 'collapse'),
+    'fractal_type': _enum('mandelbrot', 'julia', 'sierpinski', 'koch', 'spiral', 'wave'),
+    'coherence_level': _number(0.0, 1.0),
+    'decoherence_rate': _number(0.0, 1.0),
+    'x': _integer(0, 39),
+    'y': _integer(0, 24),
+    'size': _integer(3, 15),
+    'symbol': _enum('█', '▓', '▒', '░', '◆', '●', '■', '◉', '▌'),
+    'quantum_reason': {'type': 'string'},
+    'probability_amplitude': _number(0.0, 1.0),
+    'quantum_interference': _enum('constructive', 'destructive'),
+})
+
+DIVERSE_DECISION = json_schema('diverse_decision', {
+    'shape_type': _enum('geometric', 'fractal', 'organic', 'abstract', 'symbolic', 'textural'),
+    'specific_shape': _enum('circle', 'square', 'triangle', 'diamond', 'hexagon', 'star', 'cross',
+                            'spiral', 'wave', 'lattice', 'mandala', 'kaleidoscope'),
+    'x': _integer(0, 39),
+    'y': _integer(0, 24),
+    'width': _integer(2, 15),
+    'height': _integer(2, 15),
+    'symbol': _enum('█', '▓', '▒', '░', '▄', '▀', '▌', '▐', '◆', '●', '■', '▲', '▼',
+                    '◉', '◎', '◈', '◇', '◊', '★', '✦', '✧'),
+    'rotation': _integer(0, 360),
+    'complexity': _integer(1, 10),
+    'creativity_reason': {'type': 'string'},
+    'diversity_score': _number(1, 10),
+    'artistic_intent': {'type': 'string'},
+})
+
+ACTIVE_DECISION = json_schema('active_decision', {
+    'shape': _enum('circle', 'square', 'triangle', 'fractal', 'wave', 'spiral'),
+    'x': _integer(0, 39),
+    'y': _integer(0, 24),
+    'size': _integer(3, 10),
+    'symbol': _enum('█', '▓', '▒', '░', '▄', '▀', '▌', '◆', '●', '■'),
+    'creativity_reason': {'type': 'string'},
+    'evolution_stage': _enum('early', 'developing', 'mature', 'master'),
+})
@@ -10,7 +10,11 @@ import json
 import math
 import random
 from datetime import datetime
-from openai import OpenAI
+from lm_client import get_lm_client
+from lm_json import has_keys
+from lm_metrics import session as llm_metrics, tracked
+from lm_prompts import ACTIVE_INSTRUCTIONS, layout_messages
+from lm_schemas import ACTIVE_DECISION
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
@@ -29,51 +33,33 @@ class LMStudioCanvas:
     def connect_lm_studio(self):
         """Conectar REALMENTE con LM Studio"""
         try:
-            self.client = OpenAI(base_url="http://localhost:1234/v1", api_key="not-needed")
+            self.client = get_lm_client()
+            if not self.client.health.probe():
+                print("⚠️ LM Studio no responde: se usarán los fallbacks locales")
             return True
         except Exception as e:
             print(f"❌ LM Studio no está corriendo: {e}")
             print("💡 Inicia LM Studio primero")
             return False
     
+    @tracked('active')
     def ask_lm_studio_for_decision(self, context):
         """Preguntar REALMENTE a LM Studio"""
-        if not self.client:
+        if not self.client or self.client.health.is_open:
             return None
             
-        prompt = f"""
-        Eres un artista ASCII creativo. Basado en este contexto:
-        {context}
-        
-        Devuelve EXACTAMENTE en formato JSON:
-        {{
-            "shape": "circle|square|triangle|fractal|wave|spiral",
-            "x": número entre 0-39,
-            "y": número entre 0-24,
-            "size": número entre 3-10,
-            "symbol": "█|▓|▒|░|▄|▀|▌|◆|●|■",
-            "creativity_reason": "razón creativa breve",
-            "evolution_stage": "early|developing|mature|master"
-        }}
-        """
+        messages = layout_messages(ACTIVE_INSTRUCTIONS, f"""Contexto:
+        {context}""")
         
         try:
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": prompt}],
+            # Se corta el stream en cuanto llega la decisión completa
+            return self.client.stream_json(
+                messages=messages,
                 temperature=0.8,
-                max_tokens=200
+                max_tokens=200,
+                validate=has_keys('shape', 'x', 'y', 'size'),
+                schema=ACTIVE_DECISION
             )
-            
-            content = response.choices[0].message.content
-            
-            # Limpiar y parsear JSON
-            import json
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start != -1 and end != -1:
-                json_str = content[start:end]
-                return json.loads(json_str)
                 
         except Exception as e:
             print(f"❌ Error consultando LM Studio: {e}")
@@ -319,7 +305,8 @@ class RealLMStudioApp:
             'lm_studio_artwork': [''.join(row) for row in self.canvas.grid],
             'lm_studio_decisions': agent.decisions,
             'lm_studio_active': True,
-            'timestamp': timestamp
+            'timestamp': timestamp,
+            'llm_metrics': llm_metrics.summary()
         }
         
         with open(f"lm_studio_real_{timestamp}.json", 'w', encoding='utf-8') as f:
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Grabación y reproducción de sesiones LLM
+Guarda cada petición y respuesta en un NDJSON compacto y las sirve después
+sin servidor, para repetir una evolución offline a velocidad de CPU y medir
+el motor por separado de la latencia del modelo
+"""
+
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from lm_cache import request_key
+from lm_json import parse_json_tolerant, parse_stats
+from lm_metrics import mark_first_token, note
+
+
+class ReplayMiss(LookupError):
+    """La transcripción no tiene respuesta para esta petición"""
+
+
+class ReplayedError(RuntimeError):
+    """Error grabado en la sesión original; se repite para que el llamante use su fallback"""
+
+
+def transcript_key(kind: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    """Hash de la petición independiente del servidor, el timeout o la caché"""
+    schema = params.get('schema')
+    return request_key(
+        params.get('model') or Config.LM_STUDIO_MODEL, messages,
+        params.get('temperature', 0.7), params.get('max_tokens', 200),
+        {'kind': kind, 'schema': schema['name'] if schema else None}
+    )[:16]
+
+
+class TranscriptRecorder:
+    """Escritor NDJSON: una cabecera con la semilla y una línea por llamada"""
+
+    def __init__(self, path: str, seed: Optional[int] = None, include_messages: Optional[bool] = None):
+        self.path = path
+        self.include_messages = Config.LM_TRANSCRIPT_MESSAGES if include_messages is None else include_messages
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+        # Generador propio: el random global solo lo siembra seed_session() desde la CLI
+        self.rng = random.Random(self.seed)
+        self.file = open(path, 'w', encoding='utf-8')
+        self._write({'type': 'header', 'seed': self.seed, 'model': Config.LM_STUDIO_MODEL, 'created': time.time()})
+
+    def _write(self, entry: Dict[str, Any]):
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def record(self, kind: str, messages: List[Dict[str, str]], params: Dict[str, Any],
+               response: Any = None, error: Optional[BaseException] = None, latency: float = 0.0):
+        entry = {'type': 'call', 'kind': kind, 'key': transcript_key(kind, messages, params), 'latency': round(latency, 4)}
+        if error is not None:
+            entry['error'] = f"{type(error).__name__}: {error}"
+        else:
+            entry['response'] = response
+        if self.include_messages:
+            entry['messages'] = messages
+        with self.lock:
+            entry['seq'] = self.seq
+            self.seq += 1
+            self._write(entry)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class RecordingClient:
+    """Envuelve un cliente (LMStudioClient, EndpointPool...) y graba cada llamada"""
+
+    def __init__(self, client: Any, recorder: TranscriptRecorder):
+        self.client = client
+        self.recorder = recorder
+        self.health = client.health
+        self.model = client.model
+
+    def _call(self, kind: str, call: Callable[[], Any], messages: List[Dict[str, str]], params: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            result = call()
+        except Exception as e:
+            self.recorder.record(kind, messages, params, error=e, latency=time.perf_counter() - start)
+            raise
+        self.recorder.record(kind, messages, params, result, latency=time.perf_counter() - start)
+        return result
+
+    def complete(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        return self._call('complete', lambda: self.client.complete(messages, **kwargs), messages, kwargs)
+
+    def complete_json(self, messages: List[Dict[str, str]], schema: Optional[Dict[str, Any]] = None,
+                      expect: Any = dict, validate: Optional[Callable[[Any], bool]] = None,
+                      **kwargs: Any) -> Optional[Any]:
+        # Se graba el texto, no el JSON: al reproducir se parsea igual que en la sesión original
+        text = self.complete(messages, schema=schema, **kwargs)
+        return parse_json_tolerant(text, schema['name'] if schema else 'json', expect, validate)
+
+    def stream_json(self, messages: List[Dict[str, str]], **kwargs: Any) -> Optional[Dict[str, Any]]:
+        return self._call('stream_json', lambda: self.client.stream_json(messages, **kwargs), messages, kwargs)
+
+    async def acomplete(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        start = time.perf_counter()
+        try:
+            result = await self.client.acomplete(messages, **kwargs)
+        except Exception as e:
+            self.recorder.record('complete', messages, kwargs, error=e, latency=time.perf_counter() - start)
+            raise
+        self.recorder.record('complete', messages, kwargs, result, latency=time.perf_counter() - start)
+        return result
+
+    def for_session(self, session: str) -> 'RecordingClient':
+        if hasattr(self.client, 'for_session'):
+            return RecordingClient(self.client.for_session(session), self.recorder)
+        return self
+
+    def health_check(self):
+        self.client.health_check()
+
+    def close(self):
+        self.client.close()
+
+
+class ReplayHealth:
+    """Salud de un cliente sin servidor: siempre disponible"""
+
+    base_url = 'replay'
+    is_open = False
+
+    def probe(self) -> bool:
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'state': 'replay'}
+
+
+class ReplayClient:
+    """Sirve las respuestas de una transcripción con la interfaz de LMStudioClient
+
+    Por defecto busca cada petición por su hash (las llamadas repetidas se
+    sirven en el orden grabado); si no está, devuelve la siguiente respuesta
+    sin usar del mismo tipo, salvo con `strict`, que lanza ReplayMiss. Con
+    mode='order' ignora el hash. `latency_scale` > 0 simula la latencia grabada.
+    """
+
+    def __init__(self, path: str, mode: Optional[str] = None, strict: bool = False, latency_scale: float = 0.0):
+        self.path = path
+        self.mode = mode or Config.LM_REPLAY_MODE
+        self.strict = strict
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.entries: List[Dict[str, Any]] = []
+        self.seed: Optional[int] = None
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('type') == 'header':
+                    self.seed = entry.get('seed')
+                else:
+                    self.entries.append(entry)
+        self.rng = random.Random(self.seed)
+
+        self.used = [False] * len(self.entries)
+        self.by_key: Dict[str, List[int]] = {}
+        for index, entry in enumerate(self.entries):
+            self.by_key.setdefault(entry['key'], []).append(index)
+        self.cursor = {'complete': 0, 'stream_json': 0}
+        self.stats = {'hits': 0, 'misses': 0, 'exhausted': 0}
+        self.health = ReplayHealth()
+        self.model = Config.LM_STUDIO_MODEL
+
+    def _next_unused(self, kind: str) -> Optional[int]:
+        index = self.cursor.get(kind, 0)
+        while index < len(self.entries) and (self.used[index] or self.entries[index]['kind'] != kind):
+            index += 1
+        self.cursor[kind] = index
+        return index if index < len(self.entries) else None
+
+    def _take(self, kind: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            index = None
+            if self.mode == 'hash':
+                for candidate in self.by_key.get(transcript_key(kind, messages, params), []):
+                    if not self.used[candidate]:
+                        index = candidate
+                        break
+                if index is None:
+                    self.stats['misses'] += 1
+                    if self.strict:
+                        raise ReplayMiss(f"Sin respuesta grabada para esta petición ({kind})")
+                else:
+                    self.stats['hits'] += 1
+            if index is None:
+                index = self._next_unused(kind)
+            if index is None:
+                self.stats['exhausted'] += 1
+                raise ReplayMiss(f"Transcripción agotada ({self.path})")
+            self.used[index] = True
+            entry = self.entries[index]
+
+        note(replayed=True)
+        mark_first_token()
+        return entry
+
+    def _result(self, entry: Dict[str, Any]) -> Any:
+        if 'error' in entry:
+            raise ReplayedError(entry['error'])
+        return entry['response']
+
+    def complete(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        entry = self._take('complete', messages, kwargs)
+        if self.latency_scale > 0:
+            time.sleep(entry['latency'] * self.latency_scale)
+        return self._result(entry)
+
+    def complete_json(self, messages: List[Dict[str, str]], schema: Optional[Dict[str, Any]] = None,
+                      expect: Any = dict, validate: Optional[Callable[[Any], bool]] = None,
+                      **kwargs: Any) -> Optional[Any]:
+        text = self.complete(messages, schema=schema, **kwargs)
+        return parse_json_tolerant(text, schema['name'] if schema else 'json', expect, validate)
+
+    def stream_json(self, messages: List[Dict[str, str]], **kwargs: Any) -> Optional[Dict[str, Any]]:
+        entry = self._take('stream_json', messages, kwargs)
+        if self.latency_scale > 0:
+            time.sleep(entry['latency'] * self.latency_scale)
+        result = self._result(entry)
+        if result is not None:
+            parse_stats.record(kwargs['schema']['name'] if kwargs.get('schema') else 'json', 'ok')
+        return result
+
+    async def acomplete(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        entry = self._take('complete', messages, kwargs)
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry['latency'] * self.latency_scale)
+        return self._result(entry)
+
+    def for_session(self, session: str) -> 'ReplayClient':
+        return self
+
+    def health_check(self):
+        pass
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, served=sum(self.used), recorded=len(self.entries))
+
+    def close(self):
+        pass
+
+
+_recorder: Optional[TranscriptRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def seed_session() -> Optional[int]:
+    """Siembra el random global con la semilla de la sesión grabada o reproducida
+
+    Solo para los puntos de entrada CLI: con la misma semilla al grabar y al
+    reproducir, las decisiones locales coinciden. Sin LM_TRANSCRIPT ni
+    LM_REPLAY no toca el random global y devuelve None.
+    """
+    seed = None
+    if Config.LM_REPLAY:
+        with open(Config.LM_REPLAY, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    seed = entry.get('seed') if entry.get('type') == 'header' else None
+                    break
+    elif Config.LM_TRANSCRIPT:
+        seed = get_recorder().seed
+    if seed is not None:
+        random.seed(seed)
+    return seed
+
+
+def get_recorder() -> TranscriptRecorder:
+    """Grabador compartido del proceso (LM_TRANSCRIPT)"""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            seed = Config.LM_TRANSCRIPT_SEED
+            _recorder = TranscriptRecorder(Config.LM_TRANSCRIPT, int(seed) if seed else None)
+        return _recorder
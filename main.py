@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 import asyncio
 import time
-from openai import OpenAI
 from canvas import Canvas
 from agent import DrawingAgent
 from config import Config
+from latency_governor import LatencyGovernor
+from lm_client import get_lm_client
+from lm_json import parse_stats
+from lm_metrics import session as llm_metrics
+from lm_transcript import seed_session
+from turn_scheduler import CanvasSnapshot, TurnScheduler
+import json
 import os
 
 class ArtCollaboration:
@@ -15,11 +21,9 @@ class ArtCollaboration:
         # Inicializar canvas
         self.canvas = Canvas(self.config.CANVAS_WIDTH, self.config.CANVAS_HEIGHT)
         
-        # Inicializar clientes OpenAI para cada agente
-        self.client = OpenAI(
-            base_url=self.config.LM_STUDIO_BASE_URL,
-            api_key=self.config.LM_STUDIO_API_KEY
-        )
+        # Cliente compartido por ambos agentes (un solo pool de conexiones,
+        # o el pool de servidores si LM_STUDIO_BASE_URLS tiene varios)
+        self.client = get_lm_client(api_key=self.config.LM_STUDIO_API_KEY)
         
         # Crear agentes
         self.agent1 = DrawingAgent(
@@ -39,20 +43,19 @@ class ArtCollaboration:
         self.current_turn = 0
         self.agents = [self.agent1, self.agent2]
         self.current_agent_index = 0
+        
+        # Ritmo objetivo (TURN_RATE): el gobernador decide qué turnos consultan al LLM
+        # y el resto los resuelve el scorer ML local del planificador de turnos
+        self.governor = LatencyGovernor(total_turns=self.config.MAX_TURNS) if self.config.TURN_RATE > 0 else None
+        self.scheduler = TurnScheduler(governor=self.governor) if self.governor else None
+        self.consulted = True
     
     def setup_lm_studio(self):
         """Verificar conexión con LM Studio"""
         try:
             print("🔍 Verificando conexión con LM Studio...")
-            test_client = OpenAI(
-                base_url=self.config.LM_STUDIO_BASE_URL,
-                api_key=self.config.LM_STUDIO_API_KEY
-            )
-            test_client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
+            test_client = get_lm_client(api_key=self.config.LM_STUDIO_API_KEY)
+            test_client.health_check()
             print("✅ LM Studio está conectado y funcionando")
         except Exception as e:
             print(f"❌ Error conectando a LM Studio: {e}")
@@ -68,41 +71,66 @@ class ArtCollaboration:
         print(f"Máximo de turnos: {self.config.MAX_TURNS}")
         print("-" * 50)
         
+        # Pipeline: la decisión del siguiente agente se pide en cuanto se conoce
+        # el movimiento actual, y el render y la espera ocurren mientras llega
+        self.canvas.display(self.agents[self.current_agent_index].name)
+        pending = self.prefetch_decision(self.agents[self.current_agent_index], self.current_turn)
+        
         while self.current_turn < self.config.MAX_TURNS:
             current_agent = self.agents[self.current_agent_index]
             
-            # Mostrar canvas actual
-            self.canvas.display(current_agent.name)
-            
             # Agente actual hace su movimiento
-            print(f"\n🤖 Turno {self.current_turn + 1} - {current_agent.name}")
-            
-            try:
-                move = await current_agent.make_move(self.current_turn)
-                print(f"   ✏️ Dibujó '{move['symbol']}' en ({move['x']}, {move['y']})")
-                print(f"   💭 Razón: {move['reason']}")
-                
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-                continue
-            
-            # Esperar antes del siguiente turno
-            await asyncio.sleep(self.config.DELAY_ENTRE_TURNOS)
+            move = await self.resolve_move(current_agent, pending)
             
             # Siguiente turno
             self.current_turn += 1
             self.current_agent_index = (self.current_agent_index + 1) % 2
+            next_agent = self.agents[self.current_agent_index]
             
             # Verificar si el canvas está lleno
-            empty_positions = self.canvas.get_empty_positions()
-            if not empty_positions:
+            canvas_full = not self.canvas.get_empty_positions()
+            if not canvas_full and self.current_turn < self.config.MAX_TURNS:
+                pending = self.prefetch_decision(next_agent, self.current_turn)
+            
+            # Mostrar canvas mientras la siguiente consulta está en curso
+            await asyncio.to_thread(self.canvas.display, next_agent.name)
+            print(f"\n🤖 Turno {self.current_turn} - {current_agent.name}")
+            print(f"   ✏️ Dibujó '{move['symbol']}' en ({move['x']}, {move['y']})")
+            print(f"   💭 Razón: {move['reason']}")
+            
+            if canvas_full:
                 print("\n🎉 ¡Canvas lleno! La obra está completa.")
                 break
+            
+            # Esperar antes del siguiente turno
+            await asyncio.sleep(self.config.DELAY_ENTRE_TURNOS)
         
         # Mostrar resultado final
         self.canvas.display()
         self.show_final_stats()
     
+    def prefetch_decision(self, agent: DrawingAgent, turn: int) -> asyncio.Task:
+        """Lanzar la consulta del agente ya, con el canvas tal como queda tras el último movimiento"""
+        self.consulted = self.governor is None or self.governor.use_llm()
+        if not self.consulted:
+            return asyncio.create_task(asyncio.to_thread(self.scheduler.local_move, agent, CanvasSnapshot(agent.canvas)))
+        return asyncio.create_task(agent.decide_move(turn))
+    
+    async def resolve_move(self, agent: DrawingAgent, pending: asyncio.Task) -> dict:
+        """Esperar la decisión adelantada y aplicarla (mismo fallback que make_move)"""
+        start = time.monotonic()
+        try:
+            decision = await pending
+            if agent.apply_move(decision):
+                return decision
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+        finally:
+            if self.governor:
+                # Con el pipeline solo cuenta la espera que se ve, no la consulta entera
+                self.governor.record(time.monotonic() - start, self.consulted)
+        return agent._make_random_move()
+    
     def show_final_stats(self):
         """Mostrar estadísticas finales"""
         stats = self.canvas.analyze_patterns()
@@ -122,6 +150,20 @@ class ArtCollaboration:
             print(f"    - Estilo: {agent_stats['style']['approach']}")
             print(f"    - Preferencia: {agent_stats['style']['preference']}")
         
+        overall = llm_metrics.summary()['overall']
+        if overall['calls']:
+            print(f"\n⏱️ LLM: {overall['calls']} llamadas, p50 {overall['latency']['p50']:.2f}s, "
+                  f"p95 {overall['latency']['p95']:.2f}s, {overall['completion_tokens']} tokens generados, "
+                  f"{overall['fallbacks']} fallbacks")
+        
+        if self.governor:
+            print(f"\n🎚️ Ritmo: {self.governor.describe()}")
+        
+        # Respuestas JSON: válidas a la primera, reparadas o perdidas
+        for name, counts in parse_stats.summary().items():
+            print(f"  JSON '{name}': {counts['ok']} ok, {counts['repaired']} reparadas, "
+                  f"{counts['failed']} fallidas ({counts['failure_rate']:.0%})")
+        
         # Guardar resultado final
         self.save_final_art()
     
@@ -144,7 +186,14 @@ class ArtCollaboration:
             for move in self.canvas.draw_history:
                 f.write(f"{move['agent']} -> ({move['x']}, {move['y']}) -> '{move['symbol']}'\n")
         
-        print(f"\n💾 Arte guardado en: {filename}")
+        metrics_file = f"arte_ascii_{timestamp}_metrics.json"
+        with open(metrics_file, 'w', encoding='utf-8') as f:
+            metrics = llm_metrics.summary()
+            if self.governor:
+                metrics['governor'] = self.governor.report()
+            json.dump(metrics, f, indent=2, ensure_ascii=False)
+        
+        print(f"\n💾 Arte guardado en: {filename} (métricas LLM en {metrics_file})")
 
 async def main():
     """Función principal"""
@@ -152,10 +201,10 @@ async def main():
     await collaboration.run_collaboration()
 
 if __name__ == "__main__":
+    seed_session()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n
-⏹️ Colaboración interrumpida por el usuario")
+        print("\n⏹️ Colaboración interrumpida por el usuario")
     except Exception as e:
         print(f"\n❌ Error inesperado: {e}")
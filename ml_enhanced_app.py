@@ -14,6 +14,7 @@ from openai import OpenAI
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
+from candidate_heap import CandidateHeap
 
 class MLCanvas:
     """Canvas con análisis ML mejorado"""
@@ -112,7 +113,7 @@ class MLCanvas:
 class MLEnhancedAgent:
     """Agente con ML ligero"""
     
-    def __init__(self, name: str, client, canvas, symbols):
+    def __init__(self, name: str, client, canvas, symbols, incremental: bool = False):
         self.name = name
         self.client = client
         self.canvas = canvas
@@ -121,18 +122,24 @@ class MLEnhancedAgent:
         self.learning_rate = 0.1
         self.exploration_rate = 0.3
         
-    def score_position(self, x: int, y: int, symbol: str, patterns: dict) -> float:
-        """Puntuar una posición basada en análisis ML"""
+        # Heap de candidatos para canvas grandes (solo re-puntúa el vecindario)
+        self.incremental = incremental
+        self.candidates = None
+        self.candidate_density = 0.0
+        self.candidate_pool = 8
+        
+    def local_score(self, x: int, y: int, density: float) -> float:
+        """Parte del score que solo depende del vecindario y la celda espejo"""
         score = 0.0
         
         # Factor de densidad - evitar áreas muy llenas o muy vacías
-        if patterns['density'] < 0.1:
+        if density < 0.1:
             # Favorecer centro cuando está vacío
             center_x, center_y = self.canvas.width // 2, self.canvas.height // 2
             distance = abs(x - center_x) + abs(y - center_y)
             max_distance = self.canvas.width + self.canvas.height
             score += 1 - (distance / max_distance)
-        elif patterns['density'] > 0.7:
+        elif density > 0.7:
             # Favorecer huecos en canvas lleno
             neighbors = 0
             for dy in [-1, 0, 1]:
@@ -150,18 +157,35 @@ class MLEnhancedAgent:
                 symmetry_score += 0.5
         score += symmetry_score
         
-        # Factor de balance
-        quadrant = 0
+        return score
+    
+    def quadrant_of(self, x: int, y: int) -> int:
+        """Cuadrante de una posición (TL, TR, BL, BR)"""
         mid_x, mid_y = self.canvas.width // 2, self.canvas.height // 2
         
         if x < mid_x and y < mid_y:
-            quadrant = 0
+            return 0
         elif x >= mid_x and y < mid_y:
-            quadrant = 1
+            return 1
         elif x < mid_x and y >= mid_y:
-            quadrant = 2
-        else:
-            quadrant = 3
+            return 2
+        return 3
+    
+    def density_regime(self, density: float) -> str:
+        """Tramo de densidad que cambia la forma del score local"""
+        if density < 0.1:
+            return 'vacio'
+        elif density > 0.7:
+            return 'lleno'
+        return 'medio'
+    
+    def score_position(self, x: int, y: int, symbol: str, patterns: dict) -> float:
+        """Puntuar una posición basada en análisis ML"""
+        score = self.local_score(x, y, patterns['density'])
+        
+        # Factor de balance
+        mid_x, mid_y = self.canvas.width // 2, self.canvas.height // 2
+        quadrant = self.quadrant_of(x, y)
         
         # Favorecer cuadrantes menos usados
         quadrant_counts = [0, 0, 0, 0]
@@ -180,7 +204,10 @@ class MLEnhancedAgent:
         if quadrant_counts[quadrant] < max(quadrant_counts):
             score += 0.3
         
-        # Añadir exploración
+        return self.explore_score(score)
+    
+    def explore_score(self, score: float) -> float:
+        """Añadir exploración a un score ya calculado"""
         if random.random() < self.exploration_rate:
             score += random.uniform(-0.1, 0.1)
         
@@ -231,6 +258,32 @@ Responde con JSON: {{"x": int, "y": int, "symbol": str, "reason": str}}
         
         return prompt
     
+    def incremental_candidates(self, patterns: dict) -> list:
+        """Mejores posiciones según el heap, actualizado solo donde hubo cambios"""
+        regime = self.density_regime(patterns['density'])
+        
+        if self.candidates is None:
+            self.candidate_density = patterns['density']
+            self.candidates = CandidateHeap(
+                self.canvas.width, self.canvas.height,
+                lambda x, y: self.local_score(x, y, self.candidate_density),
+                is_free=lambda x, y: self.canvas.grid[y][x] == ' ',
+                group_fn=self.quadrant_of
+            )
+            self.candidates.history_seen = len(self.canvas.move_history)
+        else:
+            self.candidates.sync(self.canvas.move_history)
+            if regime != self.density_regime(self.candidate_density):
+                self.candidate_density = patterns['density']
+                self.candidates.rebuild()
+        
+        # El bonus por cuadrante es constante dentro de cada cuadrante
+        counts = [self.candidates.filled_counts[q] for q in range(4)]
+        bonus = {q: 0.3 for q in range(4) if counts[q] < max(counts)}
+        
+        # La exploración se aplica luego sobre un pequeño grupo de finalistas
+        return self.candidates.top_k(self.candidate_pool, bonus)
+    
     def make_ml_move(self, turn_number: int) -> dict:
         """Hacer movimiento mejorado con ML"""
         # Análisis de patrones actuales
@@ -251,9 +304,17 @@ Responde con JSON: {{"x": int, "y": int, "symbol": str, "reason": str}}
         best_score = -1
         best_move = None
         
-        for x, y in available_positions:
+        if self.incremental:
+            candidates = self.incremental_candidates(patterns)
+        else:
+            candidates = [(x, y, None) for x, y in available_positions]
+        
+        for x, y, base_score in candidates:
             for symbol in self.symbols:
-                score = self.score_position(x, y, symbol, patterns)
+                if base_score is None:
+                    score = self.score_position(x, y, symbol, patterns)
+                else:
+                    score = self.explore_score(base_score)
                 
                 if score > best_score:
                     best_score = score
@@ -336,7 +397,7 @@ class MLEnhancedApp:
         
         return table
     
-    def run_ml_enhanced_session(self, turns=20):
+    def run_ml_enhanced_session(self, turns=20, incremental=False):
         """Ejecutar sesión mejorada con ML"""
         self.clear_screen()
         
@@ -362,8 +423,8 @@ class MLEnhancedApp:
         
         # Crear agentes ML
         symbols = ["█", "▓", "▒", "░", "▄", "▀", "▌", "▐", "•", "+", "■", "◆"]
-        self.agent1 = MLEnhancedAgent("🤖 ML_Agent_1", self.client, self.canvas, symbols)
-        self.agent2 = MLEnhancedAgent("🧠 ML_Agent_2", self.client, self.canvas, symbols)
+        self.agent1 = MLEnhancedAgent("🤖 ML_Agent_1", self.client, self.canvas, symbols, incremental)
+        self.agent2 = MLEnhancedAgent("🧠 ML_Agent_2", self.client, self.canvas, symbols, incremental)
         
         self.console.print("[cyan]⚙️ Inicializando ML...[/]")
         
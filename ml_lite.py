@@ -9,6 +9,10 @@ import random
 import math
 from typing import Dict, List, Any
 from collections import defaultdict, deque
+from candidate_heap import CandidateHeap
+
+# Símbolos que evalúa predict_next_move
+PREDICTION_SYMBOLS = ['█', '▓', '▒', '░', '▄', '▀']
 
 class MLLiteAgent:
     """Agente con ML ligero para mejorar decisiones"""
@@ -26,6 +30,12 @@ class MLLiteAgent:
         self.learning_rate = 0.1
         self.exploration_rate = 0.3
         
+        # Heap de candidatos para predict_next_move_incremental
+        self.candidates = None
+        self.candidate_canvas = None
+        self.candidate_style = None
+        self.candidate_pool = 8
+        
     def analyze_canvas_patterns(self, canvas) -> Dict[str, float]:
         """Análisis ligero de patrones en el canvas"""
         patterns = {
@@ -187,7 +197,7 @@ Responde con JSON válido: {{"x": int, "y": int, "symbol": str, "reason": str}}
         best_move = None
         
         for x, y in available_positions:
-            for symbol in ['█', '▓', '▒', '░', '▄', '▀']:
+            for symbol in PREDICTION_SYMBOLS:
                 score = self.score_position(x, y, canvas, symbol, patterns)
                 
                 # Añadir factor de exploración
@@ -206,6 +216,53 @@ Responde con JSON válido: {{"x": int, "y": int, "symbol": str, "reason": str}}
         
         return best_move
     
+    def active_style(self) -> str:
+        """Rama de score_position activa según los pesos de estilo"""
+        for style in ('minimalista', 'expresivo', 'geometrico'):
+            if self.style_weights[style] > 0.5:
+                return style
+        return 'organico'
+    
+    def predict_next_move_incremental(self, canvas) -> Dict[str, Any]:
+        """Como predict_next_move, pero re-puntuando solo el vecindario de cada dibujo"""
+        style = self.active_style()
+        
+        if self.candidates is None or self.candidate_canvas is not canvas:
+            self.candidates = CandidateHeap(
+                canvas.width, canvas.height,
+                lambda x, y: self.score_position(x, y, canvas, None, None),
+                is_free=lambda x, y: canvas.grid[y][x] == ' '
+            )
+            self.candidates.history_seen = len(canvas.move_history)
+            self.candidate_canvas = canvas
+        else:
+            self.candidates.sync(canvas.move_history)
+            if style != self.candidate_style:
+                self.candidates.rebuild()
+        self.candidate_style = style
+        
+        # Exploración solo sobre los mejores candidatos
+        best_score = -1
+        best_move = None
+        
+        for x, y, base_score in self.candidates.top_k(self.candidate_pool):
+            for symbol in PREDICTION_SYMBOLS:
+                score = base_score
+                if random.random() < self.exploration_rate:
+                    score += random.uniform(-0.1, 0.1)
+                
+                if score > best_score:
+                    best_score = score
+                    best_move = {
+                        "x": x,
+                        "y": y,
+                        "symbol": symbol,
+                        "reason": f"Posición evaluada con score {score:.2f} basado en patrones actuales",
+                        "ml_score": score
+                    }
+        
+        return best_move
+    
     def get_personality_summary(self) -> str:
         """Obtener resumen de la personalidad actual"""
         dominant = max(self.style_weights, key=self.style_weights.get)
@@ -221,6 +278,12 @@ class MLCanvas:
         self.move_history = []
         self.pattern_cache = {}
     
+    def draw_pixel(self, x: int, y: int, symbol: str):
+        """Dibujar un píxel"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.grid[y][x] = symbol
+            self.move_history.append({'x': x, 'y': y, 'symbol': symbol})
+    
     def analyze_patterns_ml(self) -> Dict[str, float]:
         """Análisis ML mejorado de patrones"""
         cache_key = str(self.grid)
@@ -293,13 +356,14 @@ class MLCanvas:
 class MLEnhancedAgent:
     """Agente mejorado con ML ligero"""
     
-    def __init__(self, name: str, client, canvas, symbols):
+    def __init__(self, name: str, client, canvas, symbols, incremental: bool = False):
         self.name = name
         self.client = client
         self.canvas = canvas
         self.symbols = symbols
         self.ml_agent = MLLiteAgent(name)
         self.memory = []
+        self.incremental = incremental
         
     def make_ml_enhanced_move(self, turn_number: int) -> Dict[str, Any]:
         """Hacer movimiento mejorado con ML"""
@@ -316,7 +380,10 @@ class MLEnhancedAgent:
         
         if available_positions:
             # Usar ML para elegir la mejor posición
-            best_move = self.ml_agent.predict_next_move(self.canvas, available_positions)
+            if self.incremental:
+                best_move = self.ml_agent.predict_next_move_incremental(self.canvas)
+            else:
+                best_move = self.ml_agent.predict_next_move(self.canvas, available_positions)
             
             # Aplicar el movimiento
             self.canvas.draw_pixel(best_move['x'], best_move['y'], best_move['symbol'])
@@ -22,6 +22,7 @@ from rich.align import Align
 from collections import defaultdict, deque
 import threading
 import queue
+from agent_memory import MemoryContext
 
 class NextGenCanvas:
     """Canvas de próxima generación con 3D y efectos"""
@@ -176,6 +177,7 @@ class NextGenAgent:
         self.symbols = symbols
         self.neural_net = NeuralNetworkLite(8, 6, 4)  # 8 inputs, 6 hidden, 4 outputs
         self.memory = deque(maxlen=1000)
+        self.history = MemoryContext()
         self.style_evolution = {
             'creativity': random.uniform(0.3, 0.8),
             'precision': random.uniform(0.3, 0.8),
@@ -239,6 +241,8 @@ Predicción neuronal: Posición ({predicted_move['x']}, {predicted_move['y']}) c
 
 {artistic_analysis}
 
+{self.history.render(self.memory, self.canvas.width, self.canvas.height) or "Sin movimientos previos"}
+
 Responde con JSON que incluya: x, y, symbol, reason, y artistic_intent
 """
         return prompt
@@ -302,6 +306,7 @@ Responde con JSON que incluya: x, y, symbol, reason, y artistic_intent
                         "neural_confidence": score
                     }
         
+        self.memory.append(best_move)
         return best_move
     
     def calculate_next_gen_score(self, x: int, y: int, symbol: str, patterns: dict) -> float:
@@ -10,7 +10,14 @@ import json
 import math
 import random
 from datetime import datetime
-from openai import OpenAI
+from lm_client import get_lm_client
+from lm_executor import fan_out, waves
+from lm_json import has_keys
+from lm_metrics import session as llm_metrics, tracked
+from lm_prompts import QUANTUM_INSTRUCTIONS, layout_messages
+from lm_scheduler import BATCH, set_priority
+from lm_schemas import QUANTUM_DECISION
+from lm_transcript import seed_session
 from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
@@ -28,53 +35,33 @@ class RealQuantumLMStudio:
     def connect_lm_studio(self):
         """Conectar REALMENTE con LM Studio"""
         try:
-            self.client = OpenAI(base_url="http://localhost:1234/v1", api_key="not-needed")
+            self.client = get_lm_client()
+            if not self.client.health.probe():
+                self.console.print("[yellow]⚠️ LM Studio no responde: se usarán los fallbacks locales[/]")
             return True
         except Exception as e:
             self.console.print(f"[red]❌ LM Studio no está corriendo: {e}[/]")
             return False
     
+    @tracked('quantum')
     def ask_lm_studio_for_quantum_decision(self, context, quantum_type):
         """LM Studio decide ESTADOS CUÁNTICOS REALES"""
-        if not self.client:
+        if not self.client or self.client.health.is_open:
             return None
             
-        prompt = f"""
-        Eres un físico cuántico creativo. Contexto:
+        messages = layout_messages(QUANTUM_INSTRUCTIONS, f"""Contexto:
         {context}
         
-        Tipo de decisión cuántica: {quantum_type}
-        
-        Devuelve EXACTAMENTE en formato JSON:
-        {{
-            "quantum_state": "superposition|entanglement|decoherence|collapse",
-            "fractal_type": "mandelbrot|julia|sierpinski|koch|spiral|wave",
-            "coherence_level": 0.0-1.0,
-            "decoherence_rate": 0.0-1.0,
-            "x": número 0-39,
-            "y": número 0-24,
-            "size": número 3-15,
-            "symbol": "█|▓|▒|░|◆|●|■|◉|▌",
-            "quantum_reason": "razón cuántica",
-            "probability_amplitude": 0.0-1.0,
-            "quantum_interference": "constructive|destructive"
-        }}
-        """
+        Tipo de decisión cuántica: {quantum_type}""")
         
         try:
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[{"role": "user", "content": prompt}],
+            return self.client.stream_json(
+                messages=messages,
                 temperature=0.9,
-                max_tokens=350
+                max_tokens=350,
+                validate=has_keys('fractal_type', 'coherence_level', 'x', 'y', 'size', 'symbol'),
+                schema=QUANTUM_DECISION
             )
-            
-            content = response.choices[0].message.content
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start != -1 and end != -1:
-                import json
-                return json.loads(content[start:end])
                 
         except Exception as e:
             self.console.print(f"[red]❌ Error LM Studio cuántico: {e}[/]")
@@ -246,6 +233,17 @@ class RealQuantumLMStudio:
         
         return canvas
     
+    def create_and_evolve_state(self, state_id):
+        """Crear un estado y evolucionar su coherencia (dos decisiones encadenadas)"""
+        quantum_state = self.create_quantum_state_from_lm(state_id)
+        # Evolución con LM Studio
+        return quantum_state, self.evolve_quantum_coherence_with_lm(quantum_state)
+    
+    def report_task_error(self, state_id, error):
+        """Fallback de fan_out: el estado se omite"""
+        self.console.print(f"[red]❌ Estado cuántico #{state_id} fallido: {error}[/]")
+        return None
+    
     def run_quantum_evolution(self, iterations=10):
         """Evolución cuántica REAL con LM Studio"""
         
@@ -259,30 +257,33 @@ class RealQuantumLMStudio:
 ╚══════════════════════════════════════════════════════════════════════════════╝
         """, style="bold bright_cyan"))
         
-        # Estados cuánticos iniciales con LM Studio
-        for i in range(iterations):
-            quantum_state = self.create_quantum_state_from_lm(i)
-            self.quantum_states.append(quantum_state)
-            self.coherence_levels.append(quantum_state['coherence'])
+        # Estados cuánticos iniciales con LM Studio, en paralelo por tandas
+        # (cada tanda ve la coherencia de las anteriores)
+        for wave in waves(iterations):
+            created = fan_out(self.create_and_evolve_state, wave, fallback=self.report_task_error)
             
-            # Evolución con LM Studio
-            evolved_state = self.evolve_quantum_coherence_with_lm(quantum_state)
-            
-            # Generar arte fractal cuántico
-            fractal_canvas = self.generate_quantum_fractal_from_lm(evolved_state)
-            
-            # Mostrar progreso
-            self.console.print(f"[cyan]Estado cuántico {i+1}: {evolved_state['quantum_properties']['quantum_state']}[/]")
-            self.console.print(f"[yellow]Coherencia: {evolved_state['coherence']:.3f} - {evolved_state['quantum_properties']['quantum_reason']}[/]")
-            
-            # Guardar decisión LM Studio
-            self.lm_decisions.append({
-                'iteration': i+1,
-                'quantum_state': evolved_state,
-                'lm_decision': evolved_state['lm_studio_decision'],
-                'fractal_type': evolved_state['quantum_properties']['fractal_type'],
-                'coherence_level': evolved_state['coherence']
-            })
+            for i, states in zip(wave, created):
+                if states is None:
+                    continue
+                quantum_state, evolved_state = states
+                self.quantum_states.append(quantum_state)
+                self.coherence_levels.append(quantum_state['coherence'])
+                
+                # Generar arte fractal cuántico
+                fractal_canvas = self.generate_quantum_fractal_from_lm(evolved_state)
+                
+                # Mostrar progreso
+                self.console.print(f"[cyan]Estado cuántico {i+1}: {evolved_state['quantum_properties']['quantum_state']}[/]")
+                self.console.print(f"[yellow]Coherencia: {evolved_state['coherence']:.3f} - {evolved_state['quantum_properties']['quantum_reason']}[/]")
+                
+                # Guardar decisión LM Studio
+                self.lm_decisions.append({
+                    'iteration': i+1,
+                    'quantum_state': evolved_state,
+                    'lm_decision': evolved_state['lm_studio_decision'],
+                    'fractal_type': evolved_state['quantum_properties']['fractal_type'],
+                    'coherence_level': evolved_state['coherence']
+                })
         
         # Resultado final cuántico
         final_stats = f"""
@@ -312,7 +313,8 @@ class RealQuantumLMStudio:
                 'lm_studio_active': True,
                 'quantum_physics': 'lm_studio_driven'
             },
-            'timestamp': timestamp
+            'timestamp': timestamp,
+            'llm_metrics': llm_metrics.summary()
         }
         
         with open(f"lm_studio_quantum_{timestamp}.json", 'w', encoding='utf-8') as f:
@@ -321,5 +323,7 @@ class RealQuantumLMStudio:
         self.console.print(f"[green]✅ Evolución cuántica LM Studio guardada en lm_studio_quantum_{timestamp}.json[/]")
 
 if __name__ == "__main__":
+    set_priority(BATCH)
+    seed_session()
     quantum = RealQuantumLMStudio()
     quantum.run_quantum_evolution(iterations=8)
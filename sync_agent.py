@@ -4,20 +4,32 @@ Agente síncrono que funciona correctamente con LM Studio
 """
 
 import random
-import json
-import re
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Tuple
 from canvas import Canvas
+from config import Config
+from lm_client import LMStudioClient, as_lm_client, get_lm_client
+from lm_json import as_json_list, parse_json_tolerant
+from lm_metrics import mark_fallback, track
+from lm_prompts import layout_messages, move_instructions
+from lm_schemas import move_schema, plan_schema
+from context_encoder import Viewport, viewport_from_config
 
 class SyncDrawingAgent:
-    def __init__(self, name: str, client: OpenAI, canvas: Canvas, symbols: List[str]):
+    def __init__(self, name: str, client: LMStudioClient, canvas: Canvas, symbols: List[str],
+                 plan_size: Optional[int] = None, viewport: Optional[Viewport] = None):
         self.name = name
-        self.client = client
+        self.client = as_lm_client(client)
+        if hasattr(self.client, 'for_session'):
+            self.client = self.client.for_session(name)
         self.canvas = canvas
         self.symbols = symbols
         self.personal_style = self._develop_style()
         self.memory = []
+        # Modo plan: K movimientos por consulta, validados uno a uno contra el canvas
+        self.plan_size = max(1, plan_size or Config.AGENT_PLAN_SIZE)
+        self.plan: List[Dict[str, Any]] = []
+        self.llm_requests = 0
+        self.viewport = viewport or viewport_from_config()
     
     def _develop_style(self) -> Dict[str, Any]:
         """Desarrollar estilo personal del agente"""
@@ -29,43 +41,51 @@ class SyncDrawingAgent:
         ]
         return random.choice(styles)
     
+    def _canvas_view(self):
+        """Canvas (o ventana de enfoque) y rango de coordenadas válido"""
+        if not self.viewport:
+            return (self.canvas.display(),) + self._coordinate_range()
+        text = self.viewport.render(self.canvas, self.memory)
+        return (text,) + self._coordinate_range()
+    
+    def _coordinate_range(self) -> Tuple[int, int, int, int]:
+        """(x_min, x_max, y_min, y_max) de la última vista ofrecida al modelo"""
+        if not self.viewport:
+            return 0, self.canvas.width - 1, 0, self.canvas.height - 1
+        x0, y0, width, height = self.viewport.bounds
+        return x0, x0 + width - 1, y0, y0 + height - 1
+    
+    def _system_prompt(self) -> str:
+        """Prefijo fijo de todas las consultas del agente (persona, formato y símbolos)"""
+        persona = (f"Eres {self.name}, un artista ASCII de estilo {self.personal_style['approach']} "
+                   f"que prefiere {self.personal_style['preference']}. Evita posiciones ya ocupadas. "
+                   f"Responde SOLO con JSON válido.")
+        return move_instructions(persona, self.symbols, self.canvas.width, self.canvas.height, self.plan_size)
+    
     def _prepare_context(self, turn_number: int) -> str:
         """Preparar contexto para el modelo"""
-        canvas_str = self.canvas.display()
+        canvas_str, x_min, x_max, y_min, y_max = self._canvas_view()
         empty_positions = len(self.canvas.get_empty_positions())
         filled_positions = (self.canvas.width * self.canvas.height) - empty_positions
         
         context = f"""
 Turno actual: {turn_number}
-Canvas actual (20x10):
+Canvas actual ({self.canvas.width}x{self.canvas.height}):
 {canvas_str}
 
 Estadísticas:
 - Posiciones vacías: {empty_positions}
 - Posiciones llenas: {filled_positions}
-- Símbolos disponibles: {', '.join(self.symbols)}
-
-Tu tarea: Decidir dónde dibujar y qué símbolo usar.
-Responde con un JSON válido en este formato exacto:
-{{"x": número, "y": número, "symbol": "símbolo", "reason": "breve explicación"}}
-
-Consideraciones:
-- Coordenadas válidas: x entre 0 y {self.canvas.width-1}, y entre 0 y {self.canvas.height-1}
-- Solo usa símbolos de la lista: {', '.join(self.symbols)}
-- Evita posiciones ya ocupadas
-- {self.personal_style['approach']} estilo, prefieres {self.personal_style['preference']}
+- Coordenadas válidas: x entre {x_min} y {x_max}, y entre {y_min} y {y_max}
 """
         return context
     
     def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
         """Parsear respuesta JSON del modelo"""
         try:
-            # Buscar JSON en la respuesta
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                parsed = json.loads(json_str)
-                
+            # Buscar JSON en la respuesta (reparándolo si viene mal formado)
+            parsed = parse_json_tolerant(response_text, 'move')
+            if parsed is not None:
                 # Validar y ajustar valores
                 x = max(0, min(int(parsed.get('x', 0)), self.canvas.width - 1))
                 y = max(0, min(int(parsed.get('y', 0)), self.canvas.height - 1))
@@ -83,6 +103,7 @@ Consideraciones:
                 }
             else:
                 # Fallback: movimiento aleatorio válido
+                mark_fallback()
                 empty_positions = self.canvas.get_empty_positions()
                 if empty_positions:
                     x, y = random.choice(empty_positions)
@@ -120,45 +141,123 @@ Consideraciones:
             "reason": "movimiento de respaldo"
         }
     
-    def make_move(self, turn_number: int) -> Dict[str, Any]:
-        """Hacer un movimiento (versión síncrona)"""
-        context = self._prepare_context(turn_number)
+    def _draw_fallback_move(self) -> Dict[str, Any]:
+        """Movimiento de respaldo ya dibujado: igual en modo plan y en modo movimiento a movimiento"""
+        move = self._get_fallback_move()
+        self.canvas.draw_pixel(move['x'], move['y'], move['symbol'])
+        return move
+    
+    def _prepare_plan_context(self, turn_number: int) -> str:
+        """Contexto para pedir varios movimientos de una vez"""
+        canvas_str, x_min, x_max, y_min, y_max = self._canvas_view()
+        empty_positions = len(self.canvas.get_empty_positions())
         
+        context = f"""
+Turno actual: {turn_number}
+Canvas actual ({self.canvas.width}x{self.canvas.height}):
+{canvas_str}
+
+Posiciones vacías: {empty_positions}
+Coordenadas válidas: x entre {x_min} y {x_max}, y entre {y_min} y {y_max}
+"""
+        return context
+    
+    def _request_plan(self, turn_number: int) -> List[Dict[str, Any]]:
+        """Pedir plan_size movimientos en una sola consulta"""
+        with track('plan', self.name) as call:
+            moves = self._ask_plan(turn_number)
+            call['fallback'] = not moves
+            return moves
+    
+    def _ask_plan(self, turn_number: int) -> List[Dict[str, Any]]:
+        context = self._prepare_plan_context(turn_number)
+        response_text = self.client.complete(
+            messages=layout_messages(self._system_prompt(), context),
+            temperature=0.7,
+            max_tokens=50 * self.plan_size + 50,
+            schema=plan_schema(self.symbols, self.canvas.width, self.canvas.height, self.plan_size,
+                               self._coordinate_range())
+        )
+        self.llm_requests += 1
+        moves = as_json_list(parse_json_tolerant(response_text, 'plan', expect=(dict, list)))
+        return (moves or [])[:self.plan_size]
+    
+    def _plan_move_valid(self, move: Dict[str, Any]) -> bool:
+        """Un movimiento del plan sigue siendo válido en el canvas actual"""
+        x, y = move.get('x'), move.get('y')
+        if not isinstance(x, int) or not isinstance(y, int):
+            return False
+        if not (0 <= x < self.canvas.width and 0 <= y < self.canvas.height):
+            return False
+        return move.get('symbol') in self.symbols and self.canvas.grid[y][x] == ' '
+    
+    def _make_planned_move(self, turn_number: int) -> Dict[str, Any]:
+        """Aplicar el siguiente movimiento del plan; volver a preguntar si se agota o se invalida"""
         try:
-            response = self.client.chat.completions.create(
-                model="local-model",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"Eres {self.name}, un artista ASCII. Responde SOLO con JSON válido."
-                    },
-                    {
-                        "role": "user",
-                        "content": context
+            for _ in range(2):
+                if not self.plan:
+                    self.plan = self._request_plan(turn_number)
+                
+                while self.plan:
+                    planned = self.plan.pop(0)
+                    if not self._plan_move_valid(planned):
+                        # El canvas ya no encaja con el plan: descartarlo entero
+                        self.plan = []
+                        break
+                    
+                    move = {
+                        "x": planned['x'],
+                        "y": planned['y'],
+                        "symbol": planned['symbol'],
+                        "reason": planned.get('reason', 'plan')
                     }
-                ],
-                temperature=0.7,
-                max_tokens=100
-            )
-            
-            response_text = response.choices[0].message.content
-            move = self._parse_json_response(response_text)
-            
-            # Verificar que la posición esté vacía
-            if self.canvas.grid[move['y']][move['x']] != ' ':
-                empty_positions = self.canvas.get_empty_positions()
-                if empty_positions:
-                    move['x'], move['y'] = random.choice(empty_positions)
-                    move['reason'] = "posición ocupada - ajustada"
-            
-            # Dibujar en el canvas
-            self.canvas.draw_pixel(move['x'], move['y'], move['symbol'])
-            
-            return move
+                    self.canvas.draw_pixel(move['x'], move['y'], move['symbol'])
+                    self.memory.append(move)
+                    return move
             
         except Exception as e:
             print(f"Error con LM Studio: {e}")
-            return self._get_fallback_move()
+            self.plan = []
+        
+        return self._draw_fallback_move()
+    
+    def make_move(self, turn_number: int) -> Dict[str, Any]:
+        """Hacer un movimiento (versión síncrona)"""
+        if self.plan_size > 1:
+            return self._make_planned_move(turn_number)
+        
+        with track('move', self.name):
+            context = self._prepare_context(turn_number)
+            
+            try:
+                response_text = self.client.complete(
+                    messages=layout_messages(self._system_prompt(), context),
+                    temperature=0.7,
+                    max_tokens=100,
+                    schema=move_schema(self.symbols, self.canvas.width, self.canvas.height,
+                                       self._coordinate_range())
+                )
+                self.llm_requests += 1
+                
+                move = self._parse_json_response(response_text)
+                
+                # Verificar que la posición esté vacía
+                if self.canvas.grid[move['y']][move['x']] != ' ':
+                    empty_positions = self.canvas.get_empty_positions()
+                    if empty_positions:
+                        move['x'], move['y'] = random.choice(empty_positions)
+                        move['reason'] = "posición ocupada - ajustada"
+                
+                # Dibujar en el canvas
+                self.canvas.draw_pixel(move['x'], move['y'], move['symbol'])
+                self.memory.append(move)
+                
+                return move
+                
+            except Exception as e:
+                print(f"Error con LM Studio: {e}")
+                mark_fallback()
+                return self._draw_fallback_move()
 
 class SyncCanvas:
     def __init__(self, width: int, height: int):
@@ -203,14 +302,10 @@ if __name__ == "__main__":
     
     # Verificar LM Studio
     try:
-        client = OpenAI(base_url="http://localhost:1234/v1", api_key="not-needed")
+        client = get_lm_client("http://localhost:1234/v1", "not-needed")
         
         # Test de conexión
-        response = client.chat.completions.create(
-            model="local-model",
-            messages=[{"role": "user", "content": "test"}],
-            max_tokens=1
-        )
+        client.health_check()
         print("✅ LM Studio conectado exitosamente")
         
         # Crear canvas y agentes
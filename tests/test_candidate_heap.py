@@ -0,0 +1,58 @@
+"""CandidateHeap debe coincidir con un barrido completo tras dibujos aleatorios"""
+
+import random
+
+import pytest
+
+from candidate_heap import CandidateHeap
+from ml_lite import MLCanvas, MLLiteAgent
+
+
+def full_rescan(canvas, score_fn, k, group_fn=None, bonus=None):
+    """Las k mejores celdas libres re-puntuando todo el canvas"""
+    bonus = bonus or {}
+    cells = [(score_fn(x, y) + bonus.get(group_fn(x, y) if group_fn else None, 0.0), y, x)
+             for y in range(canvas.height) for x in range(canvas.width) if canvas.grid[y][x] == ' ']
+    cells.sort(key=lambda cell: (-cell[0], cell[1], cell[2]))
+    return [(x, y, score) for score, y, x in cells[:k]]
+
+
+@pytest.mark.parametrize('style', ['minimalista', 'expresivo', 'geometrico', 'organico'])
+def test_top_k_matches_full_rescan(style):
+    rng = random.Random(style)
+    canvas = MLCanvas(17, 11)
+    agent = MLLiteAgent('test')
+    agent.style_weights = dict.fromkeys(agent.style_weights, 0.1)
+    agent.style_weights[style] = 0.9
+    score_fn = lambda x, y: agent.score_position(x, y, canvas, None, None)
+    heap = CandidateHeap(canvas.width, canvas.height, score_fn, is_free=lambda x, y: canvas.grid[y][x] == ' ')
+
+    for _ in range(120):
+        canvas.draw_pixel(rng.randrange(canvas.width), rng.randrange(canvas.height), '#')
+        heap.sync(canvas.move_history)
+        k = rng.choice([1, 5, 8])
+        assert heap.top_k(k) == full_rescan(canvas, score_fn, k)
+
+
+def test_top_k_with_group_bonus_matches_full_rescan():
+    rng = random.Random(0)
+    canvas = MLCanvas(12, 8)
+
+    def score_fn(x, y):
+        neighbors = sum(canvas.grid[ny][nx] != ' '
+                        for ny in range(max(0, y - 1), min(canvas.height, y + 2))
+                        for nx in range(max(0, x - 1), min(canvas.width, x + 2)))
+        mirrored = canvas.grid[y][canvas.width - 1 - x] != ' '
+        return neighbors * 0.25 + mirrored * 0.5 + (x % 3) * 0.125
+
+    group_fn = lambda x, y: (x >= canvas.width // 2, y >= canvas.height // 2)
+    heap = CandidateHeap(canvas.width, canvas.height, score_fn,
+                         is_free=lambda x, y: canvas.grid[y][x] == ' ', group_fn=group_fn)
+
+    for _ in range(60):
+        canvas.draw_pixel(rng.randrange(canvas.width), rng.randrange(canvas.height), '#')
+        heap.sync(canvas.move_history)
+        bonus = {group: rng.choice([0.0, 0.25, 0.5]) for group in heap.heaps}
+        assert heap.top_k(6, bonus) == full_rescan(canvas, score_fn, 6, group_fn, bonus)
+        # Consultar no debe consumir entradas válidas
+        assert heap.top_k(6, bonus) == full_rescan(canvas, score_fn, 6, group_fn, bonus)
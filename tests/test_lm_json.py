@@ -0,0 +1,27 @@
+"""Reparación de las salidas JSON defectuosas habituales de los modelos locales"""
+
+import json
+
+import pytest
+
+from lm_json import parse_json_tolerant, repair_json
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"x": 1, "y": 2,}', {'x': 1, 'y': 2}),
+    ('[{"x": 1}, {"x": 2},]', [{'x': 1}, {'x': 2}]),
+    ("{'x': 3, 'symbol': '#'}", {'x': 3, 'symbol': '#'}),
+    ('{"x": 4, "reason": "cortad', {'x': 4, 'reason': 'cortad'}),
+    ('{"moves": [{"x": 1, "y": 2}, {"x": 3', {'moves': [{'x': 1, 'y': 2}, {'x': 3}]}),
+    ("{'reason': 'it\\'s ok'}", {'reason': "it's ok"}),
+    ('{"reason": "dijo \\"hola\\""}', {'reason': 'dijo "hola"'}),
+    ('Claro: {x: 5, ok: True, z: None} listo', {'x': 5, 'ok': True, 'z': None}),
+])
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_parse_json_tolerant_repairs_and_validates():
+    assert parse_json_tolerant("texto {'x': 1, 'y': 2,} más", name='test') == {'x': 1, 'y': 2}
+    assert parse_json_tolerant('{"x": 1}', name='test', validate=lambda d: 'y' in d) is None
+    assert parse_json_tolerant('sin json', name='test') is None
@@ -0,0 +1,40 @@
+"""Orden de concesión de RequestScheduler y validación de LM_SCHED_CAPS"""
+
+import pytest
+
+from lm_scheduler import BATCH, INTERACTIVE, NORMAL, RequestScheduler, parse_caps
+
+
+def test_parse_caps():
+    assert parse_caps(' interactive = 3 ,batch=9', 4) == {INTERACTIVE: 3, NORMAL: 4, BATCH: 4}
+    assert parse_caps('', 4)[BATCH] == 3
+
+
+@pytest.mark.parametrize('spec, message', [
+    ('interactive', "falta '='"),
+    ('Batch=2', 'clase desconocida'),
+    ('batch=x', 'no entero'),
+])
+def test_parse_caps_rejects_malformed_spec(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_caps(spec, 4)
+
+
+def _queue_behind_busy_slot(aging, batch_age):
+    scheduler = RequestScheduler(1, caps={INTERACTIVE: 1, NORMAL: 1, BATCH: 1}, aging=aging)
+    assert scheduler._enqueue(NORMAL).granted
+    batch = scheduler._enqueue(BATCH)
+    batch.enqueued -= batch_age
+    interactive = scheduler._enqueue(INTERACTIVE)
+    scheduler.release(NORMAL)
+    return batch, interactive
+
+
+def test_interactive_goes_first():
+    batch, interactive = _queue_behind_busy_slot(aging=30.0, batch_age=1.0)
+    assert interactive.granted and not batch.granted
+
+
+def test_long_waiting_batch_ages_past_interactive():
+    batch, interactive = _queue_behind_busy_slot(aging=1.0, batch_age=10.0)
+    assert batch.granted and not interactive.granted
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Agente Dibuja - Planificador de turnos con deadline
+Lanza la consulta al LLM y, en paralelo, un movimiento del scorer ML local;
+si el LLM no responde dentro del presupuesto del turno se aplica el local.
+Con un gobernador de latencia, algunos turnos ni siquiera consultan al LLM
+"""
+
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from latency_governor import LatencyGovernor
+from ml_lite import MLLiteAgent
+
+
+class CanvasSnapshot:
+    """Copia del grid para el scorer local: el hilo de trabajo no ve el canvas vivo"""
+
+    def __init__(self, canvas):
+        self.width = canvas.width
+        self.height = canvas.height
+        self.grid: List[List[str]] = [list(row) for row in canvas.grid]
+
+
+class TurnScheduler:
+    """Latencia de turno predecible: respuesta del LLM a tiempo o movimiento ML local
+
+    Las respuestas que llegan tarde no se aplican; se registran en `late_log`
+    (JSONL) y alimentan al MLLiteAgent del agente como ejemplo de movimiento.
+    Mientras un agente tenga una consulta tardía pendiente no se lanza otra:
+    ese turno se resuelve directamente con el scorer local. Un presupuesto 0
+    espera siempre al LLM.
+
+    Con TURN_RATE > 0 (o un `governor` explícito) el LatencyGovernor decide
+    por turno si se consulta al LLM para sostener ese ritmo de turnos/s.
+    """
+
+    def __init__(self, budget: Optional[float] = None, late_log: Optional[str] = None,
+                 governor: Optional[LatencyGovernor] = None):
+        self.budget = budget if budget is not None else Config.TURN_BUDGET
+        self.late_log = late_log if late_log is not None else Config.TURN_LATE_LOG
+        self.governor = governor if governor is not None else (LatencyGovernor() if Config.TURN_RATE > 0 else None)
+        self.ml_agents: Dict[str, MLLiteAgent] = {}
+        # Un MLLiteAgent se usa desde hilos de trabajo (predicción) y callbacks (aprendizaje)
+        self.ml_locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.pending: Dict[str, asyncio.Task] = {}
+        self.stats = {'llm': 0, 'local': 0, 'late': 0, 'busy': 0, 'errors': 0, 'governed': 0}
+
+    def ml_agent(self, agent) -> MLLiteAgent:
+        with self.lock:
+            if agent.name not in self.ml_agents:
+                self.ml_agents[agent.name] = MLLiteAgent(agent.name)
+                self.ml_locks[agent.name] = threading.Lock()
+            return self.ml_agents[agent.name]
+
+    def learn(self, agent, decision: Dict[str, Any]):
+        ml_agent = self.ml_agent(agent)
+        with self.ml_locks[agent.name]:
+            ml_agent.learn_from_move(decision, success=True)
+
+    def local_move(self, agent, canvas: Optional[CanvasSnapshot] = None) -> Optional[Dict[str, Any]]:
+        """Mejor movimiento según el scorer ML, con un símbolo del propio agente
+
+        Desde otro hilo hay que pasar `canvas` (CanvasSnapshot tomado en el hilo del loop).
+        """
+        canvas = canvas or CanvasSnapshot(agent.canvas)
+        available = [(x, y) for y in range(canvas.height) for x in range(canvas.width)
+                     if canvas.grid[y][x] == ' ']
+        if not available:
+            return None
+
+        ml_agent = self.ml_agent(agent)
+        with self.ml_locks[agent.name]:
+            move = ml_agent.predict_next_move(canvas, available)
+        if move and move['symbol'] not in agent.symbols:
+            move['symbol'] = random.choice(agent.symbols)
+        return move
+
+    async def play_turn(self, agent, turn_number: int) -> Dict[str, Any]:
+        """Ejecutar un turno de `agent` en como mucho `budget` segundos (más el cálculo local)"""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        local_future = loop.run_in_executor(None, self.local_move, agent, CanvasSnapshot(agent.canvas))
+
+        task = self.pending.get(agent.name)
+        governed = False
+        if task is not None and not task.done():
+            self.stats['busy'] += 1
+            task = None
+        elif self.governor is not None and not self.governor.use_llm():
+            self.stats['governed'] += 1
+            governed = True
+            task = None
+        else:
+            task = asyncio.ensure_future(agent.decide_move(turn_number))
+        consulted = task is not None
+
+        decision = None
+        if task is not None:
+            done, _ = await asyncio.wait({task}, timeout=self.budget or None)
+            if done:
+                self.pending.pop(agent.name, None)
+                try:
+                    decision = task.result()
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f"Error en {agent.name}: {e}")
+            else:
+                self.pending[agent.name] = task
+                task.add_done_callback(lambda t: self._record_late(agent, turn_number, start, t))
+
+        # El cálculo local termina dentro del turno aunque gane el LLM: ningún hilo sobrevive al turno
+        move = await local_future
+        try:
+            if decision is not None and agent.apply_move(decision):
+                self.stats['llm'] += 1
+                self.learn(agent, decision)
+                return self._finish(decision, 'llm', start, consulted)
+        except (TypeError, ValueError, KeyError):
+            pass
+
+        if move is not None and agent.apply_move(move):
+            self.stats['local'] += 1
+            return self._finish(dict(move, governed=governed), 'local', start, consulted)
+
+        return self._finish(agent._make_random_move(), 'random', start, consulted)
+
+    def _finish(self, move: Dict[str, Any], source: str, start: float, consulted: bool) -> Dict[str, Any]:
+        latency = time.monotonic() - start
+        if self.governor is not None:
+            self.governor.record(latency, consulted)
+        return dict(move, source=source, latency=latency)
+
+    def _record_late(self, agent, turn_number: int, start: float, task: asyncio.Task):
+        """Guardar una respuesta que llegó fuera de plazo"""
+        self.pending.pop(agent.name, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        decision = task.result()
+        self.stats['late'] += 1
+        if isinstance(decision, dict):
+            # Fuera del loop: puede coincidir con la predicción de un turno posterior del agente
+            asyncio.get_running_loop().run_in_executor(None, self.learn, agent, decision)
+
+        if self.late_log:
+            record = {
+                'agent': agent.name,
+                'turn': turn_number,
+                'latency': round(time.monotonic() - start, 3),
+                'budget': self.budget,
+                'decision': decision
+            }
+            with open(self.late_log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
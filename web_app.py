@@ -1,7 +1,6 @@
 import gradio as gr
-import time
-import threading
-from openai import OpenAI
+import asyncio
+from lm_client import get_lm_client, get_background_loop
 from canvas import Canvas
 from agent import DrawingAgent
 
@@ -17,7 +16,7 @@ class WebApp:
         
     def connect_lm_studio(self, url):
         try:
-            self.client = OpenAI(base_url=url, api_key="not-needed")
+            self.client = get_lm_client(url, "not-needed")
             return "✅ LM Studio conectado"
         except Exception as e:
             return f"❌ Error: {e}"
@@ -37,7 +36,7 @@ class WebApp:
         
         self.running = True
         
-        def draw():
+        async def draw():
             agents = [self.agent1, self.agent2]
             idx = 0
             
@@ -47,10 +46,10 @@ class WebApp:
                 
                 agent = agents[idx]
                 try:
-                    move = agent.make_move(turn)
+                    move = await agent.make_move(turn)
                     self.logs.append(f"Turno {turn+1}: {agent.name} dibujó '{move['symbol']}'")
                     idx = (idx + 1) % 2
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                 except Exception as e:
                     self.logs.append(f"Error: {e}")
                     break
@@ -58,7 +57,7 @@ class WebApp:
             self.logs.append("🎨 Completado")
             self.running = False
         
-        threading.Thread(target=draw, daemon=True).start()
+        get_background_loop().submit(draw())
         return "🚀 Iniciado"
     
     def stop_drawing(self):